@@ -1,38 +1,101 @@
 import asyncio
-import json
 import random
+import re
 import time
-from typing import Dict, Any, List
+from typing import Dict, Any, Callable, List, Optional, AsyncIterator, Union
 from datetime import datetime
+from importlib.metadata import entry_points
 import logging
 
-from schemas import ExecutionContext, AgentResult
+from schemas import ExecutionContext, AgentResult, AgentChunk
+from simulation import SimulationProfile, LatencyModel, UniformLatency
+from batching import BatchDispatcher
+from http_client import AgentHttpClient
 
 logger = logging.getLogger(__name__)
 
+# Entry point group of agent plugins: each entry point's name is the agent
+# name, and it loads a class (or any callable) that returns the agent
+AGENT_ENTRY_POINT_GROUP = "orchestration.agents"
+
 class BaseAgent:
     """Base class for all agents"""
+    # Whether execute_batch does better than running contexts one by one.
+    # Only agents that set this are micro-batched by the registry's dispatcher,
+    # and they give up streaming when batched.
+    supports_batching = False
     
     def __init__(self, name: str):
         self.name = name
+        # Shared pooled HTTP client for external services, set by the registry
+        self.http: Optional[AgentHttpClient] = None
+        self.rng = random.Random()
+        self.latency: LatencyModel = UniformLatency(1, 3)
+    
+    def configure_simulation(self, rng: random.Random, latency: LatencyModel):
+        """Set the RNG and latency model used to simulate work"""
+        self.rng = rng
+        self.latency = latency
     
     async def execute(self, context: ExecutionContext) -> AgentResult:
         """Execute the agent's task"""
+        result = None
+        async for item in self.stream(context):
+            if isinstance(item, AgentResult):
+                result = item
+        return result
+    
+    async def execute_batch(self, contexts: List[ExecutionContext]) -> List[AgentResult]:
+        """Execute several contexts at once, returning their results in order.
+        
+        Agents that wrap batch-capable model or API calls override this. By
+        default contexts run concurrently, except for the simulated agents
+        that support batching: they pay one simulated call for the batch.
+        """
+        if not self.supports_batching:
+            return list(await asyncio.gather(*(self.execute(context) for context in contexts)))
+        
+        start_time = time.time()
+        await self._simulate_latency(self.latency.sample(self.rng))
+        results = []
+        for context in contexts:
+            try:
+                data = await self._process_task(context.shared_context.get("description", ""), context.input_data)
+                results.append(AgentResult(success=True, data=data, execution_time=time.time() - start_time))
+            except Exception as e:
+                logger.error(f"Agent {self.name} failed: {e}")
+                results.append(AgentResult(success=False, error=str(e), execution_time=time.time() - start_time))
+        return results
+    
+    async def stream(self, context: ExecutionContext) -> AsyncIterator[Union[AgentChunk, AgentResult]]:
+        """Execute the agent's task, yielding output chunks as they are produced.
+        
+        The last item is always the AgentResult; streamed fields in its data
+        are assembled from the chunks that were yielded before it.
+        """
         start_time = time.time()
         
         try:
-            # Simulate some processing time
-            await asyncio.sleep(random.uniform(1, 3))
-            
             # Get the main task description
             task_description = context.shared_context.get("description", "")
             
             # Process the task
-            result_data = await self._process_task(task_description, context.input_data)
+            delay = self.latency.sample(self.rng)
+            streamed: Dict[str, List[str]] = {}
+            fields: Dict[str, Any] = {}
+            async for item in self._stream_task(task_description, context.input_data, delay):
+                if isinstance(item, AgentChunk):
+                    streamed.setdefault(item.field, []).append(item.text)
+                    yield item
+                else:
+                    fields.update(item)
+            
+            result_data = {field: "".join(parts) for field, parts in streamed.items()}
+            result_data.update(fields)
             
             execution_time = time.time() - start_time
             
-            return AgentResult(
+            yield AgentResult(
                 success=True,
                 data=result_data,
                 execution_time=execution_time
@@ -40,18 +103,36 @@ class BaseAgent:
             
         except Exception as e:
             logger.error(f"Agent {self.name} failed: {e}")
-            return AgentResult(
+            yield AgentResult(
                 success=False,
                 error=str(e),
                 execution_time=time.time() - start_time
             )
     
+    async def _stream_task(self, task_description: str, input_data: Dict[str, Any],
+                           delay: float) -> AsyncIterator[Union[AgentChunk, Dict[str, Any]]]:
+        """Produce the agent's output, sleeping ``delay`` seconds in total.
+        
+        Yields AgentChunk pieces of text fields and dicts of the remaining
+        fields. By default the whole output is produced by _process_task in
+        one go; override this to stream it.
+        """
+        # Simulate some processing time
+        await self._simulate_latency(delay)
+        yield await self._process_task(task_description, input_data)
+    
+    async def _simulate_latency(self, delay: float):
+        """Simulate the agent's processing time"""
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
     async def _process_task(self, task_description: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """Override this method in subclasses"""
         raise NotImplementedError
 
 class ResearchAgent(BaseAgent):
     """Agent responsible for research and information gathering"""
+    supports_batching = True
     
     def __init__(self):
         super().__init__("Research Agent")
@@ -107,7 +188,7 @@ class ResearchAgent(BaseAgent):
             "summary": summary,
             "key_points": key_points,
             "research_date": datetime.utcnow().isoformat(),
-            "confidence_score": random.uniform(0.8, 0.95)
+            "confidence_score": self.rng.uniform(0.8, 0.95)
         }
 
 class WriterAgent(BaseAgent):
@@ -118,6 +199,24 @@ class WriterAgent(BaseAgent):
     
     async def _process_task(self, task_description: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """Simulate writing process"""
+        content = self._write_content(task_description, input_data)
+        return {"content": content, **self._describe_content(content)}
+    
+    async def _stream_task(self, task_description: str, input_data: Dict[str, Any],
+                           delay: float) -> AsyncIterator[Union[AgentChunk, Dict[str, Any]]]:
+        """Simulate writing process, streaming the document section by section"""
+        content = self._write_content(task_description, input_data)
+        
+        # Split before every heading so each chunk is one section
+        chunks = [chunk for chunk in re.split(r"(?=^#)", content, flags=re.MULTILINE) if chunk]
+        for chunk in chunks:
+            await self._simulate_latency(delay / len(chunks))
+            yield AgentChunk(field="content", text=chunk)
+        
+        yield self._describe_content(content)
+    
+    def _write_content(self, task_description: str, input_data: Dict[str, Any]) -> str:
+        """Write the document based on research from the input data"""
         
         # Get research data from input
         research_data = None
@@ -141,8 +240,11 @@ class WriterAgent(BaseAgent):
         else:
             content = self._generate_general_content(task_description, research_data)
         
+        return content
+    
+    def _describe_content(self, content: str) -> Dict[str, Any]:
+        """Metadata accompanying the written content"""
         return {
-            "content": content,
             "word_count": len(content.split()),
             "sections": self._extract_sections(content),
             "writing_style": "professional",
@@ -214,7 +316,7 @@ Both companies are positioned for success in the growing EV market, with Tesla h
 # Electric Vehicle Market Analysis
 
 ## Market Overview
-{research_data.get('summary', 'The electric vehicle market is absolutely booming right now! Let me break down what\'s happening in this exciting space.')}
+{research_data.get('summary', "The electric vehicle market is absolutely booming right now! Let me break down what's happening in this exciting space.")}
 
 ## Key Market Trends
 
@@ -267,6 +369,7 @@ After diving deep into this topic, I've discovered some fascinating aspects that
 
 class ReviewerAgent(BaseAgent):
     """Agent responsible for content review and quality improvement"""
+    supports_batching = True
     
     def __init__(self):
         super().__init__("Reviewer Agent")
@@ -308,9 +411,9 @@ class ReviewerAgent(BaseAgent):
         word_count = len(content.split())
         
         feedback = {
-            "clarity_score": random.uniform(0.7, 0.95),
-            "structure_score": random.uniform(0.8, 0.95),
-            "completeness_score": random.uniform(0.75, 0.9),
+            "clarity_score": self.rng.uniform(0.7, 0.95),
+            "structure_score": self.rng.uniform(0.8, 0.95),
+            "completeness_score": self.rng.uniform(0.75, 0.9),
             "suggestions": []
         }
         
@@ -344,7 +447,7 @@ class ReviewerAgent(BaseAgent):
     
     def _calculate_quality_score(self, content: str) -> float:
         """Calculate quality score for content"""
-        base_score = random.uniform(0.8, 0.95)
+        base_score = self.rng.uniform(0.8, 0.95)
         
         # Adjust based on content characteristics
         if len(content.split()) > 300:
@@ -376,6 +479,7 @@ class ReviewerAgent(BaseAgent):
 
 class DataAgent(BaseAgent):
     """Agent responsible for data collection and processing"""
+    supports_batching = True
     
     def __init__(self):
         super().__init__("Data Agent")
@@ -385,21 +489,22 @@ class DataAgent(BaseAgent):
         
         # Simulate data collection
         datasets = [
-            {"name": "Primary Dataset", "records": random.randint(1000, 10000), "quality": "high"},
-            {"name": "Secondary Dataset", "records": random.randint(500, 5000), "quality": "medium"},
-            {"name": "Reference Dataset", "records": random.randint(100, 1000), "quality": "high"}
+            {"name": "Primary Dataset", "records": self.rng.randint(1000, 10000), "quality": "high"},
+            {"name": "Secondary Dataset", "records": self.rng.randint(500, 5000), "quality": "medium"},
+            {"name": "Reference Dataset", "records": self.rng.randint(100, 1000), "quality": "high"}
         ]
         
         return {
             "datasets": datasets,
             "total_records": sum(ds["records"] for ds in datasets),
-            "data_quality_score": random.uniform(0.8, 0.95),
+            "data_quality_score": self.rng.uniform(0.8, 0.95),
             "collection_method": "API and web scraping",
             "collected_at": datetime.utcnow().isoformat()
         }
 
 class AnalysisAgent(BaseAgent):
     """Agent responsible for data analysis"""
+    supports_batching = True
     
     def __init__(self):
         super().__init__("Analysis Agent")
@@ -420,9 +525,9 @@ class AnalysisAgent(BaseAgent):
         # Simulate analysis
         analysis_results = {
             "summary_statistics": {
-                "mean": random.uniform(50, 100),
-                "median": random.uniform(45, 95),
-                "std_dev": random.uniform(10, 25)
+                "mean": self.rng.uniform(50, 100),
+                "median": self.rng.uniform(45, 95),
+                "std_dev": self.rng.uniform(10, 25)
             },
             "trends": [
                 "Positive growth trend observed",
@@ -439,29 +544,93 @@ class AnalysisAgent(BaseAgent):
                 "Scatter plot of key variables",
                 "Histogram of data distribution"
             ],
-            "confidence_level": random.uniform(0.85, 0.95),
+            "confidence_level": self.rng.uniform(0.85, 0.95),
             "analysis_date": datetime.utcnow().isoformat()
         }
         
         return analysis_results
 
+# Built-in agents by name; agents are created on first use
+BUILTIN_AGENTS: Dict[str, Callable[[], BaseAgent]] = {
+    "Research Agent": ResearchAgent,
+    "Writer Agent": WriterAgent,
+    "Reviewer Agent": ReviewerAgent,
+    "Data Agent": DataAgent,
+    "Analysis Agent": AnalysisAgent,
+    "General Agent": ResearchAgent  # Fallback for custom workflows
+}
+
 class AgentRegistry:
-    """Registry for managing all available agents"""
+    """Registry for managing all available agents.
     
-    def __init__(self):
-        self.agents = {
-            "Research Agent": ResearchAgent(),
-            "Writer Agent": WriterAgent(),
-            "Reviewer Agent": ReviewerAgent(),
-            "Data Agent": DataAgent(),
-            "Analysis Agent": AnalysisAgent(),
-            "General Agent": ResearchAgent()  # Fallback for custom workflows
-        }
+    Agents are the built-ins plus plugins installed under the
+    ``orchestration.agents`` entry point group; a plugin with a built-in's
+    name replaces it. Plugins are looked up, and each agent is created, the
+    first time an agent is needed, not when the registry is.
+    """
+    
+    def __init__(self, simulation: Optional[SimulationProfile] = None):
+        self.factories: Dict[str, Callable[[], BaseAgent]] = dict(BUILTIN_AGENTS)
+        self.plugins_loaded = False
+        # Agents created so far
+        self.agents: Dict[str, BaseAgent] = {}
+        self.simulation = None
+        # Micro-batches calls to agents that support it
+        self.dispatcher = BatchDispatcher()
+        # One connection pool for every agent's external calls
+        self.http = AgentHttpClient()
+        
+        simulation = simulation or SimulationProfile.from_env()
+        if simulation:
+            self.set_simulation(simulation)
+    
+    def _load_plugins(self):
+        if self.plugins_loaded:
+            return
+        self.plugins_loaded = True
+        for entry_point in entry_points(group=AGENT_ENTRY_POINT_GROUP):
+            logger.info(f"Agent plugin {entry_point.name!r} from {entry_point.value}")
+            # Bound now so each lambda loads its own entry point
+            self.factories[entry_point.name] = lambda entry_point=entry_point: entry_point.load()()
+    
+    def register(self, agent_name: str, factory: Callable[[], BaseAgent]):
+        """Add (or replace) an agent; it is created on first use"""
+        self._load_plugins()
+        self.factories[agent_name] = factory
+        self.agents.pop(agent_name, None)
+    
+    def set_simulation(self, simulation: SimulationProfile):
+        """Apply a simulation profile (seed and latencies) to every agent"""
+        self.simulation = simulation
+        for agent_name, agent in self.agents.items():
+            self._configure(agent_name, agent)
+    
+    def _configure(self, agent_name: str, agent: BaseAgent):
+        agent.configure_simulation(
+            self.simulation.rng_for(agent_name),
+            self.simulation.latency_for(agent_name)
+        )
     
     def get_agent(self, agent_name: str) -> BaseAgent:
-        """Get an agent by name"""
-        return self.agents.get(agent_name)
+        """Get an agent by name, creating it if it's the first use"""
+        agent = self.agents.get(agent_name)
+        if agent is None:
+            self._load_plugins()
+            factory = self.factories.get(agent_name)
+            if factory is None:
+                return None
+            agent = factory()
+            agent.http = self.http
+            if self.simulation:
+                self._configure(agent_name, agent)
+            self.agents[agent_name] = agent
+        return agent
+    
+    async def execute(self, agent: BaseAgent, context: ExecutionContext) -> AgentResult:
+        """Execute a context, batched with other calls to the agent if it can be"""
+        return await self.dispatcher.execute(agent, context)
     
     def list_agents(self) -> List[str]:
         """List all available agents"""
-        return list(self.agents.keys())
+        self._load_plugins()
+        return list(self.factories.keys())
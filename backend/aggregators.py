@@ -0,0 +1,59 @@
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+import json
+
+from task_records import TaskRecord
+
+class Aggregator:
+    """Builds a task's final output from its subtasks' outputs.
+
+    Everything is done in a single pass over the subtasks, in order, using
+    the outputs the engine already decoded. The main content comes from the
+    DAG's terminal subtask (the last one without dependents), falling back to
+    the first subtask that has any. The JSON is produced piece by piece with
+    ``iterencode``, one subtask output at a time.
+
+    Subclass and ``register_aggregator`` to customize a workflow type.
+    """
+    summary = "Task completed successfully"
+    # Output fields holding a subtask's main content, in order of preference
+    content_fields = ("content", "improved_content", "original_content")
+
+    def content_of(self, output: Dict[str, Any]) -> str:
+        for field in self.content_fields:
+            if output.get(field):
+                return output[field]
+        return ""
+
+    def iterencode(self, record: TaskRecord) -> Iterator[str]:
+        """Yield the final output JSON in pieces"""
+        yield '{"summary": ' + json.dumps(self.summary) + ', "results": {'
+        terminal_content = None
+        fallback_content = ""
+        separator = ""
+        for subtask in record.subtasks.values():
+            if not subtask.output:
+                continue
+            yield separator + json.dumps(subtask.id) + ": " + json.dumps(subtask.output)
+            separator = ", "
+            content = self.content_of(subtask.output)
+            if not subtask.dependents:
+                terminal_content = content
+            if content and not fallback_content:
+                fallback_content = content
+        yield '}, "final_content": ' + json.dumps(terminal_content or fallback_content)
+        yield ', "total_subtasks": ' + str(len(record.subtasks))
+        yield ', "completed_at": ' + json.dumps(datetime.utcnow().isoformat()) + "}"
+
+    def encode(self, record: TaskRecord) -> str:
+        return "".join(self.iterencode(record))
+
+_default_aggregator = Aggregator()
+AGGREGATORS: Dict[str, Aggregator] = {}
+
+def register_aggregator(workflow_type: str, aggregator: Aggregator):
+    """Use a custom aggregator for tasks of a workflow type"""
+    AGGREGATORS[workflow_type] = aggregator
+
+def get_aggregator(workflow_type: Optional[str]) -> Aggregator:
+    return AGGREGATORS.get(workflow_type, _default_aggregator)
@@ -0,0 +1,91 @@
+# Micro-batching of agent calls: contexts wait until AGENT_BATCH_SIZE are pending
+# or the oldest has waited AGENT_BATCH_WAIT_MS, then run in one execute_batch call
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+import os
+
+from schemas import ExecutionContext, AgentResult
+
+logger = logging.getLogger(__name__)
+
+# Most contexts per execute_batch call; 1 disables batching
+AGENT_BATCH_SIZE = int(os.getenv("AGENT_BATCH_SIZE", "16"))
+# Longest a context waits for others to join its batch
+AGENT_BATCH_WAIT_MS = float(os.getenv("AGENT_BATCH_WAIT_MS", "5"))
+
+class BatchDispatcher:
+    """Collects pending contexts per agent and runs them in batches"""
+
+    def __init__(self, max_batch_size: int = AGENT_BATCH_SIZE, max_wait: float = AGENT_BATCH_WAIT_MS / 1000):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        # Keyed by agent instance: names aren't unique (the General Agent is
+        # another ResearchAgent)
+        self.pending: Dict[object, List[Tuple[ExecutionContext, asyncio.Future]]] = {}
+        self.timers: Dict[object, asyncio.TimerHandle] = {}
+        # Batches in flight, referenced so they aren't garbage collected
+        self.running: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.calls = 0
+
+    def batches_for(self, agent) -> bool:
+        """Whether calls to this agent go through the dispatcher"""
+        return self.max_batch_size > 1 and agent.supports_batching
+
+    async def execute(self, agent, context: ExecutionContext) -> AgentResult:
+        """Execute a context as part of the agent's next batch"""
+        if not self.batches_for(agent):
+            return await agent.execute(context)
+
+        future = asyncio.get_running_loop().create_future()
+        batch = self.pending.setdefault(agent, [])
+        batch.append((context, future))
+        if len(batch) >= self.max_batch_size:
+            self._flush(agent)
+        elif len(batch) == 1:
+            self.timers[agent] = asyncio.get_running_loop().call_later(self.max_wait, self._flush, agent)
+        return await future
+
+    def _flush(self, agent):
+        timer = self.timers.pop(agent, None)
+        if timer:
+            timer.cancel()
+        batch = self.pending.pop(agent, None)
+        if batch:
+            execution = asyncio.create_task(self._run(agent, batch))
+            self.running.add(execution)
+            execution.add_done_callback(self.running.discard)
+
+    async def _run(self, agent, batch: List[Tuple[ExecutionContext, asyncio.Future]]):
+        # Callers that were cancelled while waiting drop out of the batch
+        batch = [(context, future) for context, future in batch if not future.done()]
+        if not batch:
+            return
+        self.batches += 1
+        self.calls += len(batch)
+        try:
+            results = await agent.execute_batch([context for context, _ in batch])
+        except Exception as e:
+            logger.error(f"Batch of {len(batch)} calls to {agent.name} failed: {e}")
+            results = [AgentResult(success=False, error=str(e))] * len(batch)
+        if len(results) != len(batch):
+            logger.error(f"Batch of {len(batch)} calls to {agent.name} returned {len(results)} results")
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+        # Callers whose result is missing would otherwise wait forever
+        for _, future in batch[len(results):]:
+            if not future.done():
+                future.set_exception(RuntimeError(
+                    f"{agent.name} returned {len(results)} results for a batch of {len(batch)}"
+                ))
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "calls": self.calls,
+            "mean_batch_size": round(self.calls / self.batches, 2) if self.batches else None
+        }
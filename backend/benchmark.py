@@ -0,0 +1,466 @@
+# End-to-end load benchmark driving the FastAPI app in-process (see README)
+# Usage: cd backend && python benchmark.py --levels 10 100 1000 --latency zero --output bench.json
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Set
+
+# The database URL is read at import time, so point it at a scratch file
+# before the application modules are imported.
+_BENCH_DIR = tempfile.mkdtemp(prefix="orchestration-bench-")
+_BENCH_DB = os.path.join(_BENCH_DIR, "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_BENCH_DB}"
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from logging_config import configure_logging  # noqa: E402
+from database import DB_POOL_SIZE, DB_MAX_OVERFLOW  # noqa: E402
+from execution_engine import TASK_WORKERS  # noqa: E402
+from simulation import SimulationProfile, latency_from_config  # noqa: E402
+from ws_protocol import EVENT_TYPES, PROTOCOLS  # noqa: E402
+
+logger = logging.getLogger("benchmark")
+
+WORKFLOWS = ["research_write_review", "data_analysis", "custom"]
+
+class ASGIWebSocketClient:
+    """Minimal in-process WebSocket client speaking raw ASGI to the app"""
+
+    def __init__(self, app, path: str, query_string: str = "", subprotocols: Optional[List[str]] = None):
+        self.app = app
+        self.path = path
+        self.query_string = query_string
+        self.subprotocols = subprotocols or []
+        self._to_app: asyncio.Queue = asyncio.Queue()
+        self._from_app: asyncio.Queue = asyncio.Queue()
+        self._app_task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self):
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": self.path,
+            "raw_path": self.path.encode(),
+            "root_path": "",
+            "query_string": self.query_string.encode(),
+            "headers": [(b"host", b"testserver")],
+            "server": ("testserver", 80),
+            "client": ("benchmark", 0),
+            "subprotocols": self.subprotocols,
+        }
+        self._app_task = asyncio.create_task(self.app(scope, self._to_app.get, self._from_app.put))
+        await self._to_app.put({"type": "websocket.connect"})
+        message = await self._from_app.get()
+        if message["type"] != "websocket.accept":
+            raise RuntimeError(f"WebSocket rejected: {message}")
+        return self
+
+    async def receive(self) -> Dict[str, Any]:
+        """Receive the next raw ASGI message sent by the app"""
+        message = await self._from_app.get()
+        if message["type"] == "websocket.close":
+            raise ConnectionError("WebSocket closed by server")
+        return message
+
+    async def send_text(self, text: str):
+        await self._to_app.put({"type": "websocket.receive", "text": text})
+
+    async def __aexit__(self, *exc):
+        await self._to_app.put({"type": "websocket.disconnect", "code": 1000})
+        try:
+            await asyncio.wait_for(self._app_task, timeout=5)
+        except (asyncio.TimeoutError, Exception):
+            self._app_task.cancel()
+
+def build_simulation(latency: str, seed: Optional[int],
+                     profile_path: Optional[str] = None) -> SimulationProfile:
+    """Build the agents' simulation profile from the command line options.
+
+    ``latency`` is ``zero``, ``fixed:<seconds>``, ``lognormal:<median>,<sigma>``,
+    ``trace:<path>`` or ``default`` (the built-in 1-3s uniform sleep). A JSON
+    profile file takes precedence over ``latency``.
+    """
+    if profile_path:
+        with open(profile_path) as f:
+            profile = SimulationProfile.from_dict(json.load(f))
+        if seed is not None:
+            profile.seed = seed
+        return profile
+
+    if latency == "default":
+        return SimulationProfile(seed=seed)
+    if latency == "zero":
+        return SimulationProfile.zero(seed=seed)
+    kind, _, arguments = latency.partition(":")
+    if kind == "fixed":
+        config = {"type": "fixed", "seconds": arguments}
+    elif kind == "lognormal":
+        median, sigma = arguments.split(",")
+        config = {"type": "lognormal", "median": median, "sigma": sigma}
+    elif kind == "trace":
+        config = {"type": "trace", "path": arguments}
+    else:
+        raise ValueError(f"Unknown latency mode: {latency}")
+    return SimulationProfile(seed=seed, default_latency=latency_from_config(config))
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+class CompletionTracker:
+    """Wraps ExecutionEngine.execute_task to record when each task finishes"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.original = engine.execute_task
+        self.finished: Dict[str, float] = {}
+        self.waiters: Dict[str, asyncio.Future] = {}
+        self.active: Set[str] = set()
+        self.max_active = 0
+        engine.execute_task = self._execute_task
+
+    async def _execute_task(self, task_id: str, db=None):
+        # execute_task calls itself once it has a session; only the outer
+        # call counts
+        if task_id in self.active:
+            return await self.original(task_id, db)
+        self.active.add(task_id)
+        self.max_active = max(self.max_active, len(self.active))
+        try:
+            await self.original(task_id, db)
+        finally:
+            self.active.discard(task_id)
+            self.finished[task_id] = time.perf_counter()
+            waiter = self._waiter(task_id)
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _waiter(self, task_id: str) -> asyncio.Future:
+        if task_id not in self.waiters:
+            self.waiters[task_id] = asyncio.get_running_loop().create_future()
+        return self.waiters[task_id]
+
+    async def wait(self, task_id: str, timeout: float):
+        await asyncio.wait_for(asyncio.shield(self._waiter(task_id)), timeout=timeout)
+
+    def reset(self):
+        self.finished.clear()
+        self.waiters.clear()
+        self.max_active = 0
+
+    def restore(self):
+        self.engine.execute_task = self.original
+
+async def _run_one_task(app, client: httpx.AsyncClient, tracker: CompletionTracker, workflow: str,
+                        index: int, timeout: float, protocol: str = "json") -> Dict[str, Any]:
+    """Submit one task, follow it over WebSocket and wait for it to finish.
+    
+    The client connects after submitting, with ``since=0`` so the event log
+    replays whatever was sent before it was connected. ``first_content`` is
+    therefore taken from the event's own timestamp, not from when it arrived.
+    """
+    submitted = time.perf_counter()
+    submitted_at = time.time()
+    response = await client.post("/api/tasks", json={
+        "description": f"Benchmark task {index} about electric vehicle adoption",
+        "workflow_type": workflow
+    })
+    response.raise_for_status()
+    task_id = response.json()["id"]
+
+    events = 0
+    frame_bytes = 0
+    deflated_bytes = 0
+    first_content = None
+    wire_protocol = PROTOCOLS[protocol]
+    # permessage-deflate with context takeover: one stream per connection,
+    # each message flushed and sent without the trailing empty block
+    deflate = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    subprotocols = [] if protocol == "json" else [f"orchestration.{protocol}"]
+    finished = asyncio.Event()
+    async with ASGIWebSocketClient(app, f"/ws/tasks/{task_id}", "since=0", subprotocols) as ws:
+        async def drain():
+            nonlocal events, frame_bytes, deflated_bytes, first_content
+            while True:
+                message = await ws.receive()
+                events += 1
+                frame = message.get("bytes") or (message.get("text") or "").encode()
+                frame_bytes += len(frame)
+                deflated_bytes += len(deflate.compress(frame) + deflate.flush(zlib.Z_SYNC_FLUSH)) - 4
+                event = wire_protocol.decode(frame)
+                event_type = _event_type(event)
+                if first_content is None and event_type == "subtask_chunk":
+                    first_content = _event_time(event) - submitted_at
+                if event_type in ("task_completed", "task_failed"):
+                    finished.set()
+
+        reader = asyncio.create_task(drain())
+        try:
+            await tracker.wait(task_id, timeout)
+            # Let the client read the last events (or the rest of the replay)
+            await asyncio.wait_for(finished.wait(), timeout=timeout)
+        finally:
+            reader.cancel()
+
+    return {
+        "task_id": task_id,
+        "latency": tracker.finished[task_id] - submitted,
+        "ws_events": events,
+        "ws_bytes": frame_bytes,
+        "ws_deflated_bytes": deflated_bytes,
+        "first_content": first_content,
+    }
+
+def _event_type(event: Any) -> Optional[str]:
+    """Type of a decoded event: a JSON message or a compact array"""
+    if isinstance(event, dict):
+        return event.get("type")
+    code = event[0]
+    return EVENT_TYPES[code - 1] if isinstance(code, int) else code
+
+def _event_time(event: Any) -> float:
+    """When the server sent a decoded event, as a Unix timestamp"""
+    if isinstance(event, dict):
+        return datetime.fromisoformat(event["timestamp"]).replace(tzinfo=timezone.utc).timestamp()
+    return event[3] / 1000
+
+def _encoding_totals(app) -> Dict[str, float]:
+    manager = app.state.websocket_manager
+    return {
+        "events": manager.events_encoded["json"],
+        "seconds": sum(manager.encode_seconds.values()),
+    }
+
+async def run_level(app, client: httpx.AsyncClient, tracker: CompletionTracker, concurrency: int,
+                    workflow: str, timeout: float, measure_memory: bool,
+                    protocol: str = "json") -> Dict[str, Any]:
+    """Run ``concurrency`` tasks at once and collect throughput/latency figures"""
+    tracker.reset()
+    encoding_before = _encoding_totals(app)
+    db_size_before = os.path.getsize(_BENCH_DB) if os.path.exists(_BENCH_DB) else 0
+
+    if measure_memory:
+        tracemalloc.start()
+        baseline_memory, _ = tracemalloc.get_traced_memory()
+
+    started = time.perf_counter()
+    runs = await asyncio.gather(*[
+        _run_one_task(app, client, tracker, workflow, i, timeout, protocol) for i in range(concurrency)
+    ], return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    encoding_after = _encoding_totals(app)
+    # Every event is serialized to JSON (for the event log) plus once per
+    # other protocol in use
+    encoded_events = encoding_after["events"] - encoding_before["events"]
+    encode_seconds = encoding_after["seconds"] - encoding_before["seconds"]
+
+    memory = {}
+    if measure_memory:
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        growth = max(0, peak_memory - baseline_memory)
+        memory = {
+            "peak_traced_bytes": growth,
+            "bytes_per_active_task": growth / max(1, tracker.max_active),
+        }
+
+    errors = [str(run) for run in runs if isinstance(run, Exception)]
+    completed = [run for run in runs if not isinstance(run, Exception)]
+    latencies = [run["latency"] for run in completed]
+    first_content = [run["first_content"] for run in completed if run["first_content"] is not None]
+
+    # Read back the whole list, as the dashboard does
+    list_started = time.perf_counter()
+    tasks = (await client.get("/api/tasks")).json()
+    list_latency = time.perf_counter() - list_started
+    statuses: Dict[str, int] = {}
+    for task in tasks:
+        statuses[task["status"]] = statuses.get(task["status"], 0) + 1
+
+    db_size_after = os.path.getsize(_BENCH_DB)
+
+    return {
+        "concurrency": concurrency,
+        "workflow_type": workflow,
+        "elapsed_seconds": elapsed,
+        "tasks_per_second": len(completed) / elapsed if elapsed else None,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p99": percentile(latencies, 99),
+        "latency_max": max(latencies) if latencies else None,
+        "first_content_p50": percentile(first_content, 50),
+        "first_content_p99": percentile(first_content, 99),
+        "max_active_tasks": tracker.max_active,
+        "ws_events_per_task": sum(run["ws_events"] for run in completed) / max(1, len(completed)),
+        "ws_bytes_per_task": sum(run["ws_bytes"] for run in completed) / max(1, len(completed)),
+        "ws_deflated_bytes_per_task": sum(run["ws_deflated_bytes"] for run in completed) / max(1, len(completed)),
+        "ws_encode_us_per_event": encode_seconds / encoded_events * 1e6 if encoded_events else None,
+        "list_tasks_seconds": list_latency,
+        "list_tasks_rows": len(tasks),
+        "task_statuses": statuses,
+        "db_bytes_before": db_size_before,
+        "db_bytes_after": db_size_after,
+        "db_bytes_per_task": (db_size_after - db_size_before) / max(1, concurrency),
+        "memory": memory,
+        "errors": errors[:10],
+        "error_count": len(errors),
+    }
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).strip()
+    except Exception:
+        return None
+
+async def run_benchmark(levels: List[int], workflow: str, simulation: SimulationProfile,
+                        timeout: float, measure_memory: bool, protocol: str = "json") -> Dict[str, Any]:
+    """Run every concurrency level against a fresh in-process app"""
+    app = main.create_app()
+    app.state.execution_engine.agent_registry.set_simulation(simulation)
+    tracker = CompletionTracker(app.state.execution_engine)
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    # The ASGI transport doesn't send lifespan events, so run startup here
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        try:
+            for concurrency in levels:
+                logger.warning(f"Running {concurrency} concurrent '{workflow}' tasks...")
+                result = await run_level(app, client, tracker, concurrency, workflow, timeout, False, protocol)
+                if measure_memory:
+                    # Separate pass: tracemalloc overhead would skew the timings
+                    memory_run = await run_level(app, client, tracker, concurrency, workflow, timeout, True, protocol)
+                    result["memory"] = memory_run["memory"]
+                results.append(result)
+        finally:
+            tracker.restore()
+
+    return {
+        "benchmark": "orchestration-e2e",
+        "version": 1,
+        "git_commit": _git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": {
+            "levels": levels,
+            "workflow_type": workflow,
+            "seed": simulation.seed,
+            "measure_memory": measure_memory,
+            "ws_protocol": protocol,
+            # Tasks run TASK_WORKERS at a time whatever the level
+            "db_pool_size": DB_POOL_SIZE,
+            "db_max_overflow": DB_MAX_OVERFLOW,
+            "task_workers": TASK_WORKERS,
+        },
+        "results": results,
+    }
+
+COMPARED_METRICS = [
+    ("tasks_per_second", True),
+    ("latency_p50", False),
+    ("latency_p99", False),
+    ("db_bytes_per_task", False),
+    ("ws_bytes_per_task", False),
+    ("ws_deflated_bytes_per_task", False),
+    ("ws_encode_us_per_event", False),
+]
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """Format a per-level comparison of two benchmark result documents"""
+    lines = []
+    baseline_by_level = {r["concurrency"]: r for r in baseline.get("results", [])}
+    for result in current["results"]:
+        old = baseline_by_level.get(result["concurrency"])
+        if not old:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            before, after = old.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            better = change > 0 if higher_is_better else change < 0
+            lines.append(
+                f"{result['concurrency']:>6} {metric:<20} {before:>12.4f} -> {after:>12.4f} "
+                f"({change:+.1f}%{', better' if better else ''})"
+            )
+    return lines
+
+def main_cli(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Orchestration backend load benchmark")
+    parser.add_argument("--levels", type=int, nargs="+", default=[10, 100, 1000],
+                        help="concurrent task counts to run")
+    parser.add_argument("--workflow", choices=WORKFLOWS, default="research_write_review")
+    parser.add_argument("--latency", default="zero",
+                        help="agent latency: zero, fixed:<s>, lognormal:<median>,<sigma>, "
+                             "trace:<path> or default")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for the agents' simulated scores and latencies")
+    parser.add_argument("--profile", help="JSON simulation profile (overrides --latency)")
+    parser.add_argument("--timeout", type=float, default=600.0,
+                        help="per-task completion timeout in seconds")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the tracemalloc pass")
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="where to write the JSON results")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--ws-protocol", choices=sorted(PROTOCOLS), default="json",
+                        help="WebSocket protocol the clients negotiate")
+    args = parser.parse_args(argv)
+
+    # The app logs every subtask at INFO; keep benchmark output readable.
+    # Configured here, the app's lifespan leaves logging alone
+    configure_logging()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    simulation = build_simulation(args.latency, args.seed, args.profile)
+    report = asyncio.run(run_benchmark(
+        args.levels, args.workflow, simulation, args.timeout, not args.no_memory, args.ws_protocol
+    ))
+    report["config"]["latency"] = args.profile or args.latency
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for result in report["results"]:
+        memory = result["memory"].get("bytes_per_active_task")
+        print(
+            f"{result['concurrency']:>6} tasks: {result['tasks_per_second']:.1f} tasks/s, "
+            f"p50 {result['latency_p50']:.3f}s, p99 {result['latency_p99']:.3f}s, "
+            f"db +{result['db_bytes_per_task']:.0f} B/task, "
+            f"ws {result['ws_bytes_per_task']:.0f} B/task ({result['ws_deflated_bytes_per_task']:.0f} deflated)"
+            + (f", {memory / 1024:.1f} KiB/active task" if memory is not None else "")
+            + (f", {result['error_count']} errors" if result["error_count"] else "")
+        )
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare} ({baseline.get('git_commit') or 'unknown commit'}):")
+        for line in compare(baseline, report):
+            print(line)
+
+    print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main_cli()
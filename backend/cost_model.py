@@ -0,0 +1,145 @@
+# Execution time estimates from the latency history in stats_rollups,
+# per agent and per workflow type, used for scheduling and ETAs
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+import os
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import StatsRollup
+from models import SubtaskStatus
+from stats import latency_bin, bin_latency, bucket_start
+from task_records import TaskRecord, SubtaskRecord
+
+# History loaded at startup
+COST_MODEL_WINDOW_HOURS = float(os.getenv("COST_MODEL_WINDOW_HOURS", "168"))
+# Estimate for an agent with no history when no agent has any either
+COST_MODEL_DEFAULT_SECONDS = float(os.getenv("COST_MODEL_DEFAULT_SECONDS", "2.0"))
+
+class LatencySketch:
+    """Streaming histogram of durations in log-spaced bins"""
+    __slots__ = ("bins", "count", "total")
+
+    def __init__(self):
+        self.bins: Dict[int, int] = {}
+        self.count = 0
+        # Sum of bin representatives, for the mean
+        self.total = 0.0
+
+    def add(self, seconds: float, count: int = 1):
+        self.add_bin(latency_bin(seconds), count)
+
+    def add_bin(self, latency_bin: int, count: int = 1):
+        self.bins[latency_bin] = self.bins.get(latency_bin, 0) + count
+        self.count += count
+        self.total += bin_latency(latency_bin) * count
+
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        seen = 0
+        for latency_bin in sorted(self.bins):
+            seen += self.bins[latency_bin]
+            if seen >= self.count * q:
+                return bin_latency(latency_bin)
+        return bin_latency(max(self.bins))
+
+class CostModel:
+    """Per-agent and per-workflow latency sketches and the estimates built on them.
+
+    Estimates are means: the expected length of a chain is the sum of its
+    steps' means, which a median doesn't give.
+    """
+
+    def __init__(self):
+        self.sketches: Dict[Tuple[str, str], LatencySketch] = {}
+
+    def load(self, db: Session, window_hours: float = COST_MODEL_WINDOW_HOURS):
+        """Fill the sketches from the persisted rollups of the last ``window_hours``"""
+        since = bucket_start(datetime.utcnow() - timedelta(hours=window_hours))
+        rows = (
+            db.query(StatsRollup.dimension, StatsRollup.name, StatsRollup.latency_bin,
+                     func.sum(StatsRollup.completed))
+            .filter(StatsRollup.bucket_start >= since, StatsRollup.completed > 0)
+            .group_by(StatsRollup.dimension, StatsRollup.name, StatsRollup.latency_bin)
+        )
+        self.sketches = {}
+        for dimension, name, latency_bin, completed in rows:
+            if completed:
+                self._sketch(dimension, name).add_bin(latency_bin, completed)
+
+    def _sketch(self, dimension: str, name: str) -> LatencySketch:
+        key = (dimension, name)
+        if key not in self.sketches:
+            self.sketches[key] = LatencySketch()
+        return self.sketches[key]
+
+    def observe(self, dimension: str, name: str, seconds: float):
+        """Add a successful agent call or workflow run"""
+        self._sketch(dimension, name).add(seconds)
+
+    def agent_seconds(self, agent_name: str) -> float:
+        """Expected duration of a call to an agent.
+
+        Agents without history are assumed to take as long as the average
+        call to any agent.
+        """
+        sketch = self.sketches.get(("agent", agent_name))
+        if sketch and sketch.count:
+            return sketch.mean()
+        count = total = 0
+        for (dimension, _), sketch in self.sketches.items():
+            if dimension == "agent":
+                count += sketch.count
+                total += sketch.total
+        return total / count if count else COST_MODEL_DEFAULT_SECONDS
+
+    def workflow_seconds(self, workflow_type: str, agent_names: Iterable[str]) -> float:
+        """Expected run time of a task that hasn't started, given the agents
+        of its (sequential) steps; measured workflow runs take precedence."""
+        sketch = self.sketches.get(("workflow", workflow_type))
+        if sketch and sketch.count:
+            return sketch.mean()
+        return sum(self.agent_seconds(name) for name in agent_names)
+
+    def critical_path(self, record: TaskRecord, now: Optional[datetime] = None) -> float:
+        """Expected seconds until every runnable subtask of a task has finished"""
+        return max(self.remaining_paths(record, now).values(), default=0.0)
+
+    def remaining_paths(self, record: TaskRecord, now: Optional[datetime] = None) -> Dict[str, float]:
+        """Expected seconds from now until each subtask and everything that
+        depends on it has finished, by subtask id"""
+        now = now or datetime.utcnow()
+        remaining: Dict[str, float] = {}
+        blocked: Dict[str, bool] = {}
+
+        def is_blocked(subtask: SubtaskRecord) -> bool:
+            # Failed subtasks, and everything that depends on one, never run
+            if subtask.id not in blocked:
+                blocked[subtask.id] = subtask.status == SubtaskStatus.FAILED or any(
+                    is_blocked(record.subtasks[dependency]) for dependency in subtask.dependencies
+                )
+            return blocked[subtask.id]
+
+        def path(subtask: SubtaskRecord) -> float:
+            if subtask.id not in remaining:
+                own = 0.0 if is_blocked(subtask) else self._own_remaining(subtask, now)
+                remaining[subtask.id] = own + max((path(dependent) for dependent in subtask.dependents), default=0.0)
+            return remaining[subtask.id]
+
+        for subtask in record.subtasks.values():
+            path(subtask)
+        return remaining
+
+    def _own_remaining(self, subtask: SubtaskRecord, now: datetime) -> float:
+        if subtask.status == SubtaskStatus.COMPLETED:
+            return 0.0
+        expected = self.agent_seconds(subtask.agent_name)
+        if subtask.status == SubtaskStatus.RUNNING and subtask.started_at:
+            # A call running past its estimate is assumed to be about to end
+            return max(expected - (now - subtask.started_at).total_seconds(), 0.0)
+        return expected
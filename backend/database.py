@@ -1,16 +1,32 @@
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, Text, Enum, ForeignKey, Boolean
+from sqlalchemy import create_engine, event, inspect, delete, update, func, Column, String, Integer, DateTime, Text, Enum, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
+from functools import lru_cache
+from typing import List
 import enum
 import os
 
 # Database URL
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./orchestration.db")
 
-engine = create_engine(DATABASE_URL)
+# Connection pool sizing. Every running task holds a connection while it
+# awaits its agents, so the pool bounds how many tasks can run at once.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+engine = create_engine(DATABASE_URL, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # Only takes effect for new databases; lets retention give deleted
+        # pages back to the file system with incremental VACUUM
+        dbapi_connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        # SQLite ignores foreign keys (and ON DELETE CASCADE) unless asked
+        dbapi_connection.execute("PRAGMA foreign_keys = ON")
+
 Base = declarative_base()
 
 class TaskStatus(str, enum.Enum):
@@ -35,16 +51,16 @@ class Task(Base):
     progress = Column(Integer, default=0)
     final_output = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationship
-    subtasks = relationship("Subtask", back_populates="task", cascade="all, delete-orphan")
+    subtasks = relationship("Subtask", back_populates="task", cascade="all, delete-orphan", passive_deletes=True)
 
 class Subtask(Base):
     __tablename__ = "subtasks"
     
     id = Column(String, primary_key=True, index=True)
-    task_id = Column(String, ForeignKey("tasks.id"), nullable=False)
+    task_id = Column(String, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False, index=True)
     agent_name = Column(String, nullable=False)
     description = Column(Text, nullable=False)
     status = Column(Enum(SubtaskStatus), default=SubtaskStatus.PENDING)
@@ -61,6 +77,85 @@ class Subtask(Base):
     # Relationship
     task = relationship("Task", back_populates="subtasks")
 
+class TaskCount(Base):
+    """Number of tasks in each status, kept up to date on every transition"""
+    __tablename__ = "task_counts"
+    
+    status = Column(Enum(TaskStatus), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class StatsRollup(Base):
+    """Finished tasks (per workflow) and subtasks (per agent) per time bucket.
+    
+    One row per latency bin, so percentiles can be estimated by merging rows
+    without keeping individual durations.
+    """
+    __tablename__ = "stats_rollups"
+    
+    bucket_start = Column(DateTime, primary_key=True)
+    dimension = Column(String, primary_key=True)  # "workflow" or "agent"
+    name = Column(String, primary_key=True)
+    latency_bin = Column(Integer, primary_key=True)
+    completed = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+
+class SearchDocument(Base):
+    """Row id of a task's entry in the full-text search index"""
+    __tablename__ = "search_documents"
+    
+    id = Column(Integer, primary_key=True)
+    task_id = Column(String, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False, unique=True)
+
+class SchemaState(Base):
+    """Fingerprint of the schema the database was last set up for (one row)"""
+    __tablename__ = "schema_state"
+    
+    id = Column(Integer, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+def adjust_task_count(db, status: TaskStatus, delta: int):
+    """Add ``delta`` to a status counter, in the caller's transaction"""
+    if delta:
+        db.execute(update(TaskCount).where(TaskCount.status == status).values(count=TaskCount.count + delta))
+
+def uncount_tasks(db, task_ids: List[str]):
+    """Take tasks about to be deleted off the status counters"""
+    counts = (
+        db.query(Task.status, func.count())
+        .filter(Task.id.in_(task_ids))
+        .group_by(Task.status)
+    )
+    for status, count in counts.all():
+        adjust_task_count(db, status, -count)
+
+@lru_cache(maxsize=None)
+def subtasks_cascade() -> bool:
+    """Whether the database deletes subtasks along with their task.
+    
+    Tables created before the foreign key had ON DELETE CASCADE don't.
+    """
+    return any(
+        foreign_key["referred_table"] == "tasks"
+        and (foreign_key.get("options") or {}).get("ondelete", "").upper() == "CASCADE"
+        for foreign_key in inspect(engine).get_foreign_keys("subtasks")
+    )
+
+def delete_tasks(db, task_ids: List[str]) -> int:
+    """Delete tasks and their subtasks with set-based statements and commit.
+    
+    Returns the number of tasks deleted.
+    """
+    # Inspecting opens a connection of its own, so do it before this
+    # session takes SQLite's write lock
+    cascade = subtasks_cascade()
+    uncount_tasks(db, task_ids)
+    if not cascade:
+        db.execute(delete(Subtask).where(Subtask.task_id.in_(task_ids)))
+    deleted = db.execute(delete(Task).where(Task.id.in_(task_ids))).rowcount
+    db.commit()
+    return deleted
+
 def get_db():
     db = SessionLocal()
     try:
@@ -0,0 +1,158 @@
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Events kept in memory per task, and tasks kept in memory overall
+EVENT_LOG_SIZE = int(os.getenv("EVENT_LOG_SIZE", "500"))
+EVENT_LOG_TASKS = int(os.getenv("EVENT_LOG_TASKS", "1000"))
+# Optional directory for an on-disk copy of every task's log
+EVENT_LOG_DIR = os.getenv("EVENT_LOG_DIR")
+
+class EventLog:
+    """Append-only log of the WebSocket events broadcast for each task.
+
+    Events are kept as their serialized JSON text together with their
+    ``seq``, in a bounded ring buffer per task, so reconnecting clients can
+    be sent exactly what they missed. With a directory configured every event
+    is also appended to ``<directory>/<task_id>.jsonl``, which is used when
+    the ring buffer no longer reaches back far enough.
+
+    Disk writes are done by a background thread, so the event loop never
+    waits on the file system. Lines are ``<seq>\t<event>``, so a replay skips
+    what the client already has without parsing it.
+    """
+
+    def __init__(self, max_events: int = EVENT_LOG_SIZE, max_tasks: int = EVENT_LOG_TASKS,
+                 directory: Optional[str] = EVENT_LOG_DIR):
+        self.max_events = max_events
+        self.max_tasks = max_tasks
+        self.directory = directory
+        self.logs: "OrderedDict[str, Deque[Tuple[int, str]]]" = OrderedDict()
+        # ("append", task_id, line) and ("remove", task_id, None) for the writer
+        self.writes: "queue.Queue[Optional[Tuple[str, str, Optional[str]]]]" = queue.Queue()
+        self.writer: Optional[threading.Thread] = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.writer = threading.Thread(target=self._write_loop, name="event-log-writer", daemon=True)
+            self.writer.start()
+            atexit.register(self.close)
+
+    def append(self, task_id: str, seq: int, event: str):
+        """Record an event that was broadcast for a task"""
+        log = self.logs.get(task_id)
+        if log is None:
+            log = self.logs[task_id] = deque(maxlen=self.max_events)
+            while len(self.logs) > self.max_tasks:
+                self.logs.popitem(last=False)
+        else:
+            self.logs.move_to_end(task_id)
+        log.append((seq, event))
+
+        if self.writer:
+            self.writes.put(("append", task_id, f"{seq}\t{event}\n"))
+
+    def since(self, task_id: str, seq: int) -> List[Tuple[int, str]]:
+        """Events of a task with a ``seq`` greater than the given one.
+
+        If neither memory nor disk reaches back to ``seq + 1`` the oldest
+        available events are returned; clients notice the gap and resync.
+        """
+        log = self.logs.get(task_id)
+        if log and log[0][0] <= seq + 1:
+            return [(event_seq, event) for event_seq, event in log if event_seq > seq]
+
+        from_disk = self._read_disk(task_id, seq)
+        if self.writer and log and (from_disk[-1][0] if from_disk else seq) < log[0][0] - 1:
+            # Events that just fell out of the ring buffer aren't written yet
+            self.flush()
+            from_disk = self._read_disk(task_id, seq)
+        if from_disk:
+            # The newest events may still be waiting for the writer
+            last_seq = from_disk[-1][0]
+            return from_disk + [(event_seq, event) for event_seq, event in (log or []) if event_seq > last_seq]
+        return [(event_seq, event) for event_seq, event in (log or []) if event_seq > seq]
+
+    def forget(self, task_id: str):
+        """Drop the log of a deleted task"""
+        self.logs.pop(task_id, None)
+        if self.writer:
+            # Queued behind the task's pending appends
+            self.writes.put(("remove", task_id, None))
+
+    def flush(self):
+        """Wait until every queued disk write is done"""
+        if self.writer:
+            self.writes.join()
+
+    def close(self):
+        """Finish the queued disk writes and stop the writer"""
+        if self.writer and self.writer.is_alive():
+            self.writes.put(None)
+            self.writer.join()
+
+    def _path(self, task_id: str) -> str:
+        return os.path.join(self.directory, f"{os.path.basename(task_id)}.jsonl")
+
+    def _read_disk(self, task_id: str, seq: int) -> List[Tuple[int, str]]:
+        if not self.directory:
+            return []
+        events = []
+        try:
+            with open(self._path(task_id)) as f:
+                for line in f:
+                    prefix, tab, event = line.rstrip("\n").partition("\t")
+                    if tab and prefix.isdigit():
+                        event_seq = int(prefix)
+                    else:
+                        # Written before lines had a seq prefix
+                        event = prefix
+                        event_seq = json.loads(event).get("seq")
+                    if event_seq is not None and event_seq > seq:
+                        events.append((event_seq, event))
+        except FileNotFoundError:
+            return []
+        return events
+
+    def _write_loop(self):
+        while True:
+            item = self.writes.get()
+            batch = [item]
+            # Write whatever else is queued in one go, one open per task
+            while item is not None:
+                try:
+                    item = self.writes.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+            pending: Dict[str, List[str]] = {}
+            for write in batch:
+                if write is None:
+                    continue
+                action, task_id, line = write
+                if action == "append":
+                    pending.setdefault(task_id, []).append(line)
+                else:
+                    pending.pop(task_id, None)
+                    try:
+                        os.remove(self._path(task_id))
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        logger.error(f"Error removing event log for task {task_id}: {e}")
+            for task_id, lines in pending.items():
+                try:
+                    with open(self._path(task_id), "a") as f:
+                        f.writelines(lines)
+                except OSError as e:
+                    logger.error(f"Error writing event log for task {task_id}: {e}")
+            for _ in batch:
+                self.writes.task_done()
+            if batch[-1] is None:
+                return
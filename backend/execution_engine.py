@@ -1,228 +1,342 @@
 import asyncio
+import itertools
 import json
-import uuid
 import logging
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+import os
+import time
+from typing import List, Dict, Any, Optional, Tuple, Union
+from datetime import datetime, timedelta
+from sqlalchemy import insert, update
 from sqlalchemy.orm import Session
 
-from database import get_db, Task, Subtask, TaskStatus, SubtaskStatus
-from schemas import ExecutionContext, AgentResult, WebSocketMessage
+from database import SessionLocal, DB_POOL_SIZE, Task, Subtask, TaskStatus, SubtaskStatus
+from schemas import ExecutionContext, AgentChunk, WebSocketMessage, TaskResponse, SubtaskResponse
 from agents import AgentRegistry
 from websocket_manager import WebSocketManager
+from task_state import TaskStateTracker
+from response_cache import ResponseCache
+from task_records import TaskRecord, SubtaskRecord
+from aggregators import get_aggregator
+from stats import record_transition, record_outcome
+from search import search_index
+from cost_model import CostModel
 
 logger = logging.getLogger(__name__)
 
+# Workers running submitted tasks. Each running task holds a database
+# connection, so by default this matches the pool size.
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", str(DB_POOL_SIZE)))
+# Queued tasks run in order of enqueue time plus this many times their
+# expected run time: shortest first, but nothing waits forever behind
+# shorter tasks. 0 runs them in submission order.
+SCHEDULER_ESTIMATE_WEIGHT = float(os.getenv("SCHEDULER_ESTIMATE_WEIGHT", "1.0"))
+
+# Subtasks of each workflow type as (agent, description template); each one
+# depends on the one before it
+WORKFLOW_STEPS = {
+    "research_write_review": [
+        ("Research Agent", "Research information about: {}"),
+        ("Writer Agent", "Write content based on research for: {}"),
+        ("Reviewer Agent", "Review and improve content for: {}")
+    ],
+    "data_analysis": [
+        ("Data Agent", "Fetch data for: {}"),
+        ("Analysis Agent", "Analyze data for: {}")
+    ]
+}
+CUSTOM_WORKFLOW_STEPS = [("General Agent", "Process task: {}")]
+
 class ExecutionEngine:
-    def __init__(self, websocket_manager: WebSocketManager):
+    def __init__(self, websocket_manager: WebSocketManager, agent_registry: Optional[AgentRegistry] = None):
         self.websocket_manager = websocket_manager
-        self.agent_registry = AgentRegistry()
+        self.agent_registry = agent_registry or AgentRegistry()
+        self.task_state = TaskStateTracker()
+        self.response_cache = ResponseCache()
+        self.cost_model = CostModel()
+        # Entries are (priority, sequence number, task id)
+        self.queue: "asyncio.PriorityQueue[Tuple[float, int, str]]" = asyncio.PriorityQueue()
+        self.queue_seq = itertools.count()
+        self.workers: List[asyncio.Task] = []
+        # Executions in progress, so they can be cancelled
+        self.running: Dict[str, asyncio.Task] = {}
+        # Runtime records of tasks that are executing
+        self.inflight: Dict[str, TaskRecord] = {}
+    
+    async def _emit(self, task_id: str, event_type: str, message: Optional[str] = None,
+                    subtask_id: Optional[str] = None, progress: Optional[int] = None,
+                    data: Optional[Dict[str, Any]] = None, **changes):
+        """Record a state change and broadcast it with its versioned delta.
+        
+        ``changes`` are passed to TaskStateTracker.apply. Call this right
+        after committing the change, so the version never runs ahead of the
+        database.
+        """
+        seq, delta = self.task_state.apply(task_id, subtask_id=subtask_id, **changes)
+        await self.websocket_manager.broadcast(task_id, WebSocketMessage(
+            type=event_type,
+            task_id=task_id,
+            subtask_id=subtask_id,
+            message=message,
+            progress=progress,
+            data=data,
+            seq=seq,
+            delta=delta or None
+        ))
+        
+    async def announce_task(self, task: Union[Task, TaskResponse]):
+        """Emit a task_created event carrying the new task's fields"""
+        if isinstance(task, Task):
+            task = TaskResponse.from_orm(task)
+        await self._emit(task.id, "task_created", message="Task created", task=task.dict())
+    
+    async def announce_tasks(self, rows: List[Dict[str, Any]]):
+        """Announce a batch of new tasks given their column values.
+        
+        Only filter subscribers can be waiting for tasks whose ids they don't
+        know yet, so without any the events are skipped and only the fields
+        they filter on are recorded.
+        """
+        if self.websocket_manager.subscribed_filters:
+            for row in rows:
+                await self.announce_task(TaskResponse(**row))
+            return
+        for row in rows:
+            self.websocket_manager.track_task(row["id"], status=row["status"].value,
+                                              workflow_type=row["workflow_type"])
+    
+    def enqueue(self, task_ids: List[str], workflow_types: Optional[List[str]] = None):
+        """Queue tasks for execution by a bounded pool of workers.
+        
+        Unlike spawning one coroutine per task, this keeps large batches from
+        all competing for database connections at once. Given the tasks'
+        workflow types, shorter tasks are started first (see
+        SCHEDULER_ESTIMATE_WEIGHT).
+        """
+        self.workers = [worker for worker in self.workers if not worker.done()]
+        if not self.workers:
+            # Workers only stop with their event loop; start over in this one
+            self.queue = asyncio.PriorityQueue()
+        for _ in range(TASK_WORKERS - len(self.workers)):
+            self.workers.append(asyncio.create_task(self._worker()))
+        now = time.monotonic()
+        for index, task_id in enumerate(task_ids):
+            priority = now
+            if workflow_types:
+                priority += SCHEDULER_ESTIMATE_WEIGHT * self.estimate_workflow(workflow_types[index])
+            self.queue.put_nowait((priority, next(self.queue_seq), task_id))
+    
+    def estimate_workflow(self, workflow_type: str) -> float:
+        """Expected run time in seconds of a task that hasn't started"""
+        steps = WORKFLOW_STEPS.get(workflow_type, CUSTOM_WORKFLOW_STEPS)
+        return self.cost_model.workflow_seconds(workflow_type, [agent_name for agent_name, _ in steps])
+    
+    def eta(self, task_id: str) -> Optional[datetime]:
+        """Predicted completion time of a task executing in this process"""
+        record = self.inflight.get(task_id)
+        return record.eta if record else None
+    
+    async def _worker(self):
+        while True:
+            _, _, task_id = await self.queue.get()
+            try:
+                # wait() rather than await, so cancelling the execution
+                # doesn't cancel the worker
+                await asyncio.wait([self.start(task_id)])
+            except Exception as e:
+                logger.error(f"Error running queued task {task_id}: {e}")
+            finally:
+                self.queue.task_done()
+    
+    def start(self, task_id: str) -> asyncio.Task:
+        """Execute a task in the background, keeping track of it for cancel().
+        
+        The execution is named ``task:<id>`` and tasks it spawns
+        ``task:<id>/...``, so profiles can tell which task they work for.
+        """
+        execution = asyncio.create_task(self.execute_task(task_id), name=f"task:{task_id}")
+        self.running[task_id] = execution
+        execution.add_done_callback(lambda _: self.running.pop(task_id, None))
+        return execution
+    
+    async def cancel(self, task_ids: List[str]) -> int:
+        """Stop executions of the given tasks; returns how many were running"""
+        executions = [self.running[task_id] for task_id in task_ids if task_id in self.running]
+        for execution in executions:
+            execution.cancel()
+        # Let them unwind (and close their sessions) before the caller
+        # touches the same rows
+        await asyncio.gather(*executions, return_exceptions=True)
+        return len(executions)
+    
+    async def execute_task(self, task_id: str, db: Optional[Session] = None):
+        """Main execution method for a task.
+        
+        Runs in the background after the creating request has finished, so by
+        default it uses a session of its own rather than the request's.
+        
+        Runtime state lives in compact TaskRecord/SubtaskRecord objects; the
+        database is only written to (with plain UPDATEs), so no ORM objects
+        pile up in the session while the task runs.
+        """
+        if db is None:
+            db = SessionLocal()
+            try:
+                return await self.execute_task(task_id, db)
+            finally:
+                db.close()
         
-    async def execute_task(self, task_id: str, db: Session):
-        """Main execution method for a task"""
         try:
             # Get task from database
-            task = db.query(Task).filter(Task.id == task_id).first()
+            task = db.query(Task.description, Task.workflow_type, Task.status).filter(Task.id == task_id).first()
             if not task:
                 logger.error(f"Task {task_id} not found")
                 return
                 
             # Update task status
-            task.status = TaskStatus.RUNNING
-            task.updated_at = datetime.utcnow()
-            db.commit()
-            
-            # Emit task started event
-            await self.websocket_manager.broadcast(task_id, WebSocketMessage(
-                type="task_started",
-                task_id=task_id,
-                message="Task execution started"
-            ))
+            started_at = datetime.utcnow()
+            record_transition(db, task.status, TaskStatus.RUNNING)
+            search_index.clear_outputs(db, task_id)
+            self._update(db, Task, task_id, status=TaskStatus.RUNNING, updated_at=started_at)
+            # A task that ran before may have cached responses
+            self.response_cache.invalidate(task_id)
             
             # Decompose task into subtasks
-            await self._decompose_task(task, db)
+            record, rows = await self._decompose_task(task_id, task.description, task.workflow_type,
+                                                      started_at, db)
+            self.inflight[task_id] = record
+            record.eta = started_at + timedelta(seconds=self.cost_model.critical_path(record, started_at))
+            
+            # Emit task started event
+            await self._emit(task_id, "task_started", message="Task execution started",
+                             data={"eta": record.eta},
+                             task={"status": TaskStatus.RUNNING, "updated_at": started_at, "eta": record.eta})
+            for row in rows:
+                await self._emit(task_id, "subtask_created", subtask_id=row["id"],
+                                 message=f"{row['agent_name']} assigned",
+                                 subtask=SubtaskResponse(**row).dict())
             
             # Execute subtasks
-            await self._execute_subtasks(task_id, db)
+            await self._execute_subtasks(record, db)
             
             # Aggregate results
-            logger.info(f"Starting aggregation for task {task_id}")
-            await self._aggregate_results(task_id, db)
-            logger.info(f"Completed aggregation for task {task_id}")
+            await self._aggregate_results(record, db)
             
         except Exception as e:
             logger.error(f"Error executing task {task_id}: {e}")
             await self._handle_task_failure(task_id, str(e), db)
+        finally:
+            self.inflight.pop(task_id, None)
     
-    async def _decompose_task(self, task: Task, db: Session):
-        """Decompose task into subtasks based on workflow type"""
-        if task.workflow_type == "research_write_review":
-            # Create research subtask
-            research_subtask = Subtask(
-                id=f"{task.id}-0",
-                task_id=task.id,
-                agent_name="Research Agent",
-                description=f"Research information about: {task.description}",
-                dependencies=None,
-                order=0
-            )
-            db.add(research_subtask)
-            
-            # Create writer subtask
-            writer_subtask = Subtask(
-                id=f"{task.id}-1",
-                task_id=task.id,
-                agent_name="Writer Agent",
-                description=f"Write content based on research for: {task.description}",
-                dependencies=json.dumps([research_subtask.id]),
-                order=1
-            )
-            db.add(writer_subtask)
-            
-            # Create reviewer subtask
-            reviewer_subtask = Subtask(
-                id=f"{task.id}-2",
-                task_id=task.id,
-                agent_name="Reviewer Agent",
-                description=f"Review and improve content for: {task.description}",
-                dependencies=json.dumps([writer_subtask.id]),
-                order=2
-            )
-            db.add(reviewer_subtask)
-            
-        elif task.workflow_type == "data_analysis":
-            # Create data fetching subtask
-            fetch_subtask = Subtask(
-                id=f"{task.id}-0",
-                task_id=task.id,
-                agent_name="Data Agent",
-                description=f"Fetch data for: {task.description}",
-                dependencies=None,
-                order=0
-            )
-            db.add(fetch_subtask)
-            
-            # Create analysis subtask
-            analysis_subtask = Subtask(
-                id=f"{task.id}-1",
-                task_id=task.id,
-                agent_name="Analysis Agent",
-                description=f"Analyze data for: {task.description}",
-                dependencies=json.dumps([fetch_subtask.id]),
-                order=1
-            )
-            db.add(analysis_subtask)
-            
-        else:  # Custom workflow
-            # Create a single general subtask
-            general_subtask = Subtask(
-                id=f"{task.id}-0",
-                task_id=task.id,
-                agent_name="General Agent",
-                description=f"Process task: {task.description}",
-                dependencies=None,
-                order=0
-            )
-            db.add(general_subtask)
+    def _update(self, db: Session, model, row_id: str, **values):
+        """Write columns of one task or subtask row and commit"""
+        db.execute(update(model).where(model.id == row_id).values(**values))
+        db.commit()
+    
+    async def _decompose_task(self, task_id: str, description: str, workflow_type: str,
+                              started_at: datetime, db: Session) -> Tuple[TaskRecord, List[Dict[str, Any]]]:
+        """Decompose task into subtasks based on workflow type.
         
+        Each step depends on the one before it. Returns the runtime record and
+        the inserted rows.
+        """
+        steps = WORKFLOW_STEPS.get(workflow_type, CUSTOM_WORKFLOW_STEPS)
+        now = datetime.utcnow()
+        rows = []
+        for order, (agent_name, template) in enumerate(steps):
+            rows.append({
+                "id": f"{task_id}-{order}",
+                "task_id": task_id,
+                "agent_name": agent_name,
+                "description": template.format(description),
+                "status": SubtaskStatus.PENDING,
+                "progress": 0,
+                "dependencies": json.dumps([f"{task_id}-{order - 1}"]) if order else None,
+                "order": order,
+                "created_at": now
+            })
+        db.execute(insert(Subtask), rows)
         db.commit()
+        
+        record = TaskRecord(task_id, description, workflow_type, started_at, [
+            SubtaskRecord(row["id"], row["agent_name"], row["description"], row["order"],
+                          json.loads(row["dependencies"]) if row["dependencies"] else ())
+            for row in rows
+        ])
+        return record, rows
     
-    async def _execute_subtasks(self, task_id: str, db: Session):
-        """Execute subtasks in dependency order"""
-        completed_subtasks = set()
-        ready_queue = []
+    async def _execute_subtasks(self, record: TaskRecord, db: Session):
+        """Execute subtasks in dependency order.
         
-        # Get subtask IDs that have no dependencies - use fresh database query
-        all_subtasks = db.query(Subtask).filter(Subtask.task_id == task_id).all()
-        for subtask in all_subtasks:
-            if not subtask.dependencies:
-                ready_queue.append(subtask.id)
+        Ready subtasks are started longest remaining path first, so the
+        critical path gets the first shot at agents and connections. Progress
+        is the share of the expected run time that has elapsed.
+        """
+        ready_queue = record.ready()
         
         while ready_queue:
             # Execute all ready subtasks in parallel
-            subtask_ids_to_execute = ready_queue.copy()
-            ready_queue.clear()
-            
-            # Execute subtasks concurrently
-            execution_tasks = []
-            for subtask_id in subtask_ids_to_execute:
-                execution_tasks.append(self._execute_single_subtask(subtask_id, task_id, db))
-            
-            # Wait for all subtasks to complete
-            results = await asyncio.gather(*execution_tasks, return_exceptions=True)
-            
-            # Process results and update ready queue
-            for i, result in enumerate(results):
-                subtask_id = subtask_ids_to_execute[i]
+            paths = self.cost_model.remaining_paths(record)
+            subtasks_to_execute = sorted(ready_queue, key=lambda subtask: -paths[subtask.id])
+            ready_queue = []
+            
+            # Wait for all subtasks to complete. A lone subtask (every step of
+            # a sequential workflow) runs in this task rather than a new one
+            if len(subtasks_to_execute) == 1:
+                try:
+                    results = [await self._execute_single_subtask(subtasks_to_execute[0], record, db)]
+                except Exception as e:
+                    results = [e]
+            else:
+                results = await asyncio.gather(*(
+                    asyncio.create_task(self._execute_single_subtask(subtask, record, db),
+                                        name=f"task:{record.id}/{subtask.id}")
+                    for subtask in subtasks_to_execute
+                ), return_exceptions=True)
+            
+            # Release dependents of the subtasks that completed
+            for subtask, result in zip(subtasks_to_execute, results):
                 if isinstance(result, Exception):
-                    logger.error(f"Subtask {subtask_id} failed: {result}")
-                    # Update subtask status in database
-                    db_subtask = db.query(Subtask).filter(Subtask.id == subtask_id).first()
-                    if db_subtask:
-                        db_subtask.status = SubtaskStatus.FAILED
-                        db_subtask.error_message = str(result)
-                        db.commit()
-                else:
-                    completed_subtasks.add(subtask_id)
-                    # Update subtask status in database
-                    db_subtask = db.query(Subtask).filter(Subtask.id == subtask_id).first()
-                    if db_subtask:
-                        db_subtask.status = SubtaskStatus.COMPLETED
-                        db_subtask.completed_at = datetime.utcnow()
-                        db.commit()
-                    
-                    # Check if any other subtasks are now ready
-                    # Get fresh subtask list from database
-                    all_subtasks = db.query(Subtask).filter(Subtask.task_id == task_id).all()
-                    for other_subtask in all_subtasks:
-                        if (other_subtask.id not in completed_subtasks and 
-                            other_subtask.status == SubtaskStatus.PENDING):
-                            
-                            dependencies = json.loads(other_subtask.dependencies) if other_subtask.dependencies else []
-                            if all(dep in completed_subtasks for dep in dependencies):
-                                ready_queue.append(other_subtask.id)
+                    logger.error(f"Subtask {subtask.id} failed: {result}")
+                    continue
+                for dependent in subtask.dependents:
+                    dependent.in_degree -= 1
+                    if dependent.in_degree == 0 and dependent.status == SubtaskStatus.PENDING:
+                        ready_queue.append(dependent)
             
             # Update task progress
-            total_subtasks = db.query(Subtask).filter(Subtask.task_id == task_id).count()
-            progress = int((len(completed_subtasks) / total_subtasks) * 100)
-            task = db.query(Task).filter(Task.id == task_id).first()
-            task.progress = progress
-            db.commit()
+            now = datetime.utcnow()
+            elapsed = (now - record.started_at).total_seconds()
+            remaining = self.cost_model.critical_path(record, now)
+            progress = int(100 * elapsed / (elapsed + remaining)) if remaining else 100
+            record.eta = now + timedelta(seconds=remaining)
+            self._update(db, Task, record.id, progress=progress)
             
             # Emit progress update
-            await self.websocket_manager.broadcast(task_id, WebSocketMessage(
-                type="task_progress",
-                task_id=task_id,
-                progress=progress,
-                message=f"Progress: {progress}%"
-            ))
+            await self._emit(record.id, "task_progress", progress=progress,
+                             message=f"Progress: {progress}%, about {remaining:.0f}s left",
+                             data={"eta": record.eta, "remaining_seconds": round(remaining, 3)},
+                             task={"progress": progress, "eta": record.eta})
     
-    async def _execute_single_subtask(self, subtask_id: str, task_id: str, db: Session):
+    async def _execute_single_subtask(self, subtask: SubtaskRecord, record: TaskRecord, db: Session):
         """Execute a single subtask"""
+        task_id = record.id
+        started_at = datetime.utcnow()
         try:
-            # Get fresh subtask from database
-            subtask = db.query(Subtask).filter(Subtask.id == subtask_id).first()
-            if not subtask:
-                raise Exception(f"Subtask {subtask_id} not found")
-            
             # Update subtask status
             subtask.status = SubtaskStatus.RUNNING
-            subtask.started_at = datetime.utcnow()
-            db.commit()
+            subtask.started_at = started_at
+            self._update(db, Subtask, subtask.id, status=SubtaskStatus.RUNNING, started_at=started_at)
             
             # Emit subtask started event
-            await self.websocket_manager.broadcast(task_id, WebSocketMessage(
-                type="subtask_started",
-                task_id=task_id,
-                subtask_id=subtask.id,
-                message=f"{subtask.agent_name} started"
-            ))
+            await self._emit(task_id, "subtask_started", subtask_id=subtask.id,
+                             message=f"{subtask.agent_name} started",
+                             subtask={"status": SubtaskStatus.RUNNING, "started_at": started_at})
             
             # Prepare execution context
             context = ExecutionContext(
                 subtask_id=subtask.id,
-                input_data=self._get_input_data(subtask.id, db),
-                shared_context={"description": subtask.task.description}
+                input_data=self._get_input_data(subtask, record),
+                shared_context={"description": record.description}
             )
             
             # Get agent and execute
@@ -230,137 +344,105 @@ class ExecutionEngine:
             if not agent:
                 raise Exception(f"Agent {subtask.agent_name} not found")
             
-            # Execute agent
-            result = await agent.execute(context)
+            # Execute agent, forwarding partial output as it is produced;
+            # batchable agents are called together with other subtasks instead
+            result = None
+            streamed_fields = set()
+            if self.agent_registry.dispatcher.batches_for(agent):
+                result = await self.agent_registry.execute(agent, context)
+            else:
+                async for item in agent.stream(context):
+                    if isinstance(item, AgentChunk):
+                        streamed_fields.add(item.field)
+                        await self._emit(task_id, "subtask_chunk", subtask_id=subtask.id,
+                                         output_append={item.field: item.text})
+                    else:
+                        result = item
+            
+            # A failed call goes through the failure path below, so it counts
+            # as a failure and stays out of the latency history
+            if result is None:
+                raise Exception(f"Agent {subtask.agent_name} returned no result")
+            if not result.success:
+                raise Exception(result.error or f"Agent {subtask.agent_name} failed")
             
             # Store result
-            subtask.output_data = json.dumps(result.data) if result.data else None
-            subtask.progress = 100
+            completed_at = datetime.utcnow()
+            # The agent's own time, without waiting for the database or a batch
+            seconds = result.execution_time
+            if seconds is None:
+                seconds = (completed_at - started_at).total_seconds()
+            record_outcome(db, "agent", subtask.agent_name, started_at, completed_at, True, seconds=seconds)
+            search_index.add_output(db, task_id, result.data)
+            self._update(db, Subtask, subtask.id,
+                         output_data=json.dumps(result.data) if result.data else None,
+                         progress=100, status=SubtaskStatus.COMPLETED, completed_at=completed_at)
+            subtask.output = result.data or None
             subtask.status = SubtaskStatus.COMPLETED
-            subtask.completed_at = datetime.utcnow()
-            db.commit()
-            
-            # Debug logging
-            logger.info(f"Subtask {subtask.id} completed with output: {result.data}")
-            if result.data and "content" in result.data:
-                logger.info(f"Content length: {len(result.data['content'])}")
-                logger.info(f"Content preview: {result.data['content'][:200]}...")
-            
-            # Emit subtask completed event
-            await self.websocket_manager.broadcast(task_id, WebSocketMessage(
-                type="subtask_completed",
-                task_id=task_id,
-                subtask_id=subtask.id,
-                message=f"{subtask.agent_name} completed",
-                data=result.data
-            ))
+            self.cost_model.observe("agent", subtask.agent_name, seconds)
+            
+            # Lazily formatted and truncated by the log handler
+            logger.debug("Subtask %s completed with output: %s", subtask.id, result.data)
+            
+            # Emit subtask completed event; streamed fields were already sent
+            # as chunks, so only the rest of the output goes with it
+            completed_data = result.data
+            if result.data and streamed_fields:
+                completed_data = {k: v for k, v in result.data.items() if k not in streamed_fields}
+            await self._emit(task_id, "subtask_completed", subtask_id=subtask.id,
+                             message=f"{subtask.agent_name} completed",
+                             subtask={"status": SubtaskStatus.COMPLETED, "progress": 100,
+                                      "completed_at": completed_at},
+                             output=completed_data or {})
             
             return result
             
         except Exception as e:
-            logger.error(f"Error executing subtask {subtask_id}: {e}")
-            # Get fresh subtask for error update
-            subtask = db.query(Subtask).filter(Subtask.id == subtask_id).first()
-            if subtask:
-                subtask.status = SubtaskStatus.FAILED
-                subtask.error_message = str(e)
-                db.commit()
+            logger.error(f"Error executing subtask {subtask.id}: {e}")
+            subtask.status = SubtaskStatus.FAILED
+            db.rollback()
+            record_outcome(db, "agent", subtask.agent_name, started_at, datetime.utcnow(), False)
+            self._update(db, Subtask, subtask.id, status=SubtaskStatus.FAILED, error_message=str(e))
             
             # Emit subtask failed event
-            await self.websocket_manager.broadcast(task_id, WebSocketMessage(
-                type="subtask_failed",
-                task_id=task_id,
-                subtask_id=subtask_id,
-                message=f"Subtask failed: {str(e)}"
-            ))
+            await self._emit(task_id, "subtask_failed", subtask_id=subtask.id,
+                             message=f"Subtask failed: {str(e)}",
+                             subtask={"status": SubtaskStatus.FAILED, "error_message": str(e)})
             
             raise e
     
-    def _get_input_data(self, subtask_id: str, db: Session) -> Dict[str, Any]:
+    def _get_input_data(self, subtask: SubtaskRecord, record: TaskRecord) -> Dict[str, Any]:
         """Get input data for a subtask from its dependencies"""
         input_data = {}
-        
-        # Get fresh subtask from database
-        subtask = db.query(Subtask).filter(Subtask.id == subtask_id).first()
-        if not subtask:
-            return input_data
-        
-        if subtask.dependencies:
-            dependencies = json.loads(subtask.dependencies)
-            for dep_id in dependencies:
-                dep_subtask = db.query(Subtask).filter(Subtask.id == dep_id).first()
-                if dep_subtask and dep_subtask.output_data:
-                    dep_data = json.loads(dep_subtask.output_data)
-                    input_data[dep_id] = dep_data
-        
+        for dep_id in subtask.dependencies:
+            dep_output = record.subtasks[dep_id].output
+            if dep_output:
+                input_data[dep_id] = dep_output
         return input_data
     
-    async def _aggregate_results(self, task_id: str, db: Session):
-        """Aggregate results from all subtasks"""
+    async def _aggregate_results(self, record: TaskRecord, db: Session):
+        """Aggregate results from all subtasks with the workflow's aggregator"""
+        task_id = record.id
         try:
-            task = db.query(Task).filter(Task.id == task_id).first()
-            subtasks = db.query(Subtask).filter(Subtask.task_id == task_id).order_by(Subtask.order).all()
-            
-            # Collect all outputs
-            results = {}
-            final_content = ""
-            
-            for subtask in subtasks:
-                logger.info(f"Processing subtask {subtask.id} with order {subtask.order}")
-                if subtask.output_data:
-                    data = json.loads(subtask.output_data)
-                    results[subtask.id] = data
-                    logger.info(f"Subtask {subtask.id} output data: {data}")
-                    
-                    # Get the main content from the last subtask (highest order)
-                    if subtask.order == max([s.order for s in subtasks]):
-                        # Check for different content fields
-                        final_content = data.get("content", "") or data.get("improved_content", "") or data.get("original_content", "")
-                        logger.info(f"Final content from subtask {subtask.id}: {final_content[:100]}...")
-                else:
-                    logger.warning(f"Subtask {subtask.id} has no output data")
-            
-            # If no content found, try to get content from any subtask
-            if not final_content:
-                for subtask in subtasks:
-                    if subtask.output_data:
-                        data = json.loads(subtask.output_data)
-                        # Check for different content fields
-                        content = data.get("content", "") or data.get("improved_content", "") or data.get("original_content", "")
-                        if content:
-                            final_content = content
-                            logger.info(f"Content found in subtask {subtask.id}: {final_content[:100]}...")
-                            break
-            
-            # Create aggregated result
-            aggregated = {
-                "summary": "Task completed successfully",
-                "results": results,
-                "final_content": final_content,
-                "total_subtasks": len(subtasks),
-                "completed_at": datetime.utcnow().isoformat()
-            }
-            
-            logger.info(f"Aggregated results for task {task_id}: {aggregated}")
+            final_output = get_aggregator(record.workflow_type).encode(record)
+            logger.debug("Aggregated %d subtasks of task %s into %d characters",
+                         len(record.subtasks), task_id, len(final_output))
             
             # Store final output
-            task.final_output = json.dumps(aggregated)
-            task.status = TaskStatus.COMPLETED
-            task.progress = 100
-            task.updated_at = datetime.utcnow()
-            db.commit()
-            
-            # Debug: Check what was stored
-            logger.info(f"Task {task_id} final_output stored: {task.final_output}")
-            logger.info(f"Task {task_id} status: {task.status}")
+            completed_at = datetime.utcnow()
+            record_transition(db, TaskStatus.RUNNING, TaskStatus.COMPLETED)
+            record_outcome(db, "workflow", record.workflow_type, record.started_at, completed_at, True)
+            self._update(db, Task, task_id, final_output=final_output, status=TaskStatus.COMPLETED,
+                         progress=100, updated_at=completed_at)
+            self.cost_model.observe("workflow", record.workflow_type,
+                                    (completed_at - record.started_at).total_seconds())
+            record.eta = None
             
             # Emit task completed event
-            await self.websocket_manager.broadcast(task_id, WebSocketMessage(
-                type="task_completed",
-                task_id=task_id,
-                message="Task completed successfully",
-                data=aggregated
-            ))
+            await self._emit(task_id, "task_completed", message="Task completed successfully",
+                             task={"status": TaskStatus.COMPLETED, "progress": 100,
+                                   "final_output": final_output, "updated_at": completed_at, "eta": None})
+            self.task_state.finish(task_id)
             
         except Exception as e:
             logger.error(f"Error aggregating results for task {task_id}: {e}")
@@ -368,16 +450,22 @@ class ExecutionEngine:
     
     async def _handle_task_failure(self, task_id: str, error_message: str, db: Session):
         """Handle task failure"""
-        task = db.query(Task).filter(Task.id == task_id).first()
-        if task:
-            task.status = TaskStatus.FAILED
-            task.final_output = json.dumps({"error": error_message})
-            task.updated_at = datetime.utcnow()
-            db.commit()
-            
-            # Emit task failed event
-            await self.websocket_manager.broadcast(task_id, WebSocketMessage(
-                type="task_failed",
-                task_id=task_id,
-                message=f"Task failed: {error_message}"
-            ))
+        db.rollback()
+        task = db.query(Task.status, Task.workflow_type).filter(Task.id == task_id).first()
+        if not task:
+            return
+        
+        final_output = json.dumps({"error": error_message})
+        failed_at = datetime.utcnow()
+        record_transition(db, task.status, TaskStatus.FAILED)
+        record = self.inflight.get(task_id)
+        if record:
+            record_outcome(db, "workflow", task.workflow_type, record.started_at, failed_at, False)
+            record.eta = None
+        self._update(db, Task, task_id, status=TaskStatus.FAILED, final_output=final_output, updated_at=failed_at)
+        
+        # Emit task failed event
+        await self._emit(task_id, "task_failed", message=f"Task failed: {error_message}",
+                         task={"status": TaskStatus.FAILED, "final_output": final_output,
+                               "updated_at": failed_at, "eta": None})
+        self.task_state.finish(task_id)
@@ -0,0 +1,267 @@
+# Streaming export of tasks and their subtask results as NDJSON, Arrow or Parquet
+# Usage: cd backend && python export.py --format parquet --output tasks.parquet
+import argparse
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Task, Subtask, TaskStatus
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the database per round trip
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+FORMATS = ["ndjson", "arrow", "parquet"]
+
+TASK_COLUMNS = [
+    Task.id, Task.description, Task.workflow_type, Task.status, Task.progress,
+    Task.final_output, Task.created_at, Task.updated_at
+]
+
+SUBTASK_COLUMNS = [
+    Subtask.id.label("subtask_id"),
+    Subtask.agent_name,
+    Subtask.status.label("subtask_status"),
+    Subtask.output_data,
+    Subtask.error_message,
+    Subtask.order,
+    Subtask.started_at,
+    Subtask.completed_at
+]
+
+def iter_tasks(db: Session, status: Optional[TaskStatus] = None, workflow_type: Optional[str] = None,
+               include_subtasks: bool = True, batch_size: int = EXPORT_BATCH_SIZE,
+               ids: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Yield one dict per task, oldest first, with its subtasks nested.
+
+    Plain columns are selected instead of ORM objects, so nothing accumulates
+    in the session's identity map while iterating.
+    """
+    if include_subtasks:
+        query = (
+            db.query(*TASK_COLUMNS, *SUBTASK_COLUMNS)
+            .outerjoin(Subtask, Subtask.task_id == Task.id)
+            .order_by(Task.created_at, Task.id, Subtask.order)
+        )
+    else:
+        query = db.query(*TASK_COLUMNS).order_by(Task.created_at, Task.id)
+    if status:
+        query = query.filter(Task.status == status)
+    if workflow_type:
+        query = query.filter(Task.workflow_type == workflow_type)
+    if ids is not None:
+        query = query.filter(Task.id.in_(ids))
+
+    current = None
+    for row in query.execution_options(yield_per=batch_size):
+        if current is None or current["id"] != row.id:
+            if current is not None:
+                yield current
+            current = _task_record(row, include_subtasks)
+        if include_subtasks and row.subtask_id is not None:
+            current["subtasks"].append(_subtask_record(row))
+    if current is not None:
+        yield current
+
+def _task_record(row, include_subtasks: bool) -> Dict[str, Any]:
+    record = {
+        "id": row.id,
+        "description": row.description,
+        "workflow_type": row.workflow_type,
+        "status": row.status.value,
+        "progress": row.progress,
+        "final_output": row.final_output,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at
+    }
+    if include_subtasks:
+        record["subtasks"] = []
+    return record
+
+def _subtask_record(row) -> Dict[str, Any]:
+    output = None
+    if row.output_data:
+        try:
+            output = json.loads(row.output_data)
+        except json.JSONDecodeError:
+            output = {"raw": row.output_data}
+    return {
+        "id": row.subtask_id,
+        "agent_name": row.agent_name,
+        "status": row.subtask_status.value,
+        "order": row.order,
+        "output": output,
+        "error_message": row.error_message,
+        "started_at": row.started_at,
+        "completed_at": row.completed_at
+    }
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def to_json(record: Dict[str, Any]) -> str:
+    """One exported record as a line of JSON (without the newline)"""
+    return json.dumps(record, default=_json_default)
+
+def iter_task_pages(status: Optional[TaskStatus] = None, workflow_type: Optional[str] = None,
+                    include_subtasks: bool = True, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """Like iter_tasks, but ``batch_size`` tasks at a time, each page read in
+    a session of its own.
+
+    Pages follow each other by (created_at, id) rather than by OFFSET, and
+    nothing is held open between them: a transaction left open for a whole
+    download would lock SQLite writers out.
+    """
+    after = None
+    while True:
+        with SessionLocal() as db:
+            query = db.query(Task.id)
+            if status:
+                query = query.filter(Task.status == status)
+            if workflow_type:
+                query = query.filter(Task.workflow_type == workflow_type)
+            if after is not None:
+                query = query.filter(tuple_(Task.created_at, Task.id) > after)
+            ids = [row.id for row in query.order_by(Task.created_at, Task.id).limit(batch_size)]
+            if not ids:
+                return
+            records = list(iter_tasks(db, include_subtasks=include_subtasks, batch_size=batch_size, ids=ids))
+        yield from records
+        after = (records[-1]["created_at"], records[-1]["id"])
+
+def ndjson_lines(**filters) -> Iterator[bytes]:
+    """Encoded NDJSON lines for a StreamingResponse.
+
+    Reads with sessions of its own: the response body is produced after the
+    request handler (and its session) have already finished.
+    """
+    for record in iter_task_pages(**filters):
+        yield (to_json(record) + "\n").encode("utf-8")
+
+def flatten(record: Dict[str, Any]) -> Dict[str, Any]:
+    """One flat row per task, with a column per agent output field.
+
+    Columns are prefixed with the agent's name in snake case; scalars keep
+    their type and nested lists and objects are stored as JSON text.
+    """
+    row = {field: value for field, value in record.items() if field != "subtasks"}
+    prefixes: Dict[str, int] = {}
+    for subtask in record.get("subtasks", ()):
+        prefix = subtask["agent_name"].lower().replace(" ", "_")
+        prefixes[prefix] = prefixes.get(prefix, 0) + 1
+        if prefixes[prefix] > 1:
+            prefix = f"{prefix}_{prefixes[prefix]}"
+        row[f"{prefix}.status"] = subtask["status"]
+        row[f"{prefix}.error_message"] = subtask["error_message"]
+        row[f"{prefix}.started_at"] = subtask["started_at"]
+        row[f"{prefix}.completed_at"] = subtask["completed_at"]
+        for field, value in (subtask["output"] or {}).items():
+            if isinstance(value, (list, dict)):
+                value = json.dumps(value, default=_json_default)
+            row[f"{prefix}.{field}"] = value
+    return row
+
+def _batches(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def write_columnar(path: str, file_format: str, records: Iterable[Dict[str, Any]],
+                   batch_size: int = EXPORT_BATCH_SIZE) -> int:
+    """Write flattened records to an Arrow IPC or Parquet file, batch by batch.
+
+    The schema is taken from the first batch (columns with only nulls there
+    become strings); columns that first show up later are dropped with a
+    warning. Returns the number of rows written.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Arrow and Parquet export need pyarrow (pip install pyarrow)")
+
+    schema = None
+    writer = None
+    dropped = set()
+    count = 0
+    try:
+        for batch in _batches(map(flatten, records), batch_size):
+            if schema is None:
+                inferred = pa.Table.from_pylist(batch).schema
+                schema = pa.schema([
+                    pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+                    for field in inferred
+                ])
+                if file_format == "parquet":
+                    writer = pq.ParquetWriter(path, schema, compression="zstd")
+                else:
+                    writer = pa.ipc.new_file(path, schema)
+
+            new_columns = {column for row in batch for column in row} - set(schema.names) - dropped
+            if new_columns:
+                logger.warning(f"Dropping columns not in the export schema: {sorted(new_columns)}")
+                dropped |= new_columns
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+def main_cli(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Export tasks and subtask results")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--output", default="-",
+                        help="file to write, or - for stdout (NDJSON only)")
+    parser.add_argument("--status", choices=[status.value for status in TaskStatus],
+                        help="only export tasks with this status")
+    parser.add_argument("--workflow-type", help="only export tasks of this workflow type")
+    parser.add_argument("--no-subtasks", action="store_true",
+                        help="export task rows only")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE,
+                        help="rows fetched per database round trip")
+    args = parser.parse_args(argv)
+
+    filters = {
+        "status": TaskStatus(args.status) if args.status else None,
+        "workflow_type": args.workflow_type,
+        "include_subtasks": not args.no_subtasks,
+        "batch_size": args.batch_size
+    }
+
+    if args.format == "ndjson":
+        out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+        count = 0
+        try:
+            for line in ndjson_lines(**filters):
+                out.write(line)
+                count += 1
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+    else:
+        if args.output == "-":
+            parser.error(f"--output is required for {args.format}")
+        try:
+            count = write_columnar(args.output, args.format, iter_task_pages(**filters), args.batch_size)
+        except RuntimeError as e:
+            parser.exit(1, f"{e}\n")
+
+    print(f"Exported {count} tasks", file=sys.stderr)
+
+if __name__ == "__main__":
+    main_cli()
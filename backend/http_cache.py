@@ -0,0 +1,84 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import NamedTuple, Optional
+import os
+import uuid
+
+from fastapi import Request, Response
+
+# Version-based ETags are only meaningful within one process lifetime
+BOOT_ID = uuid.uuid4().hex[:8]
+
+# Cache lifetime for tasks in a terminal state, which no longer change
+COMPLETED_TASK_MAX_AGE = int(os.getenv("COMPLETED_TASK_MAX_AGE", "86400"))
+
+# Cache-Control for resources that may still change: cache, but revalidate
+REVALIDATE = "no-cache"
+
+class CacheValidators(NamedTuple):
+    etag: Optional[str]
+    cache_control: str
+    last_modified: Optional[datetime] = None
+
+def immutable_cache_control() -> str:
+    return f"public, max-age={COMPLETED_TASK_MAX_AGE}"
+
+def version_etag(task_id: str, version: int) -> str:
+    """Weak ETag for a live task, from its in-memory state version"""
+    return f'W/"{task_id}-{BOOT_ID}-{version}"'
+
+def timestamp_etag(*parts) -> str:
+    """Strong ETag from persisted values such as ``updated_at``"""
+    encoded = []
+    for part in parts:
+        if isinstance(part, datetime):
+            part = int(part.replace(tzinfo=timezone.utc).timestamp() * 1_000_000)
+        encoded.append(str(part))
+    return f'"{"-".join(encoded)}"'
+
+def http_date(value: datetime) -> str:
+    """Format a naive UTC datetime for Last-Modified"""
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+def is_not_modified(request: Request, validators: CacheValidators) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since"""
+    etag, last_modified = validators.etag, validators.last_modified
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if not etag:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison, as required for GET
+        wanted = etag[2:] if etag.startswith("W/") else etag
+        for candidate in if_none_match.split(","):
+            candidate = candidate.strip()
+            if candidate.startswith("W/"):
+                candidate = candidate[2:]
+            if candidate == wanted:
+                return True
+        return False
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+def set_cache_headers(response: Response, validators: CacheValidators) -> Response:
+    """Attach validators and Cache-Control to a response"""
+    if validators.etag:
+        response.headers["ETag"] = validators.etag
+    if validators.last_modified:
+        response.headers["Last-Modified"] = http_date(validators.last_modified)
+    response.headers["Cache-Control"] = validators.cache_control
+    return response
+
+def not_modified(validators: CacheValidators) -> Response:
+    """A 304 response carrying the same validators as the full one"""
+    return set_cache_headers(Response(status_code=304), validators)
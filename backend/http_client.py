@@ -0,0 +1,189 @@
+# Shared HTTP client (one connection pool) for agents backed by external services
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Optional
+import asyncio
+import importlib.util
+import logging
+import os
+import random
+import time
+
+if TYPE_CHECKING:
+    # Imported on first use: httpx (with certifi) adds ~30ms to every
+    # worker's start, and the built-in agents never call out
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "20"))
+# Seconds an idle connection is kept open for reuse
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+# Base delay of the exponential backoff between retries, in seconds
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.2"))
+HTTP2_ENABLED = os.getenv("HTTP2", "1") == "1"
+
+RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+class HttpCache:
+    """Hook for caching responses to GET requests; the base caches nothing"""
+
+    def key(self, request: "httpx.Request") -> str:
+        return str(request.url)
+
+    def get(self, request: "httpx.Request") -> "Optional[httpx.Response]":
+        return None
+
+    def put(self, request: "httpx.Request", response: "httpx.Response"):
+        pass
+
+class MemoryHttpCache(HttpCache):
+    """LRU of successful responses, each kept for ``ttl`` seconds"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # Cache key -> (expiry on the monotonic clock, response)
+        self.entries = OrderedDict()
+
+    def get(self, request: "httpx.Request") -> "Optional[httpx.Response]":
+        key = self.key(request)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, response = entry
+        if expires < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return response
+
+    def put(self, request: "httpx.Request", response: "httpx.Response"):
+        if response.status_code != 200 or "no-store" in response.headers.get("cache-control", ""):
+            return
+        self.entries[self.key(request)] = (time.monotonic() + self.ttl, response)
+        self.entries.move_to_end(self.key(request))
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+class AgentHttpClient:
+    """Pooled async HTTP client shared by all agents.
+
+    The first request calls ``start``: creating the client loads the CA
+    bundle (~100ms), which workers whose agents never call out don't pay.
+    """
+
+    def __init__(self, cache: Optional[HttpCache] = None, **client_options):
+        self.cache = cache or HttpCache()
+        self.client_options = client_options
+        self.client: "Optional[httpx.AsyncClient]" = None
+        self.http2 = False
+        self.host_limits: Dict[str, asyncio.Semaphore] = {}
+        self.requests = 0
+        self.retries = 0
+        self.cache_hits = 0
+
+    async def start(self):
+        if self.client is not None:
+            return
+        import httpx
+        self.http2 = HTTP2_ENABLED and http2_available()
+        options = {
+            "limits": httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                   max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                                   keepalive_expiry=HTTP_KEEPALIVE_EXPIRY),
+            "timeout": httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            "http2": self.http2,
+            **self.client_options
+        }
+        self.client = httpx.AsyncClient(**options)
+        logger.info(f"Started shared HTTP client (HTTP/2 {'on' if self.http2 else 'off'})")
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _host_limit(self, host: str) -> asyncio.Semaphore:
+        if host not in self.host_limits:
+            self.host_limits[host] = asyncio.Semaphore(HTTP_MAX_CONNECTIONS_PER_HOST)
+        return self.host_limits[host]
+
+    async def request(self, method: str, url: str, *, timeout: Optional[float] = None,
+                      retries: Optional[int] = None, use_cache: bool = False, **kwargs: Any) -> "httpx.Response":
+        """Send a request through the shared pool.
+
+        ``timeout`` overrides the default for this request. Idempotent
+        requests are retried ``retries`` times (``HTTP_RETRIES`` by default);
+        pass ``retries`` explicitly to retry a POST. With ``use_cache``, GET
+        responses go through the cache hook.
+        """
+        import httpx
+        await self.start()
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        request = self.client.build_request(method, url, **kwargs)
+        method = request.method
+        if retries is None:
+            retries = HTTP_RETRIES if method in IDEMPOTENT_METHODS else 0
+        use_cache = use_cache and method == "GET"
+
+        if use_cache:
+            cached = self.cache.get(request)
+            if cached is not None:
+                self.cache_hits += 1
+                return cached
+
+        host_limit = self._host_limit(request.url.host)
+        attempt = 0
+        while True:
+            delay = HTTP_RETRY_BACKOFF * 2 ** attempt * (0.5 + random.random())
+            async with host_limit:
+                self.requests += 1
+                try:
+                    response = await self.client.send(request)
+                    await response.aread()
+                except (httpx.ConnectError, httpx.ConnectTimeout, httpx.ReadTimeout,
+                        httpx.RemoteProtocolError) as e:
+                    if attempt >= retries:
+                        raise
+                    logger.warning(f"{method} {request.url} failed ({e!r}), retrying")
+                else:
+                    if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                        break
+                    logger.warning(f"{method} {request.url} returned {response.status_code}, retrying")
+                    retry_after = response.headers.get("retry-after", "")
+                    if retry_after.isdigit():
+                        delay = min(float(retry_after), HTTP_TIMEOUT)
+            attempt += 1
+            self.retries += 1
+            # Back off without holding the host's slot, so other requests to
+            # it aren't held up by this one's retries
+            await asyncio.sleep(delay)
+
+        if use_cache:
+            self.cache.put(request, response)
+        return response
+
+    async def get(self, url: str, **kwargs: Any) -> "httpx.Response":
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> "httpx.Response":
+        return await self.request("POST", url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "started": self.client is not None,
+            "http2": self.http2,
+            "requests": self.requests,
+            "retries": self.retries,
+            "cache_hits": self.cache_hits
+        }
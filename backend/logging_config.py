@@ -0,0 +1,157 @@
+# Logging setup: records are written off the event loop by a QueueListener,
+# with per-logger sampling and capped arguments
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import reprlib
+import sys
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# Longest rendering of a single log argument, and of a whole message
+LOG_MAX_ARG_LENGTH = int(os.getenv("LOG_MAX_ARG_LENGTH", "500"))
+LOG_MAX_MESSAGE_LENGTH = int(os.getenv("LOG_MAX_MESSAGE_LENGTH", "4000"))
+# Fraction of records below WARNING kept per logger, e.g.
+# "execution_engine=0.1,websocket_manager=0.01"
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+# Records waiting for the writer thread; beyond this new records are dropped
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_ATTRIBUTES = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
+_repr = reprlib.Repr()
+_repr.maxstring = LOG_MAX_ARG_LENGTH
+_repr.maxother = LOG_MAX_ARG_LENGTH
+_repr.maxlevel = 3
+
+def truncate(value, limit: int = LOG_MAX_ARG_LENGTH):
+    """Cap the rendered size of a log argument"""
+    if isinstance(value, str):
+        if len(value) > limit:
+            return f"{value[:limit]}... [{len(value) - limit} more chars]"
+        return value
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    return _repr.repr(value)
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of the records below WARNING from some loggers"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1 or random.random() < rate
+
+    def _rate(self, name: str) -> float:
+        # The most specific configured logger wins
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return self.rates.get("root", 1.0)
+
+    @classmethod
+    def from_string(cls, setting: str) -> "SamplingFilter":
+        rates = {}
+        for item in filter(None, (part.strip() for part in setting.split(","))):
+            name, _, rate = item.partition("=")
+            rates[name.strip()] = float(rate)
+        return cls(rates)
+
+class TruncatingQueueHandler(QueueHandler):
+    """Queues records with their message rendered from capped arguments.
+
+    Rendering happens here, on the caller's thread, only for records that
+    passed the level and sampling checks; the writer thread does the rest.
+    A full queue drops the record rather than blocking.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args:
+            args = record.args
+            if isinstance(args, dict):
+                args = {key: truncate(value) for key, value in args.items()}
+            else:
+                args = tuple(truncate(arg) for arg in args)
+            try:
+                message = str(record.msg) % args
+            except (TypeError, ValueError):
+                message = record.getMessage()
+        else:
+            message = str(record.msg)
+        if len(message) > LOG_MAX_MESSAGE_LENGTH:
+            message = truncate(message, LOG_MAX_MESSAGE_LENGTH)
+
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = message
+        record.args = None
+        if record.exc_info:
+            # Tracebacks can't cross threads as objects; render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including ``extra`` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                data[key] = value
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, default=str)
+
+_listener: Optional[QueueListener] = None
+
+def configure_logging(level: str = LOG_LEVEL, log_format: str = LOG_FORMAT) -> Optional[QueueListener]:
+    """Route all logging through a queue to a background writer thread.
+
+    Does nothing if the root logger already has handlers (e.g. when the app
+    is embedded by something that configured logging itself).
+    """
+    global _listener
+    root = logging.getLogger()
+    if root.handlers:
+        return _listener
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if log_format == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = TruncatingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter.from_string(LOG_SAMPLING))
+
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
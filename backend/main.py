@@ -1,139 +1,645 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends
+from fastapi import APIRouter, FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends, Header, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.requests import HTTPConnection
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy import func, insert
 from sqlalchemy.orm import Session
 import asyncio
+import hmac
 import json
+from contextlib import asynccontextmanager, contextmanager
 import uuid
-from datetime import datetime
-from typing import List, Dict, Any
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
 import logging
+import os
 
-from database import get_db, engine, Base
+from database import get_db, SessionLocal, TaskCount, delete_tasks
 from models import Task, Subtask, TaskStatus, SubtaskStatus
-from schemas import TaskCreate, TaskResponse, SubtaskResponse, WebSocketMessage
+from schemas import (
+    TaskCreate, TaskBatchCreate, TaskBatchResponse, TaskIds, TaskStatusSummary, TaskDeleteRequest,
+    TaskResponse, SubtaskResponse, TaskStateSnapshot, WebSocketMessage
+)
 from execution_engine import ExecutionEngine
-from agents import AgentRegistry
 from websocket_manager import WebSocketManager
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="Multi-Agent Task Orchestration", version="1.0.0")
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000", 
-        "http://127.0.0.1:3000",
-        "https://multiagent-task-solver.onrender.com",
-        "https://multi-agent-task-solver.onrender.com"
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+from http_cache import (
+    CacheValidators, REVALIDATE, immutable_cache_control, version_etag, timestamp_etag,
+    is_not_modified, not_modified, set_cache_headers
 )
+from response_cache import serialize
+from export import ndjson_lines
+from logging_config import configure_logging
+from retention import RetentionWorker
+from stats import record_transition, get_stats
+from search import search_index, SearchError
+from profiling import Profiler, ProfilingError, ProfilerBusy, PROFILE_INTERVAL_MS
+from schema import ensure_schema
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run background workers and the agents' HTTP client for as long as the app is up"""
+    # Configure logging: queued, sampled and size-capped (see logging_config.py)
+    configure_logging()
+    # One query unless this deployment changed the schema (see schema.py)
+    ensure_schema()
+    # Execution time estimates start from the recorded history
+    with SessionLocal() as session:
+        app.state.execution_engine.cost_model.load(session)
+    app.state.retention_worker.start()
+    yield
+    await app.state.retention_worker.stop()
+    await app.state.execution_engine.agent_registry.http.close()
 
-# WebSocket manager
-websocket_manager = WebSocketManager()
+def create_app() -> FastAPI:
+    """Build the application; ``uvicorn main:create_app --factory`` uses it
+    directly, ``uvicorn main:app`` the one built at import.
+    
+    Each app has its own engine, queues and connections, kept on
+    ``app.state``. Nothing touches the database or configures logging until
+    the lifespan starts.
+    """
+    app = FastAPI(title="Multi-Agent Task Orchestration", version="1.0.0", lifespan=lifespan)
+    
+    # WebSocket manager
+    websocket_manager = WebSocketManager(load_task_attributes=_unfinished_task_attributes)
+    app.state.websocket_manager = websocket_manager
+    # Execution engine; its agent registry is the one the whole app shares
+    execution_engine = ExecutionEngine(websocket_manager)
+    app.state.execution_engine = execution_engine
+    # Background archival and deletion of expired tasks
+    app.state.retention_worker = RetentionWorker(
+        on_delete=lambda task_ids: _forget_tasks(execution_engine, task_ids)
+    )
+    # On-demand profiling of the live process
+    app.state.profiler = Profiler(execution_engine.running)
+    
+    # CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[
+            "http://localhost:3000", 
+            "http://127.0.0.1:3000",
+            "https://multiagent-task-solver.onrender.com",
+            "https://multi-agent-task-solver.onrender.com"
+        ],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.include_router(router)
+    return app
 
-# Execution engine
-execution_engine = ExecutionEngine(websocket_manager)
+def _unfinished_task_attributes(task_filter: Dict[str, List[str]]) -> Dict[str, Dict[str, Any]]:
+    """Status and workflow type of pending and running tasks matching a
+    multiplexed subscription's filter"""
+    statuses = [TaskStatus.PENDING, TaskStatus.RUNNING]
+    if "status" in task_filter:
+        statuses = [status for status in statuses if status.value in task_filter["status"]]
+        if not statuses:
+            return {}
+    with SessionLocal() as db:
+        query = db.query(Task.id, Task.status, Task.workflow_type).filter(Task.status.in_(statuses))
+        if "workflow_type" in task_filter:
+            query = query.filter(Task.workflow_type.in_(task_filter["workflow_type"]))
+        return {row.id: {"status": row.status.value, "workflow_type": row.workflow_type} for row in query}
 
-# Agent registry
-agent_registry = AgentRegistry()
+def _forget_tasks(execution_engine: ExecutionEngine, task_ids: List[str]):
+    """Drop in-memory state about deleted tasks"""
+    for task_id in task_ids:
+        execution_engine.task_state.forget(task_id)
+        execution_engine.response_cache.invalidate(task_id)
+        execution_engine.websocket_manager.forget(task_id)
+
+def get_execution_engine(connection: HTTPConnection) -> ExecutionEngine:
+    """Dependency: the app's execution engine"""
+    return connection.app.state.execution_engine
+
+def get_websocket_manager(connection: HTTPConnection) -> WebSocketManager:
+    """Dependency: the app's WebSocket manager"""
+    return connection.app.state.websocket_manager
+
+def get_retention_worker(connection: HTTPConnection) -> RetentionWorker:
+    """Dependency: the app's retention worker"""
+    return connection.app.state.retention_worker
+
+def get_profiler(connection: HTTPConnection) -> Profiler:
+    """Dependency: the app's profiler"""
+    return connection.app.state.profiler
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@app.get("/")
+# Most tasks accepted by one batch submission
+BATCH_MAX_TASKS = int(os.getenv("BATCH_MAX_TASKS", "10000"))
+# Ids per IN (...) statement; SQLite allows 999 parameters in older builds
+ID_BATCH_SIZE = 900
+# Tasks deleted per transaction by bulk delete. Larger batches mean fewer
+# commits but need SQLite 3.32+ (32766 parameters) beyond 999.
+DELETE_BATCH_SIZE = int(os.getenv("DELETE_BATCH_SIZE", "5000"))
+# Largest page of search results
+SEARCH_MAX_LIMIT = 100
+# Token admin-only endpoints require in the X-Admin-Token header; unset
+# disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Whether `python main.py` offers permessage-deflate to WebSocket clients;
+# with the uvicorn CLI use --ws-per-message-deflate
+WS_PER_MESSAGE_DEFLATE = os.getenv("WS_PER_MESSAGE_DEFLATE", "1") == "1"
+
+router = APIRouter()
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency of admin-only endpoints"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@router.get("/")
 async def root():
     return {"message": "Multi-Agent Task Orchestration System"}
 
-@app.post("/api/tasks", response_model=TaskResponse)
-async def create_task(task: TaskCreate, db: Session = Depends(get_db)):
-    """Create a new task and start execution"""
+async def _create_task(task: TaskCreate, db: Session, execution_engine: ExecutionEngine) -> TaskResponse:
+    """Insert and announce a new task; the caller starts it"""
     try:
         # Create task in database
+        task_id = str(uuid.uuid4())
+        now = datetime.utcnow()
         db_task = Task(
-            id=str(uuid.uuid4()),
+            id=task_id,
             description=task.description,
             workflow_type=task.workflow_type,
             status=TaskStatus.PENDING,
-            progress=0
+            progress=0,
+            created_at=now,
+            updated_at=now
         )
         db.add(db_task)
+        db.flush()
+        record_transition(db, None, TaskStatus.PENDING)
+        search_index.add_tasks(db, [(task_id, task.description)])
         db.commit()
-        db.refresh(db_task)
-        
-        # Start task execution asynchronously
-        asyncio.create_task(execution_engine.execute_task(db_task.id, db))
-        
-        return TaskResponse(
-            id=db_task.id,
-            description=db_task.description,
-            workflow_type=db_task.workflow_type,
-            status=db_task.status,
-            progress=db_task.progress,
-            created_at=db_task.created_at
-        )
     except Exception as e:
         logger.error(f"Error creating task: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    # Built from the values inserted: reading the committed (expired) row
+    # would start a transaction that holds a connection across the await
+    response = TaskResponse(
+        id=task_id,
+        description=task.description,
+        workflow_type=task.workflow_type,
+        status=TaskStatus.PENDING,
+        progress=0,
+        created_at=now,
+        updated_at=now
+    )
+    
+    # Let dashboards know about the new task
+    await execution_engine.announce_task(response)
+    return response
 
-@app.get("/api/tasks", response_model=List[TaskResponse])
-async def get_tasks(db: Session = Depends(get_db)):
-    """Get all tasks"""
+@router.post("/api/tasks", response_model=TaskResponse)
+async def create_task(task: TaskCreate, db: Session = Depends(get_db),
+                      execution_engine: ExecutionEngine = Depends(get_execution_engine)):
+    """Create a new task and queue it for execution"""
+    response = await _create_task(task, db, execution_engine)
+    
+    # Running tasks hold a database connection each, so they go through the
+    # same bounded worker pool as batches
+    execution_engine.enqueue([response.id], [response.workflow_type])
+    return response
+
+@router.post("/api/tasks:batch", response_model=TaskBatchResponse)
+async def create_tasks_batch(batch: TaskBatchCreate, db: Session = Depends(get_db),
+                             execution_engine: ExecutionEngine = Depends(get_execution_engine)):
+    """Create many tasks in one transaction and queue them for execution"""
+    if len(batch.tasks) > BATCH_MAX_TASKS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_TASKS} tasks per batch")
+    
+    now = datetime.utcnow()
+    rows = [
+        {
+            "id": str(uuid.uuid4()),
+            "description": task.description,
+            "workflow_type": task.workflow_type,
+            "status": TaskStatus.PENDING,
+            "progress": 0,
+            "created_at": now,
+            "updated_at": now
+        }
+        for task in batch.tasks
+    ]
+    try:
+        # A single executemany instead of an ORM flush per task
+        if rows:
+            db.execute(insert(Task), rows)
+            record_transition(db, None, TaskStatus.PENDING, count=len(rows))
+            search_index.add_tasks(db, [(row["id"], row["description"]) for row in rows])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error creating task batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    await execution_engine.announce_tasks(rows)
+    ids = [row["id"] for row in rows]
+    execution_engine.enqueue(ids, [row["workflow_type"] for row in rows])
+    return TaskBatchResponse(ids=ids)
+
+@router.post("/api/tasks:status", response_model=List[TaskStatusSummary])
+async def get_tasks_status(request: TaskIds, db: Session = Depends(get_db),
+                           execution_engine: ExecutionEngine = Depends(get_execution_engine)):
+    """Status, progress and ETA of many tasks; unknown ids are left out"""
+    found = {}
+    for start in range(0, len(request.ids), ID_BATCH_SIZE):
+        chunk = request.ids[start:start + ID_BATCH_SIZE]
+        rows = db.query(Task.id, Task.status, Task.progress).filter(Task.id.in_(chunk)).all()
+        for row in rows:
+            found[row.id] = {"id": row.id, "status": row.status, "progress": row.progress,
+                             "eta": execution_engine.eta(row.id)}
+    return [found[task_id] for task_id in request.ids if task_id in found]
+
+def _task_response(task: Task, execution_engine: ExecutionEngine) -> TaskResponse:
+    """A task's response model, with its ETA if it is executing here"""
+    response = TaskResponse.from_orm(task)
+    response.eta = execution_engine.eta(task.id)
+    return response
+
+def _task_validators(task_id: str, db: Session, execution_engine: ExecutionEngine) -> Optional[CacheValidators]:
+    """Cache validators shared by a task's resources; None if it doesn't exist.
+    
+    Tasks running in this process are versioned in memory, so they need no
+    query at all. Others cost one narrow query: tasks in a terminal state no
+    longer change and are cacheable, anything else is not validated.
+    """
+    version = execution_engine.task_state.live_version(task_id)
+    if version is not None:
+        return CacheValidators(version_etag(task_id, version), REVALIDATE)
+    
+    row = db.query(Task.status, Task.updated_at).filter(Task.id == task_id).first()
+    if row is None:
+        return None
+    if row.status in (TaskStatus.COMPLETED, TaskStatus.FAILED):
+        return CacheValidators(timestamp_etag(task_id, row.updated_at), immutable_cache_control(), row.updated_at)
+    return CacheValidators(None, REVALIDATE)
+
+def _cached_response(request: Request, task_id: str, resource: str, db: Session,
+                     execution_engine: ExecutionEngine) -> Optional[Response]:
+    """Serve a finished task's resource from the response cache, if present.
+    
+    Another worker may have deleted or re-executed the task, which only
+    invalidates that worker's cache, so the entry is checked against the
+    task's updated_at: a primary key lookup.
+    """
+    cached = execution_engine.response_cache.get(task_id, resource)
+    if cached is None:
+        return None
+    updated_at = db.query(Task.updated_at).filter(Task.id == task_id).scalar()
+    if updated_at != cached.validators.last_modified:
+        execution_engine.response_cache.invalidate(task_id)
+        return None
+    if is_not_modified(request, cached.validators):
+        return not_modified(cached.validators)
+    return set_cache_headers(Response(cached.body, media_type="application/json"), cached.validators)
+
+def _respond(task_id: str, resource: str, content: Any, validators: CacheValidators, response: Response,
+             execution_engine: ExecutionEngine):
+    """Return a task resource, caching it serialized if the task is finished"""
+    # Only tasks in a terminal state are validated by Last-Modified
+    if validators.last_modified is None:
+        set_cache_headers(response, validators)
+        return content
+    body = serialize(content)
+    execution_engine.response_cache.put(task_id, resource, body, validators)
+    return set_cache_headers(Response(body, media_type="application/json"), validators)
+
+@router.get("/api/tasks", response_model=List[TaskResponse])
+async def get_tasks(request: Request, response: Response, db: Session = Depends(get_db)):
+    """Get all tasks.
+    
+    ETAs change without the rows changing, so they are left out here; get
+    them from the task itself or ``POST /api/tasks:status``.
+    """
+    # Any insert, update or delete changes the count or the latest
+    # updated_at: the maintained status counters and an index lookup
+    count, last_updated = db.query(
+        db.query(func.sum(TaskCount.count)).scalar_subquery(),
+        db.query(func.max(Task.updated_at)).scalar_subquery()
+    ).one()
+    validators = CacheValidators(timestamp_etag("tasks", count or 0, last_updated or 0), REVALIDATE)
+    if is_not_modified(request, validators):
+        return not_modified(validators)
+    
     tasks = db.query(Task).order_by(Task.created_at.desc()).all()
+    set_cache_headers(response, validators)
     return [TaskResponse.from_orm(task) for task in tasks]
 
-@app.get("/api/tasks/{task_id}", response_model=TaskResponse)
-async def get_task(task_id: str, db: Session = Depends(get_db)):
+@router.get("/api/tasks/{task_id}", response_model=TaskResponse)
+async def get_task(task_id: str, request: Request, response: Response, db: Session = Depends(get_db),
+                   execution_engine: ExecutionEngine = Depends(get_execution_engine)):
     """Get specific task with subtasks"""
-    task = db.query(Task).filter(Task.id == task_id).first()
-    if not task:
+    cached = _cached_response(request, task_id, "task", db, execution_engine)
+    if cached:
+        return cached
+    
+    validators = _task_validators(task_id, db, execution_engine)
+    if not validators:
         raise HTTPException(status_code=404, detail="Task not found")
-    return TaskResponse.from_orm(task)
+    if is_not_modified(request, validators):
+        return not_modified(validators)
+    
+    task = db.query(Task).filter(Task.id == task_id).first()
+    return _respond(task_id, "task", _task_response(task, execution_engine), validators, response,
+                    execution_engine)
 
-@app.get("/api/tasks/{task_id}/subtasks", response_model=List[SubtaskResponse])
-async def get_subtasks(task_id: str, db: Session = Depends(get_db)):
+@router.get("/api/tasks/{task_id}/subtasks", response_model=List[SubtaskResponse])
+async def get_subtasks(task_id: str, request: Request, response: Response, db: Session = Depends(get_db),
+                       execution_engine: ExecutionEngine = Depends(get_execution_engine)):
     """Get subtasks for a specific task"""
+    cached = _cached_response(request, task_id, "subtasks", db, execution_engine)
+    if cached:
+        return cached
+    
+    validators = _task_validators(task_id, db, execution_engine)
+    if validators and is_not_modified(request, validators):
+        return not_modified(validators)
+    
     subtasks = db.query(Subtask).filter(Subtask.task_id == task_id).order_by(Subtask.order).all()
-    return [SubtaskResponse.from_orm(subtask) for subtask in subtasks]
+    content = [SubtaskResponse.from_orm(subtask) for subtask in subtasks]
+    if not validators:
+        return content
+    return _respond(task_id, "subtasks", content, validators, response, execution_engine)
 
-@app.delete("/api/tasks/{task_id}")
-async def delete_task(task_id: str, db: Session = Depends(get_db)):
-    """Delete a task"""
-    task = db.query(Task).filter(Task.id == task_id).first()
-    if not task:
+@router.get("/api/tasks/{task_id}/state", response_model=TaskStateSnapshot)
+async def get_task_state(task_id: str, request: Request, response: Response, db: Session = Depends(get_db),
+                         execution_engine: ExecutionEngine = Depends(get_execution_engine)):
+    """Get a versioned snapshot of a task, for clients applying WebSocket deltas"""
+    cached = _cached_response(request, task_id, "state", db, execution_engine)
+    if cached:
+        return cached
+    
+    validators = _task_validators(task_id, db, execution_engine)
+    if not validators:
         raise HTTPException(status_code=404, detail="Task not found")
+    if is_not_modified(request, validators):
+        return not_modified(validators)
     
-    # Delete subtasks first
-    db.query(Subtask).filter(Subtask.task_id == task_id).delete()
-    db.delete(task)
-    db.commit()
+    # Nothing is awaited between reading the version and the rows, and the
+    # engine bumps the version right after each commit, so they match
+    version = execution_engine.task_state.version(task_id)
+    streaming = execution_engine.task_state.streaming(task_id)
+    task = db.query(Task).filter(Task.id == task_id).first()
+    subtasks = db.query(Subtask).filter(Subtask.task_id == task_id).order_by(Subtask.order).all()
+    snapshot = TaskStateSnapshot(
+        version=version,
+        task=_task_response(task, execution_engine),
+        subtasks=[SubtaskResponse.from_orm(subtask) for subtask in subtasks],
+        streaming=streaming
+    )
+    return _respond(task_id, "state", snapshot, validators, response, execution_engine)
+
+@router.delete("/api/tasks/{task_id}")
+async def delete_task(task_id: str, db: Session = Depends(get_db),
+                      execution_engine: ExecutionEngine = Depends(get_execution_engine)):
+    """Delete a task"""
+    await execution_engine.cancel([task_id])
+    if not delete_tasks(db, [task_id]):
+        raise HTTPException(status_code=404, detail="Task not found")
+    _forget_tasks(execution_engine, [task_id])
     
     return {"message": "Task deleted successfully"}
 
-@app.websocket("/ws/tasks/{task_id}")
-async def websocket_endpoint(websocket: WebSocket, task_id: str):
-    """WebSocket endpoint for real-time task updates"""
-    logger.info(f"WebSocket connection attempt for task {task_id}")
-    await websocket_manager.connect(websocket, task_id)
+@router.post("/api/tasks:delete")
+async def delete_tasks_bulk(request: TaskDeleteRequest, db: Session = Depends(get_db),
+                            execution_engine: ExecutionEngine = Depends(get_execution_engine)):
+    """Delete tasks by ids or by filter, cancelling any that are running"""
+    if request.ids is None and not (request.status or request.workflow_type or request.older_than_days is not None):
+        raise HTTPException(status_code=400, detail="Give ids or at least one filter")
+    
+    deleted = cancelled = 0
+    if request.ids is not None:
+        batches = (request.ids[start:start + DELETE_BATCH_SIZE]
+                   for start in range(0, len(request.ids), DELETE_BATCH_SIZE))
+    else:
+        batches = _filtered_id_batches(request, db)
+    
+    for task_ids in batches:
+        cancelled += await execution_engine.cancel(task_ids)
+        deleted += delete_tasks(db, task_ids)
+        _forget_tasks(execution_engine, task_ids)
+        # One short transaction per batch; let other requests in between
+        await asyncio.sleep(0)
+    
+    return {"deleted": deleted, "cancelled": cancelled}
+
+def _filtered_id_batches(request: TaskDeleteRequest, db: Session):
+    """Ids of tasks matching a delete filter, a batch at a time"""
+    query = db.query(Task.id)
+    if request.status:
+        query = query.filter(Task.status.in_(request.status))
+    if request.workflow_type:
+        query = query.filter(Task.workflow_type.in_(request.workflow_type))
+    if request.older_than_days is not None:
+        query = query.filter(Task.created_at < datetime.utcnow() - timedelta(days=request.older_than_days))
+    while True:
+        # Each batch is deleted before the next is selected
+        task_ids = [row.id for row in query.limit(DELETE_BATCH_SIZE)]
+        if not task_ids:
+            return
+        yield task_ids
+
+@router.websocket("/ws/tasks/{task_id}")
+async def websocket_endpoint(websocket: WebSocket, task_id: str, since: Optional[int] = None,
+                             websocket_manager: WebSocketManager = Depends(get_websocket_manager)):
+    """WebSocket endpoint for real-time task updates.
+    
+    Pass ``since=<seq>`` to first receive the events logged after that seq.
+    Offer a subprotocol from ``ws_protocol`` (e.g. ``orchestration.msgpack``)
+    to receive compact binary events.
+    """
+    logger.debug("WebSocket connection attempt for task %s", task_id)
+    await websocket_manager.connect(websocket, task_id, since)
     try:
         while True:
             # Keep connection alive
-            await websocket.receive_text()
+            await websocket_manager.receive(websocket)
+    except WebSocketDisconnect:
+        logger.debug("WebSocket disconnected for task %s", task_id)
+        websocket_manager.disconnect(task_id, websocket)
+    except Exception as e:
+        logger.error("WebSocket error for task %s: %s", task_id, e)
+        websocket_manager.disconnect(task_id, websocket)
+
+@router.websocket("/ws/tasks")
+async def multiplexed_websocket_endpoint(websocket: WebSocket,
+                                         websocket_manager: WebSocketManager = Depends(get_websocket_manager)):
+    """WebSocket endpoint for updates on many tasks over one connection.
+    
+    Clients send JSON commands such as
+    ``{"action": "subscribe", "task_ids": [...], "since": {"<task_id>": <seq>}}``,
+    ``{"action": "subscribe", "filter": {"status": ["running"]}}`` (an empty
+    filter matches every task) or the same with ``"unsubscribe"``. An
+    optional ``"types"`` list limits which event types are sent. With a
+    binary subprotocol, commands may also be binary frames in that format.
+    """
+    await websocket_manager.connect_multiplexed(websocket)
+    try:
+        while True:
+            command = await websocket_manager.receive_command(websocket)
+            if command is not None:
+                await websocket_manager.handle_command(websocket, command)
     except WebSocketDisconnect:
-        logger.info(f"WebSocket disconnected for task {task_id}")
-        websocket_manager.disconnect(task_id)
+        pass
     except Exception as e:
-        logger.error(f"WebSocket error for task {task_id}: {e}")
-        websocket_manager.disconnect(task_id)
+        logger.error("Multiplexed WebSocket error: %s", e)
+    finally:
+        websocket_manager.disconnect_multiplexed(websocket)
+
+@router.get("/api/export", dependencies=[Depends(require_admin)])
+async def export_tasks(status: Optional[TaskStatus] = None, workflow_type: Optional[str] = None,
+                       subtasks: bool = True):
+    """Stream tasks with their subtask outputs as NDJSON, one task per line"""
+    lines = ndjson_lines(status=status, workflow_type=workflow_type, include_subtasks=subtasks)
+    return StreamingResponse(lines, media_type="application/x-ndjson",
+                             headers={"Content-Disposition": 'attachment; filename="tasks.ndjson"'})
+
+@router.get("/api/search")
+async def search_tasks(q: str, limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT), offset: int = Query(0, ge=0),
+                       status: Optional[List[TaskStatus]] = Query(None),
+                       workflow_type: Optional[List[str]] = Query(None),
+                       raw: bool = False, db: Session = Depends(get_db)):
+    """Ranked full-text search over task descriptions and agent outputs"""
+    try:
+        total, results = search_index.search(db, q, limit=limit, offset=offset, status=status,
+                                             workflow_type=workflow_type, raw=raw)
+    except SearchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"query": q, "total": total, "limit": limit, "offset": offset, "results": results}
 
-@app.get("/api/agents")
+@router.get("/api/admin/retention", dependencies=[Depends(require_admin)])
+async def get_retention(retention_worker: RetentionWorker = Depends(get_retention_worker)):
+    """Retention policy and the report of the last run"""
+    return {"policy": retention_worker.policy.to_dict(), "last_run": retention_worker.last_report}
+
+@router.post("/api/admin/retention", dependencies=[Depends(require_admin)])
+async def run_retention(dry_run: bool = False,
+                        retention_worker: RetentionWorker = Depends(get_retention_worker)):
+    """Apply the retention policy now and report reclaimed space"""
+    if not retention_worker.policy.enabled:
+        raise HTTPException(status_code=400, detail="No retention limits configured")
+    return await retention_worker.run(dry_run=dry_run)
+
+@contextmanager
+def _profiling_errors():
+    """Turn profiler errors into HTTP errors"""
+    try:
+        yield
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ProfilingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/api/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles(profiler: Profiler = Depends(get_profiler)):
+    """Recent profiles, the running one included"""
+    return [profile.to_dict() for profile in reversed(profiler.profiles.values())]
+
+@router.post("/api/admin/profiles", dependencies=[Depends(require_admin)])
+async def start_profile(seconds: float = 10, interval_ms: float = PROFILE_INTERVAL_MS,
+                        task_id: Optional[str] = None, memory: bool = False, db: Session = Depends(get_db),
+                        profiler: Profiler = Depends(get_profiler)):
+    """Sample the event loop for ``seconds``, or follow one task's execution
+    (for at most ``seconds``); ``memory`` also diffs tracemalloc snapshots"""
+    if task_id is not None:
+        status = db.query(Task.status).filter(Task.id == task_id).scalar()
+        if status is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        if status not in (TaskStatus.PENDING, TaskStatus.RUNNING):
+            raise HTTPException(status_code=409, detail=f"Task is {status.value}")
+    with _profiling_errors():
+        profile = await profiler.start(seconds, interval_ms, task_id=task_id, memory=memory)
+    return profile.to_dict()
+
+@router.post("/api/admin/profiles/tasks", dependencies=[Depends(require_admin)])
+async def profile_new_task(task: TaskCreate, seconds: float = 60, interval_ms: float = PROFILE_INTERVAL_MS,
+                           memory: bool = False, db: Session = Depends(get_db),
+                           profiler: Profiler = Depends(get_profiler),
+                           execution_engine: ExecutionEngine = Depends(get_execution_engine)):
+    """Create a task and profile its execution from start to end"""
+    with _profiling_errors():
+        profiler.check(seconds, interval_ms)
+    response = await _create_task(task, db, execution_engine)
+    try:
+        with _profiling_errors():
+            profile = await profiler.start(seconds, interval_ms, task_id=response.id, memory=memory)
+    finally:
+        # Run the task even if another profile got in first
+        execution_engine.start(response.id)
+    return {"task": response, "profile": profile.to_dict()}
+
+def _profile(profiler: Profiler, profile_id: str):
+    try:
+        return profiler.get(profile_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+@router.get("/api/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str, profiler: Profiler = Depends(get_profiler)):
+    """A profile's status, sample counts and memory growth"""
+    return _profile(profiler, profile_id).to_dict()
+
+@router.post("/api/admin/profiles/{profile_id}/stop", dependencies=[Depends(require_admin)])
+async def stop_profile(profile_id: str, profiler: Profiler = Depends(get_profiler)):
+    """End a running profile now"""
+    return (await profiler.stop(_profile(profiler, profile_id).id)).to_dict()
+
+@router.get("/api/admin/profiles/{profile_id}/download", dependencies=[Depends(require_admin)])
+async def download_profile(profile_id: str, format: str = Query("speedscope", pattern="^(speedscope|collapsed)$"),
+                           profiler: Profiler = Depends(get_profiler)):
+    """A finished profile as speedscope JSON or collapsed stacks"""
+    profile = _profile(profiler, profile_id)
+    if profile.status == "running":
+        raise HTTPException(status_code=409, detail="Profile is still running")
+    if format == "collapsed":
+        return Response(profile.collapsed(), media_type="text/plain", headers={
+            "Content-Disposition": f'attachment; filename="profile-{profile.id}.txt"'
+        })
+    return Response(json.dumps(profile.speedscope()), media_type="application/json", headers={
+        "Content-Disposition": f'attachment; filename="profile-{profile.id}.speedscope.json"'
+    })
+
+@router.get("/api/stats")
+async def get_task_stats(window_hours: float = 24, db: Session = Depends(get_db)):
+    """Task counts by status, and per-workflow/per-agent throughput, success
+    rate and latency percentiles, from incrementally maintained counters"""
+    if window_hours <= 0:
+        raise HTTPException(status_code=400, detail="window_hours must be positive")
+    return get_stats(db, window_hours)
+
+@router.get("/api/cache/stats")
+async def get_cache_stats(execution_engine: ExecutionEngine = Depends(get_execution_engine)):
+    """Hit rate and size of the completed-task response cache"""
+    return execution_engine.response_cache.stats()
+
+@router.get("/api/agents/batching")
+async def get_batching_stats(execution_engine: ExecutionEngine = Depends(get_execution_engine)):
+    """Settings and average size of micro-batched agent calls"""
+    return execution_engine.agent_registry.dispatcher.stats()
+
+@router.get("/api/agents/http")
+async def get_http_stats(execution_engine: ExecutionEngine = Depends(get_execution_engine)):
+    """Request, retry and cache counts of the agents' shared HTTP client"""
+    return execution_engine.agent_registry.http.stats()
+
+@router.get("/api/ws/stats")
+async def get_ws_stats(websocket_manager: WebSocketManager = Depends(get_websocket_manager)):
+    """Connections, bytes sent and encoding time per event by WebSocket protocol"""
+    return {
+        "per_message_deflate": WS_PER_MESSAGE_DEFLATE,
+        "protocols": websocket_manager.stats()
+    }
+
+@router.get("/api/agents")
 async def get_agents():
     """Get available agents"""
     return {
@@ -156,6 +662,8 @@ async def get_agents():
         ]
     }
 
+app = create_app()
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE)
@@ -0,0 +1,304 @@
+# On-demand sampling profiler for the running server (speedscope or collapsed stacks)
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+# Longest a profile may run
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "120"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MIN_INTERVAL_MS = 1.0
+PROFILE_MAX_DEPTH = 128
+# Frames recorded per allocation while tracing memory
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "1"))
+# Allocation sites reported per memory diff
+PROFILE_MEMORY_TOP = 30
+# Finished profiles kept for download
+PROFILE_HISTORY = 5
+
+WAITING_FRAME = ("(waiting)", "", 0)
+
+class ProfilingError(ValueError):
+    """A profile can't be started or served as asked"""
+
+class ProfilerBusy(ProfilingError):
+    """Another profile is running"""
+
+def _short_path(filename: str) -> str:
+    for marker in ("site-packages" + os.sep, "lib" + os.sep + "python"):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    return os.path.relpath(filename) if os.path.isabs(filename) else filename
+
+class Profile:
+    """Samples collected by one profiling session, and their exports"""
+
+    def __init__(self, id: str, seconds: float, interval: float, task_id: Optional[str], memory: bool):
+        self.id = id
+        self.seconds = seconds
+        self.interval = interval
+        self.task_id = task_id
+        self.memory = memory
+        self.status = "running"
+        self.started_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+        self.error: Optional[str] = None
+        # Counts of stacks, each a tuple of frame indexes from the root down,
+        # and the seconds they stand for: a busy process delays the sampler,
+        # so samples are weighted by the time since the one before
+        self.stacks: Counter = Counter()
+        self.seconds_by_stack: Counter = Counter()
+        self.frames: List[Tuple[str, str, int]] = []
+        self.frame_ids: Dict[Any, int] = {}
+        self.samples = 0
+        self.waiting_samples = 0
+        self.memory_growth: Optional[List[Dict[str, Any]]] = None
+        self.stop_requested = threading.Event()
+
+    def _frame_id(self, code) -> int:
+        frame_id = self.frame_ids.get(code)
+        if frame_id is None:
+            frame_id = self.frame_ids[code] = len(self.frames)
+            self.frames.append((code.co_qualname, _short_path(code.co_filename), code.co_firstlineno))
+        return frame_id
+
+    def add_sample(self, frames: List, seconds: float, waiting: bool = False):
+        """Count a stack given as frames from the root down"""
+        stack = tuple(self._frame_id(frame.f_code) for frame in frames)
+        if waiting:
+            if WAITING_FRAME not in self.frame_ids:
+                self.frame_ids[WAITING_FRAME] = len(self.frames)
+                self.frames.append(WAITING_FRAME)
+            stack += (self.frame_ids[WAITING_FRAME],)
+            self.waiting_samples += 1
+        self.stacks[stack] += 1
+        self.seconds_by_stack[stack] += seconds
+        self.samples += 1
+
+    def _frame_name(self, frame_id: int) -> str:
+        name, filename, line = self.frames[frame_id]
+        return f"{name} ({filename}:{line})" if filename else name
+
+    def collapsed(self) -> str:
+        """Stacks in the collapsed format, heaviest first"""
+        return "".join(
+            ";".join(self._frame_name(frame_id) for frame_id in stack) + f" {count}\n"
+            for stack, count in self.stacks.most_common()
+        )
+
+    def speedscope(self) -> Dict[str, Any]:
+        """A speedscope file with one sampled profile, weighted in seconds"""
+        name = f"task {self.task_id}" if self.task_id else "event loop"
+        stacks = self.seconds_by_stack.most_common()
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": [
+                {"name": frame_name, "file": filename, "line": line} if filename else {"name": frame_name}
+                for frame_name, filename, line in self.frames
+            ]},
+            "profiles": [{
+                "type": "sampled",
+                "name": f"{name}, {self.started_at.isoformat()}",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(seconds for _, seconds in stacks),
+                "samples": [list(stack) for stack, _ in stacks],
+                "weights": [seconds for _, seconds in stacks]
+            }],
+            "name": f"orchestration profile {self.id}",
+            "activeProfileIndex": 0,
+            "exporter": "orchestration-backend"
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "task_id": self.task_id,
+            "seconds": self.seconds,
+            "interval_ms": self.interval * 1000,
+            "memory": self.memory,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "samples": self.samples,
+            "sampled_seconds": round(sum(self.seconds_by_stack.values()), 3),
+            "waiting_samples": self.waiting_samples if self.task_id else None,
+            "distinct_stacks": len(self.stacks),
+            "memory_growth": self.memory_growth,
+            "error": self.error
+        }
+
+def _await_chain(coroutine) -> List:
+    """Frames of a suspended coroutine and those it awaits, outermost first"""
+    frames = []
+    while coroutine is not None and len(frames) < PROFILE_MAX_DEPTH:
+        frame = getattr(coroutine, "cr_frame", None) or getattr(coroutine, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coroutine = getattr(coroutine, "cr_await", None) or getattr(coroutine, "gi_yieldfrom", None)
+    return frames
+
+def _thread_stack(frame) -> List:
+    frames = []
+    while frame is not None and len(frames) < PROFILE_MAX_DEPTH:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+class Profiler:
+    """Runs one profile at a time against the event loop it's started from.
+
+    ``running`` maps task ids to their executions (``ExecutionEngine.running``);
+    an execution's helper tasks are named after it plus ``/...``.
+    """
+
+    def __init__(self, running: Dict[str, asyncio.Task]):
+        self.running = running
+        self.current: Optional[Profile] = None
+        self.runner: Optional[asyncio.Task] = None
+        self.profiles: "OrderedDict[str, Profile]" = OrderedDict()
+        self.ids = itertools.count(1)
+
+    def check(self, seconds: float, interval_ms: float):
+        """Raise ProfilingError if a profile with these settings can't start now"""
+        if self.current is not None:
+            raise ProfilerBusy(f"Profile {self.current.id} is running")
+        if not 0 < seconds <= PROFILE_MAX_SECONDS:
+            raise ProfilingError(f"seconds must be between 0 and {PROFILE_MAX_SECONDS:g}")
+        if interval_ms < PROFILE_MIN_INTERVAL_MS:
+            raise ProfilingError(f"interval_ms must be at least {PROFILE_MIN_INTERVAL_MS:g}")
+
+    async def start(self, seconds: float, interval_ms: float = PROFILE_INTERVAL_MS,
+                    task_id: Optional[str] = None, memory: bool = False) -> Profile:
+        """Start profiling for ``seconds``, or until the task's execution
+        ends; a task that hasn't started yet is waited for."""
+        self.check(seconds, interval_ms)
+
+        profile = Profile(f"{datetime.utcnow():%Y%m%dT%H%M%S}-{next(self.ids)}", seconds,
+                          interval_ms / 1000, task_id, memory)
+        self.current = profile
+        self.profiles[profile.id] = profile
+        while len(self.profiles) > PROFILE_HISTORY + 1:
+            self.profiles.popitem(last=False)
+        # Sampling starts before this returns, so a task started right after
+        # is profiled from its first step
+        sampling = asyncio.Event()
+        self.runner = asyncio.create_task(self._run(profile, sampling))
+        await sampling.wait()
+        return profile
+
+    async def stop(self, profile_id: str) -> Profile:
+        """End a running profile early and wait for its results"""
+        profile = self.get(profile_id)
+        if profile is self.current:
+            profile.stop_requested.set()
+            await asyncio.shield(self.runner)
+        return profile
+
+    def get(self, profile_id: str) -> Profile:
+        if profile_id not in self.profiles:
+            raise KeyError(profile_id)
+        return self.profiles[profile_id]
+
+    async def _run(self, profile: Profile, sampling: asyncio.Event):
+        loop = asyncio.get_running_loop()
+        finished = asyncio.Event()
+        started_tracing = False
+        try:
+            if profile.memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+                    started_tracing = True
+                before = await asyncio.to_thread(tracemalloc.take_snapshot)
+
+            sampler = threading.Thread(
+                target=self._sample, args=(profile, loop, threading.get_ident(), sampling, finished),
+                name=f"profiler-{profile.id}", daemon=True
+            )
+            sampler.start()
+            await finished.wait()
+
+            if profile.memory:
+                after = await asyncio.to_thread(tracemalloc.take_snapshot)
+                profile.memory_growth = await asyncio.to_thread(_memory_growth, before, after)
+        except Exception as e:
+            logger.error(f"Profile {profile.id} failed: {e}")
+            profile.error = str(e)
+            sampling.set()
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+            profile.finished_at = datetime.utcnow()
+            profile.status = "failed" if profile.error else "finished"
+            self.current = None
+            logger.info(f"Profile {profile.id} finished with {profile.samples} samples")
+
+    def _sample(self, profile: Profile, loop: asyncio.AbstractEventLoop, loop_thread: int,
+                sampling: asyncio.Event, finished: asyncio.Event):
+        """Sampler thread: runs until the deadline, a stop or the task's end"""
+        last = time.monotonic()
+        deadline = last + profile.seconds
+        execution: Optional[asyncio.Task] = None
+        loop.call_soon_threadsafe(sampling.set)
+        try:
+            while not profile.stop_requested.wait(profile.interval):
+                now = time.monotonic()
+                if now > deadline:
+                    break
+                elapsed, last = now - last, now
+                if profile.task_id is None:
+                    frame = sys._current_frames().get(loop_thread)
+                    if frame is not None:
+                        profile.add_sample(_thread_stack(frame), elapsed)
+                    continue
+
+                if execution is None:
+                    execution = self.running.get(profile.task_id)
+                    if execution is None:
+                        continue
+                if execution.done():
+                    break
+                current = asyncio.current_task(loop)
+                if current is not None and (current is execution or
+                                            current.get_name().startswith(execution.get_name() + "/")):
+                    frame = sys._current_frames().get(loop_thread)
+                    if frame is not None:
+                        profile.add_sample(_thread_stack(frame), elapsed)
+                else:
+                    profile.add_sample(_await_chain(execution.get_coro()), elapsed, waiting=True)
+        except Exception as e:
+            profile.error = f"Sampling failed: {e}"
+        finally:
+            loop.call_soon_threadsafe(finished.set)
+
+def _memory_growth(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> List[Dict[str, Any]]:
+    """Allocation sites whose memory grew most between two snapshots"""
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")
+    ]
+    key = "traceback" if tracemalloc.get_traceback_limit() > 1 else "lineno"
+    differences = after.filter_traces(filters).compare_to(before.filter_traces(filters), key)
+    return [
+        {
+            "size_diff": difference.size_diff,
+            "size": difference.size,
+            "count_diff": difference.count_diff,
+            "count": difference.count,
+            "traceback": [f"{_short_path(frame.filename)}:{frame.lineno}" for frame in difference.traceback]
+        }
+        for difference in differences[:PROFILE_MEMORY_TOP]
+        if difference.size_diff > 0
+    ]
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Set, Tuple
+import json
+import logging
+import os
+
+from fastapi.encoders import jsonable_encoder
+
+from http_cache import CacheValidators
+
+logger = logging.getLogger(__name__)
+
+# Memory budget for cached response bodies
+RESPONSE_CACHE_BYTES = int(os.getenv("RESPONSE_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+# Rough per-entry bookkeeping cost on top of the body itself
+ENTRY_OVERHEAD = 256
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    validators: CacheValidators
+
+def serialize(content: Any) -> bytes:
+    """Encode a response model (or list of them) the way JSONResponse does"""
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+class ResponseCache:
+    """LRU of serialized responses for tasks in a terminal state.
+
+    Completed and failed tasks only change when they are deleted or executed
+    again, so their responses can be served from memory. ``invalidate`` only
+    reaches this process's cache, so callers check that the task's
+    ``updated_at`` still matches the entry's validators first. Entries are
+    keyed by task id and resource name and evicted least recently used first
+    once their total size exceeds ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[Tuple[str, str], CachedResponse]" = OrderedDict()
+        self.resources: Dict[str, Set[str]] = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, task_id: str, resource: str) -> Optional[CachedResponse]:
+        key = (task_id, resource)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, task_id: str, resource: str, body: bytes, validators: CacheValidators):
+        size = len(body) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        self._remove((task_id, resource))
+        self.entries[(task_id, resource)] = CachedResponse(body, validators)
+        self.resources.setdefault(task_id, set()).add(resource)
+        self.size += size
+        while self.size > self.max_bytes:
+            key, entry = self.entries.popitem(last=False)
+            self._discard(key, entry)
+            self.evictions += 1
+
+    def invalidate(self, task_id: str):
+        """Drop every cached response of a task that was deleted or re-executed"""
+        for resource in list(self.resources.get(task_id, ())):
+            self._remove((task_id, resource))
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+    def _remove(self, key: Tuple[str, str]):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self._discard(key, entry)
+
+    def _discard(self, key: Tuple[str, str], entry: CachedResponse):
+        task_id, resource = key
+        self.size -= len(entry.body) + ENTRY_OVERHEAD
+        resources = self.resources.get(task_id)
+        if resources:
+            resources.discard(resource)
+            if not resources:
+                del self.resources[task_id]
@@ -0,0 +1,358 @@
+# Retention, archival and compaction of finished tasks
+# Usage: cd backend && python retention.py --policy retention.json [--dry-run]
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select, text, tuple_
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, engine, Task, Subtask, TaskStatus, delete_tasks
+from export import iter_tasks, to_json
+
+logger = logging.getLogger(__name__)
+
+# Seconds between retention runs; 0 disables the background worker
+RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", "0"))
+# Where expired tasks are archived; empty to delete without archiving
+RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", "archive")
+# Tasks deleted per transaction, and the pause between transactions
+RETENTION_CHUNK_SIZE = int(os.getenv("RETENTION_CHUNK_SIZE", "200"))
+RETENTION_CHUNK_PAUSE = float(os.getenv("RETENTION_CHUNK_PAUSE", "0.05"))
+# Free pages released per incremental VACUUM step
+RETENTION_VACUUM_PAGES = int(os.getenv("RETENTION_VACUUM_PAGES", "1000"))
+
+TERMINAL_STATUSES = [TaskStatus.COMPLETED, TaskStatus.FAILED]
+
+class RetentionPolicy:
+    """Which finished tasks to expire.
+
+    ``max_age_days`` expires tasks not updated for that long and
+    ``max_tasks`` keeps only that many of the most recently updated tasks per
+    workflow type. Both can be overridden per workflow type; ``None`` means no
+    limit. Only tasks with one of ``statuses`` are ever expired.
+    """
+
+    def __init__(self, max_age_days: Optional[float] = None, max_tasks: Optional[int] = None,
+                 statuses: Optional[List[TaskStatus]] = None,
+                 workflows: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.max_age_days = max_age_days
+        self.max_tasks = max_tasks
+        self.statuses = statuses or TERMINAL_STATUSES
+        self.workflows = workflows or {}
+
+    def limits_for(self, workflow_type: Optional[str]) -> Dict[str, Any]:
+        """Age and count limits for a workflow type (``None`` for the default)"""
+        limits = {"max_age_days": self.max_age_days, "max_tasks": self.max_tasks}
+        limits.update(self.workflows.get(workflow_type, {}))
+        return limits
+
+    @property
+    def enabled(self) -> bool:
+        return any(
+            limits.get("max_age_days") is not None or limits.get("max_tasks") is not None
+            for limits in [self.limits_for(None)] + list(self.workflows.values())
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "max_age_days": self.max_age_days,
+            "max_tasks": self.max_tasks,
+            "statuses": [status.value for status in self.statuses],
+            "workflows": self.workflows
+        }
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> "RetentionPolicy":
+        """Build a policy from a dict such as::
+
+            {"max_age_days": 30, "max_tasks": 10000, "statuses": ["completed", "failed"],
+             "workflows": {"custom": {"max_age_days": 7, "max_tasks": 500}}}
+        """
+        statuses = [TaskStatus(status) for status in config["statuses"]] if "statuses" in config else None
+        return cls(
+            max_age_days=config.get("max_age_days"),
+            max_tasks=config.get("max_tasks"),
+            statuses=statuses,
+            workflows=config.get("workflows")
+        )
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        """Policy from ``RETENTION_POLICY`` (a JSON file), or from
+        ``RETENTION_MAX_AGE_DAYS`` and ``RETENTION_MAX_TASKS``"""
+        path = os.getenv("RETENTION_POLICY")
+        if path:
+            with open(path) as f:
+                return cls.from_dict(json.load(f))
+        max_age_days = os.getenv("RETENTION_MAX_AGE_DAYS")
+        max_tasks = os.getenv("RETENTION_MAX_TASKS")
+        return cls(
+            max_age_days=float(max_age_days) if max_age_days else None,
+            max_tasks=int(max_tasks) if max_tasks else None
+        )
+
+def expiry_condition(db: Session, policy: RetentionPolicy):
+    """SQL condition matching the tasks the policy expires, or None.
+
+    Computed once per run: each count limit becomes the (updated_at, id) of
+    the newest task it expires, one indexed OFFSET query per workflow type,
+    so expired tasks are then found by a range scan instead of ranking the
+    whole table for every chunk.
+    """
+    candidates = Task.status.in_(policy.statuses)
+    conditions = []
+    overridden = list(policy.workflows)
+    now = datetime.utcnow()
+
+    for workflow_type in [None] + overridden:
+        if workflow_type is None:
+            in_scope = Task.workflow_type.notin_(overridden) if overridden else None
+        else:
+            in_scope = Task.workflow_type == workflow_type
+        limits = policy.limits_for(workflow_type)
+
+        if limits.get("max_age_days") is not None:
+            cutoff = now - timedelta(days=limits["max_age_days"])
+            condition = Task.updated_at < cutoff
+            conditions.append(condition if in_scope is None else condition & in_scope)
+
+        if limits.get("max_tasks") is not None:
+            # The limit applies to each workflow type in scope separately
+            if workflow_type is None:
+                scoped = [name for (name,) in db.query(Task.workflow_type).filter(candidates).distinct()
+                          if name not in overridden]
+            else:
+                scoped = [workflow_type]
+            for name in scoped:
+                boundary = (
+                    db.query(Task.updated_at, Task.id)
+                    .filter(candidates, Task.workflow_type == name)
+                    .order_by(Task.updated_at.desc(), Task.id.desc())
+                    .offset(limits["max_tasks"])
+                    .first()
+                )
+                if boundary:
+                    conditions.append(
+                        (Task.workflow_type == name) & (tuple_(Task.updated_at, Task.id) <= tuple(boundary))
+                    )
+
+    if not conditions:
+        return None
+    return and_(candidates, or_(*conditions))
+
+def expired_tasks(db: Session, condition, limit: int,
+                  after: Optional[Tuple[datetime, str]] = None) -> List[Tuple[datetime, str]]:
+    """Up to ``limit`` (updated_at, id) of tasks matching an expiry condition,
+    oldest first, starting after the given (updated_at, id)"""
+    query = select(Task.updated_at, Task.id).where(condition)
+    if after is not None:
+        query = query.where(tuple_(Task.updated_at, Task.id) > after)
+    query = query.order_by(Task.updated_at, Task.id).limit(limit)
+    return [tuple(row) for row in db.execute(query)]
+
+def count_expired(db: Session, condition) -> int:
+    return db.execute(select(func.count()).select_from(Task).where(condition)).scalar()
+
+def _in_session(function: Callable, *args):
+    """Run ``function(db, *args)`` with a session of its own; retention steps
+    run in worker threads, which must not share a session"""
+    with SessionLocal() as db:
+        return function(db, *args)
+
+def _sqlite_space(db: Session) -> Optional[Dict[str, int]]:
+    if engine.dialect.name != "sqlite":
+        return None
+    page_size = db.execute(text("PRAGMA page_size")).scalar()
+    return {
+        "file_bytes": db.execute(text("PRAGMA page_count")).scalar() * page_size,
+        "free_bytes": db.execute(text("PRAGMA freelist_count")).scalar() * page_size,
+        "auto_vacuum": db.execute(text("PRAGMA auto_vacuum")).scalar()
+    }
+
+class RetentionWorker:
+    """Applies a retention policy now and then in the background.
+
+    ``on_delete`` is called on the event loop with the ids of every deleted
+    chunk, so in-memory state about those tasks can be dropped.
+    """
+
+    def __init__(self, policy: Optional[RetentionPolicy] = None,
+                 on_delete: Optional[Callable[[List[str]], None]] = None,
+                 archive_dir: Optional[str] = RETENTION_ARCHIVE_DIR,
+                 chunk_size: int = RETENTION_CHUNK_SIZE):
+        self.policy = policy or RetentionPolicy.from_env()
+        self.on_delete = on_delete
+        self.archive_dir = archive_dir
+        self.chunk_size = chunk_size
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, interval: int = RETENTION_INTERVAL):
+        """Run the policy every ``interval`` seconds, if both are configured"""
+        if interval <= 0 or not self.policy.enabled or self._task:
+            return
+        self._task = asyncio.create_task(self._loop(interval))
+        logger.info(f"Retention worker started, running every {interval}s")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Apply the policy once and report what was done"""
+        async with self._lock:
+            report = await self._run(dry_run)
+        if not dry_run:
+            self.last_report = report
+        return report
+
+    async def _loop(self, interval: int):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                report = await self.run()
+                if report["deleted_tasks"]:
+                    logger.info(f"Retention removed {report['deleted_tasks']} tasks, "
+                                f"reclaimed {report['reclaimed_bytes']} bytes")
+            except Exception as e:
+                logger.error(f"Retention run failed: {e}")
+
+    async def _run(self, dry_run: bool) -> Dict[str, Any]:
+        started = time.monotonic()
+        report: Dict[str, Any] = {
+            "started_at": datetime.utcnow().isoformat(),
+            "dry_run": dry_run,
+            "policy": self.policy.to_dict(),
+            "deleted_tasks": 0,
+            "deleted_subtasks": 0,
+            "archive": None
+        }
+
+        before = await asyncio.to_thread(_in_session, _sqlite_space)
+        condition = await asyncio.to_thread(_in_session, expiry_condition, self.policy)
+        if dry_run:
+            report["expired_tasks"] = 0
+            if condition is not None:
+                report["expired_tasks"] = await asyncio.to_thread(_in_session, count_expired, condition)
+            report["duration"] = round(time.monotonic() - started, 3)
+            return report
+
+        archive = None
+        if self.archive_dir:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            report["archive"] = os.path.join(
+                self.archive_dir, f"tasks-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.ndjson.gz"
+            )
+        try:
+            last = None
+            while condition is not None:
+                expired = await asyncio.to_thread(_in_session, expired_tasks, condition, self.chunk_size, last)
+                if not expired:
+                    break
+                last = expired[-1]
+                ids = [task_id for _, task_id in expired]
+                if report["archive"]:
+                    if archive is None:
+                        archive = gzip.open(report["archive"], "at", encoding="utf-8")
+                    await asyncio.to_thread(_in_session, self._archive_chunk, ids, archive)
+                deleted_tasks, deleted_subtasks = await asyncio.to_thread(_in_session, self._delete_chunk, ids)
+                report["deleted_tasks"] += deleted_tasks
+                report["deleted_subtasks"] += deleted_subtasks
+                if self.on_delete:
+                    self.on_delete(ids)
+                # Let other writers in between chunks
+                await asyncio.sleep(RETENTION_CHUNK_PAUSE)
+        finally:
+            if archive is not None:
+                archive.close()
+        if archive is None:
+            report["archive"] = None
+
+        if report["deleted_tasks"]:
+            await self._compact()
+        after = await asyncio.to_thread(_in_session, _sqlite_space)
+
+        if before and after:
+            report["db_bytes_before"] = before["file_bytes"]
+            report["db_bytes_after"] = after["file_bytes"]
+            report["reclaimed_bytes"] = before["file_bytes"] - after["file_bytes"]
+            # Without auto_vacuum the file does not shrink, but freed pages are reused
+            report["free_bytes"] = after["free_bytes"]
+        else:
+            report["reclaimed_bytes"] = None
+        report["duration"] = round(time.monotonic() - started, 3)
+        return report
+
+    def _archive_chunk(self, db: Session, ids: List[str], archive):
+        for record in iter_tasks(db, ids=ids):
+            archive.write(to_json(record) + "\n")
+        archive.flush()
+
+    def _delete_chunk(self, db: Session, ids: List[str]) -> Tuple[int, int]:
+        """Delete a chunk of tasks; returns the numbers of tasks and subtasks"""
+        subtasks = db.query(func.count(Subtask.id)).filter(Subtask.task_id.in_(ids)).scalar()
+        return delete_tasks(db, ids), subtasks
+
+    async def _compact(self):
+        """Release free pages (SQLite) and refresh planner statistics"""
+        if engine.dialect.name == "sqlite":
+            space = await asyncio.to_thread(_in_session, _sqlite_space)
+            # 2 = INCREMENTAL; databases created before that setting need a
+            # one-off full VACUUM to switch over
+            if space["auto_vacuum"] == 2:
+                while space["free_bytes"] > 0:
+                    await asyncio.to_thread(_in_session, self._incremental_vacuum)
+                    await asyncio.sleep(RETENTION_CHUNK_PAUSE)
+                    remaining = await asyncio.to_thread(_in_session, _sqlite_space)
+                    if remaining["free_bytes"] >= space["free_bytes"]:
+                        break
+                    space = remaining
+        await asyncio.to_thread(_in_session, self._analyze)
+
+    def _incremental_vacuum(self, db: Session):
+        db.commit()
+        # A plain execute() steps the pragma once, which frees a single page;
+        # executescript() runs it to completion
+        raw = db.connection().connection.driver_connection
+        raw.executescript(f"PRAGMA incremental_vacuum({RETENTION_VACUUM_PAGES});")
+        db.commit()
+
+    def _analyze(self, db: Session):
+        db.execute(text("ANALYZE"))
+        db.commit()
+
+def main_cli(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Archive and delete expired tasks")
+    parser.add_argument("--policy", help="JSON retention policy (default: from the environment)")
+    parser.add_argument("--dry-run", action="store_true", help="only count expired tasks")
+    parser.add_argument("--archive-dir", default=RETENTION_ARCHIVE_DIR,
+                        help="where to archive expired tasks ('' to skip archiving)")
+    args = parser.parse_args(argv)
+
+    if args.policy:
+        with open(args.policy) as f:
+            policy = RetentionPolicy.from_dict(json.load(f))
+    else:
+        policy = RetentionPolicy.from_env()
+    if not policy.enabled:
+        parser.exit(1, "No retention limits configured\n")
+
+    worker = RetentionWorker(policy, archive_dir=args.archive_dir or None)
+    report = asyncio.run(worker.run(dry_run=args.dry_run))
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,103 @@
+# Database schema setup, run once per deployment instead of in every worker
+# Usage: cd backend && python schema.py [--check]
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import time
+from typing import List, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import Base, SessionLocal, SchemaState, engine
+from search import search_index
+from stats import init_task_counts
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_SETUP = os.getenv("SCHEMA_SETUP", "auto")
+# Bump when a setup step that isn't a model (counters, search index) changes
+SCHEMA_SETUP_VERSION = 1
+# Tries when setup collides with another worker's
+SCHEMA_SETUP_ATTEMPTS = 5
+
+class SchemaOutdated(RuntimeError):
+    """The database hasn't been set up for this version of the code"""
+
+def schema_fingerprint() -> str:
+    """Hash of everything setup creates"""
+    parts = [f"setup:{SCHEMA_SETUP_VERSION}"]
+    for table in Base.metadata.sorted_tables:
+        parts.append(f"table:{table.name}")
+        for column in table.columns:
+            parts.append(f"column:{column.name}:{column.type}:{column.nullable}:{column.primary_key}")
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            parts.append(f"index:{index.name}:{','.join(column.name for column in index.columns)}")
+        for foreign_key in table.foreign_keys:
+            parts.append(f"fk:{foreign_key.parent.name}:{foreign_key.target_fullname}:{foreign_key.ondelete}")
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+def stored_fingerprint() -> Optional[str]:
+    """Fingerprint of the last setup, or None if the database was never set up"""
+    try:
+        with SessionLocal() as session:
+            state = session.get(SchemaState, 1)
+            return state.fingerprint if state else None
+    except SQLAlchemyError:
+        # No schema_state table yet
+        return None
+
+def setup_schema():
+    """Create tables, counters and the search index, then record the fingerprint"""
+    logger.info("Setting up the database schema")
+    Base.metadata.create_all(bind=engine)
+    # create_all skips the indexes of tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    with SessionLocal() as session:
+        init_task_counts(session)
+    search_index.setup()
+    with SessionLocal() as session:
+        session.merge(SchemaState(id=1, fingerprint=schema_fingerprint()))
+        session.commit()
+
+def ensure_schema(mode: str = SCHEMA_SETUP) -> bool:
+    """Make sure the database is set up for this code, at the cost of one
+    query when it already is. Returns whether setup ran."""
+    fingerprint = schema_fingerprint()
+    if stored_fingerprint() == fingerprint:
+        return False
+    if mode == "check":
+        raise SchemaOutdated("Database schema is outdated; run `python schema.py` first")
+    for attempt in range(1, SCHEMA_SETUP_ATTEMPTS + 1):
+        try:
+            setup_schema()
+            return True
+        except SQLAlchemyError as e:
+            # Another worker setting up at the same time; every step skips
+            # what already exists, so trying again picks up where it got to
+            if stored_fingerprint() == fingerprint:
+                return False
+            if attempt == SCHEMA_SETUP_ATTEMPTS:
+                raise
+            logger.warning(f"Schema setup failed ({e.__class__.__name__}), retrying")
+            time.sleep(0.2 * attempt)
+
+def main_cli(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Set up the database schema")
+    parser.add_argument("--check", action="store_true",
+                        help="only report whether setup is needed")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        if stored_fingerprint() != schema_fingerprint():
+            print("Database schema is outdated")
+            sys.exit(1)
+        print("Database schema is up to date")
+        return
+    print("Database schema set up" if ensure_schema("auto") else "Database schema already up to date")
+
+if __name__ == "__main__":
+    main_cli()
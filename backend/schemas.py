@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from models import TaskStatus, SubtaskStatus
@@ -7,6 +7,28 @@ class TaskCreate(BaseModel):
     description: str
     workflow_type: str
 
+class TaskBatchCreate(BaseModel):
+    tasks: List[TaskCreate]
+
+class TaskBatchResponse(BaseModel):
+    ids: List[str]
+
+class TaskIds(BaseModel):
+    ids: List[str]
+
+class TaskDeleteRequest(BaseModel):
+    ids: Optional[List[str]] = None
+    # Filters, used when no ids are given
+    status: Optional[List[TaskStatus]] = None
+    workflow_type: Optional[List[str]] = None
+    older_than_days: Optional[float] = None
+
+class TaskStatusSummary(BaseModel):
+    id: str
+    status: TaskStatus
+    progress: int
+    eta: Optional[datetime] = None
+
 class TaskResponse(BaseModel):
     id: str
     description: str
@@ -16,6 +38,8 @@ class TaskResponse(BaseModel):
     final_output: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
+    # Predicted completion time while the task is running
+    eta: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -46,7 +70,15 @@ class WebSocketMessage(BaseModel):
     message: Optional[str] = None
     progress: Optional[int] = None
     data: Optional[Dict[str, Any]] = None
-    timestamp: datetime = datetime.utcnow()
+    seq: Optional[int] = None  # Task state version after this event
+    delta: Optional[Dict[str, Any]] = None  # State changes made by this event
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+class TaskStateSnapshot(BaseModel):
+    version: int
+    task: TaskResponse
+    subtasks: List[SubtaskResponse]
+    streaming: Dict[str, Dict[str, str]] = {}  # Partial output by subtask id
 
 class AgentResult(BaseModel):
     success: bool
@@ -54,6 +86,11 @@ class AgentResult(BaseModel):
     error: Optional[str] = None
     execution_time: Optional[float] = None
 
+class AgentChunk(BaseModel):
+    """A piece of a text output field, produced while the agent is still working"""
+    field: str
+    text: str
+
 class ExecutionContext(BaseModel):
     subtask_id: str
     input_data: Dict[str, Any]
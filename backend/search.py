@@ -0,0 +1,222 @@
+# Full-text search over task descriptions and agent outputs (FTS5 on SQLite, LIKE elsewhere)
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from sqlalchemy import column, func, insert, literal_column, or_, select, table, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from database import engine, Task, Subtask, SearchDocument, TaskStatus
+
+logger = logging.getLogger(__name__)
+
+# Agent output fields whose text is searchable
+SEARCH_OUTPUT_FIELDS = ("content", "improved_content", "key_points")
+# Rank weight of a description match relative to an output match
+DESCRIPTION_WEIGHT = 2.0
+SNIPPET_TOKENS = 16
+HIGHLIGHT = ("<mark>", "</mark>")
+
+class SearchError(ValueError):
+    """The query could not be parsed"""
+
+def output_text(output: Optional[Dict[str, Any]]) -> str:
+    """Searchable text of a subtask's output"""
+    parts = []
+    for field in SEARCH_OUTPUT_FIELDS:
+        value = (output or {}).get(field)
+        if isinstance(value, list):
+            parts.extend(str(item) for item in value)
+        elif value:
+            parts.append(str(value))
+    return "\n".join(parts)
+
+def _hit(row, rank: Optional[float], snippet: str) -> Dict[str, Any]:
+    return {
+        "id": row.id,
+        "description": row.description,
+        "workflow_type": row.workflow_type,
+        "status": row.status,
+        "created_at": row.created_at,
+        "rank": rank,
+        "snippet": snippet
+    }
+
+class SearchIndex:
+    """Search without an index: LIKE over descriptions and raw outputs.
+
+    The maintenance hooks do nothing; they are called in the transaction of
+    the change they describe and must not commit.
+    """
+
+    def setup(self):
+        """Create the index (and fill it from existing tasks) if needed"""
+
+    def add_tasks(self, db: Session, tasks: List[Tuple[str, str]]):
+        """Index new tasks given as (id, description)"""
+
+    def add_output(self, db: Session, task_id: str, output: Optional[Dict[str, Any]]):
+        """Add a completed subtask's output to its task's entry"""
+
+    def clear_outputs(self, db: Session, task_id: str):
+        """Drop the outputs of a task that is about to run again"""
+
+    def _filtered(self, query, status: Optional[List[TaskStatus]], workflow_type: Optional[List[str]]):
+        if status:
+            query = query.filter(Task.status.in_(status))
+        if workflow_type:
+            query = query.filter(Task.workflow_type.in_(workflow_type))
+        return query
+
+    def search(self, db: Session, query: str, limit: int = 20, offset: int = 0,
+               status: Optional[List[TaskStatus]] = None,
+               workflow_type: Optional[List[str]] = None,
+               raw: bool = False) -> Tuple[int, List[Dict[str, Any]]]:
+        """Tasks matching every word of ``query``, newest first; returns
+        (total matches, one page of hits). ``raw`` is not supported."""
+        matches = db.query(Task.id)
+        for word in query.split():
+            pattern = f"%{word}%"
+            in_outputs = select(Subtask.id).where(Subtask.task_id == Task.id, Subtask.output_data.ilike(pattern))
+            matches = matches.filter(or_(Task.description.ilike(pattern), in_outputs.exists()))
+        matches = self._filtered(matches, status, workflow_type)
+        total = matches.count()
+        rows = (
+            db.query(Task.id, Task.description, Task.workflow_type, Task.status, Task.created_at)
+            .filter(Task.id.in_(matches.subquery().select()))
+            .order_by(Task.created_at.desc())
+            .offset(offset)
+            .limit(limit)
+        )
+        return total, [_hit(row, None, row.description[:200]) for row in rows]
+
+class Fts5SearchIndex(SearchIndex):
+    """SQLite FTS5 index; row ids come from ``search_documents``"""
+    table = "task_search"
+
+    def setup(self):
+        with engine.begin() as connection:
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} "
+                "USING fts5(description, content, tokenize = 'porter unicode61', prefix = '2 3')"
+            ))
+            connection.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {self.table}_delete AFTER DELETE ON search_documents "
+                f"BEGIN DELETE FROM {self.table} WHERE rowid = old.id; END"
+            ))
+            indexed = connection.execute(select(SearchDocument.id).limit(1)).first()
+            if not indexed and connection.execute(select(Task.id).limit(1)).first():
+                self._backfill(connection)
+
+    def _backfill(self, connection):
+        """Index every existing task, with its outputs, in a few statements"""
+        logger.info("Building the full-text search index from existing tasks")
+        connection.execute(text("INSERT INTO search_documents (task_id) SELECT id FROM tasks"))
+        # json_each yields a string field itself, or each item of a list
+        field_texts = " || char(10) || ".join(
+            f"coalesce((SELECT group_concat(value, char(10)) FROM json_each(s.output_data, '$.{field}')), '')"
+            for field in SEARCH_OUTPUT_FIELDS
+        )
+        connection.execute(text(
+            f"INSERT INTO {self.table} (rowid, description, content) "
+            "SELECT d.id, t.description, coalesce(("
+            f"  SELECT group_concat({field_texts}, char(10)) FROM subtasks s"
+            "   WHERE s.task_id = t.id AND json_valid(s.output_data)"
+            "), '') "
+            "FROM search_documents d JOIN tasks t ON t.id = d.task_id"
+        ))
+
+    def add_tasks(self, db: Session, tasks: List[Tuple[str, str]]):
+        if not tasks:
+            return
+        # The transaction already holds SQLite's write lock (the tasks were
+        # just inserted), so the new documents are exactly those past the
+        # current last id; copying them over in SQL beats RETURNING every id
+        last_id = db.query(func.max(SearchDocument.id)).scalar() or 0
+        db.execute(insert(SearchDocument), [{"task_id": task_id} for task_id, _ in tasks])
+        db.execute(text(
+            f"INSERT INTO {self.table} (rowid, description, content) "
+            "SELECT d.id, t.description, '' FROM search_documents d JOIN tasks t ON t.id = d.task_id "
+            "WHERE d.id > :last_id"
+        ), {"last_id": last_id})
+
+    def _document_id(self, db: Session, task_id: str) -> Optional[int]:
+        return db.query(SearchDocument.id).filter(SearchDocument.task_id == task_id).scalar()
+
+    def add_output(self, db: Session, task_id: str, output: Optional[Dict[str, Any]]):
+        new_text = output_text(output)
+        document_id = self._document_id(db, task_id)
+        if new_text and document_id is not None:
+            db.execute(
+                text(f"UPDATE {self.table} SET content = content || char(10) || :text WHERE rowid = :id"),
+                {"text": new_text, "id": document_id}
+            )
+
+    def clear_outputs(self, db: Session, task_id: str):
+        document_id = self._document_id(db, task_id)
+        if document_id is not None:
+            db.execute(text(f"UPDATE {self.table} SET content = '' WHERE rowid = :id"), {"id": document_id})
+
+    def search(self, db: Session, query: str, limit: int = 20, offset: int = 0,
+               status: Optional[List[TaskStatus]] = None,
+               workflow_type: Optional[List[str]] = None,
+               raw: bool = False) -> Tuple[int, List[Dict[str, Any]]]:
+        """Best matches first. ``query`` is a list of words (the last one
+        matched as a prefix) unless ``raw``, then it's FTS5 query syntax."""
+        match = query if raw else match_expression(query)
+        if not match:
+            return 0, []
+
+        rank = literal_column(f"bm25({self.table}, {DESCRIPTION_WEIGHT}, 1.0)").label("rank")
+        snippet = literal_column(
+            f"snippet({self.table}, -1, '{HIGHLIGHT[0]}', '{HIGHLIGHT[1]}', '…', {SNIPPET_TOKENS})"
+        ).label("snippet")
+        fts = table(self.table, column("rowid"))
+        matching = text(f"{self.table} MATCH :match").bindparams(match=match)
+        matches = db.query(fts.c.rowid.label("document_id"), rank).select_from(fts).filter(matching)
+        # Without filters, counting and ranking only touch the index
+        if status or workflow_type:
+            matches = matches.join(SearchDocument, SearchDocument.id == fts.c.rowid)
+            matches = self._filtered(matches.join(Task, Task.id == SearchDocument.task_id), status, workflow_type)
+        try:
+            total = matches.with_entities(func.count()).scalar()
+            page = matches.order_by(text("rank")).offset(offset).limit(limit).all()
+        except OperationalError as e:
+            # Only a raw query can be malformed
+            if not raw:
+                raise
+            db.rollback()
+            raise SearchError(f"Invalid search query: {e.orig}")
+        if not page:
+            return total, []
+
+        # Snippets and task columns for the page only: SQLite would build a
+        # snippet for every match before sorting
+        document_ids = [hit.document_id for hit in page]
+        snippets = dict(db.query(fts.c.rowid, snippet).select_from(fts)
+                        .filter(matching, fts.c.rowid.in_(document_ids)))
+        tasks = {
+            row.document_id: row for row in
+            db.query(SearchDocument.id.label("document_id"), Task.id, Task.description, Task.workflow_type,
+                     Task.status, Task.created_at)
+            .join(Task, Task.id == SearchDocument.task_id)
+            .filter(SearchDocument.id.in_(document_ids))
+        }
+        return total, [
+            _hit(tasks[hit.document_id], round(hit.rank, 4), snippets.get(hit.document_id, ""))
+            for hit in page if hit.document_id in tasks
+        ]
+
+def match_expression(query: str) -> str:
+    """FTS5 query matching every word; the last one may be a prefix"""
+    words = ['"' + word.replace('"', '""') + '"' for word in query.split()]
+    if words:
+        words[-1] += "*"
+    return " ".join(words)
+
+def create_search_index() -> SearchIndex:
+    if engine.dialect.name == "sqlite":
+        return Fts5SearchIndex()
+    return SearchIndex()
+
+search_index = create_search_index()
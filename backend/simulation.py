@@ -0,0 +1,154 @@
+import json
+import math
+import os
+import random
+from typing import Dict, Any, List, Optional
+
+class LatencyModel:
+    """Distribution of simulated agent processing times (in seconds)"""
+
+    def sample(self, rng: random.Random) -> float:
+        raise NotImplementedError
+
+class FixedLatency(LatencyModel):
+    """Always the same delay; ``FixedLatency(0)`` disables sleeping entirely"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def sample(self, rng: random.Random) -> float:
+        return self.seconds
+
+class UniformLatency(LatencyModel):
+    """Uniformly distributed delay (the agents' historical 1-3s behaviour)"""
+
+    def __init__(self, low: float, high: float):
+        self.low = low
+        self.high = high
+
+    def sample(self, rng: random.Random) -> float:
+        return rng.uniform(self.low, self.high)
+
+class LogNormalLatency(LatencyModel):
+    """Long-tailed delay parameterised by its median and log-space sigma;
+    a median of 0 means no delay, like ``FixedLatency(0)``"""
+
+    def __init__(self, median: float, sigma: float):
+        if median < 0 or sigma < 0:
+            raise ValueError("LogNormalLatency needs a non-negative median and sigma")
+        self.median = median
+        self.sigma = sigma
+
+    def sample(self, rng: random.Random) -> float:
+        if self.median == 0:
+            return 0.0
+        return rng.lognormvariate(math.log(self.median), self.sigma)
+
+class TraceLatency(LatencyModel):
+    """Replays delays recorded from real executions"""
+
+    def __init__(self, samples: List[float]):
+        if not samples:
+            raise ValueError("TraceLatency needs at least one sample")
+        self.samples = samples
+
+    def sample(self, rng: random.Random) -> float:
+        return rng.choice(self.samples)
+
+    @classmethod
+    def from_file(cls, path: str, agent_name: Optional[str] = None) -> "TraceLatency":
+        """Load samples from a JSON list, a JSON object keyed by agent name,
+        or a text file with one duration per line"""
+        with open(path) as f:
+            raw = f.read()
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            data = [line for line in raw.splitlines() if line.strip()]
+        if isinstance(data, dict):
+            data = data.get(agent_name, [])
+        return cls([float(value) for value in data])
+
+def latency_from_config(config: Dict[str, Any], agent_name: Optional[str] = None) -> LatencyModel:
+    """Build a latency model from its dict description, e.g.
+    ``{"type": "lognormal", "median": 0.5, "sigma": 0.4}``"""
+    kind = config.get("type", "fixed")
+    if kind == "zero":
+        return FixedLatency(0)
+    if kind == "fixed":
+        return FixedLatency(float(config.get("seconds", 0)))
+    if kind == "uniform":
+        return UniformLatency(float(config["low"]), float(config["high"]))
+    if kind == "lognormal":
+        return LogNormalLatency(float(config["median"]), float(config.get("sigma", 0.5)))
+    if kind == "trace":
+        if "samples" in config:
+            return TraceLatency([float(value) for value in config["samples"]])
+        return TraceLatency.from_file(config["path"], agent_name)
+    raise ValueError(f"Unknown latency type: {kind}")
+
+class SimulationProfile:
+    """Controls how simulated agents behave: their RNG seed and latency.
+
+    With a seed, every agent gets its own RNG derived from the seed and the
+    agent name, so identical workloads produce identical scores and delays.
+    """
+
+    def __init__(self, seed: Optional[int] = None, default_latency: Optional[LatencyModel] = None,
+                 agent_latency: Optional[Dict[str, LatencyModel]] = None):
+        self.seed = seed
+        self.default_latency = default_latency or UniformLatency(1, 3)
+        self.agent_latency = agent_latency or {}
+
+    def rng_for(self, agent_name: str) -> random.Random:
+        """Get a fresh RNG for an agent"""
+        if self.seed is None:
+            return random.Random()
+        return random.Random(f"{self.seed}:{agent_name}")
+
+    def latency_for(self, agent_name: str) -> LatencyModel:
+        """Get the latency model for an agent"""
+        return self.agent_latency.get(agent_name, self.default_latency)
+
+    @classmethod
+    def zero(cls, seed: Optional[int] = 0) -> "SimulationProfile":
+        """No artificial latency at all, for measuring engine and I/O overhead"""
+        return cls(seed=seed, default_latency=FixedLatency(0))
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> "SimulationProfile":
+        """Build a profile from a dict such as::
+
+            {"seed": 42,
+             "latency": {"type": "lognormal", "median": 0.5, "sigma": 0.4},
+             "agents": {"Writer Agent": {"type": "trace", "path": "writer.json"}}}
+        """
+        default_latency = None
+        if "latency" in config:
+            default_latency = latency_from_config(config["latency"])
+        agent_latency = {
+            name: latency_from_config(agent_config, name)
+            for name, agent_config in config.get("agents", {}).items()
+        }
+        return cls(seed=config.get("seed"), default_latency=default_latency, agent_latency=agent_latency)
+
+    @classmethod
+    def from_env(cls) -> Optional["SimulationProfile"]:
+        """Profile from ``AGENT_SIMULATION`` (``zero`` or a JSON profile path)
+        and ``AGENT_SIMULATION_SEED``; ``None`` when not configured"""
+        setting = os.getenv("AGENT_SIMULATION")
+        seed = os.getenv("AGENT_SIMULATION_SEED")
+        if not setting and seed is None:
+            return None
+
+        if setting == "zero":
+            profile = cls.zero()
+        elif setting:
+            with open(setting) as f:
+                profile = cls.from_dict(json.load(f))
+        else:
+            profile = cls()
+
+        if seed is not None:
+            profile.seed = int(seed)
+        return profile
@@ -0,0 +1,162 @@
+# Cold start benchmark: how long a fresh worker process takes to become ready
+# Usage: cd backend && python startup_benchmark.py --runs 10 --output startup.json
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Run in the child process
+CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def startup():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter()
+
+ready = asyncio.run(startup())
+print(json.dumps({"import_seconds": imported - started, "startup_seconds": ready - imported}))
+"""
+
+MEASURES = ["process_seconds", "import_seconds", "startup_seconds"]
+
+def _child_env(database: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env["DATABASE_URL"] = f"sqlite:///{database}"
+    env.setdefault("LOG_LEVEL", "WARNING")
+    return env
+
+def run_once(database: str) -> Dict[str, float]:
+    """Start a worker process against ``database`` and time it"""
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=BACKEND_DIR, env=_child_env(database),
+        check=True, capture_output=True, text=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_seconds"] = time.perf_counter() - started
+    return result
+
+def import_breakdown(database: str, top: int) -> List[Dict[str, Any]]:
+    """Modules imported directly by ``main``, slowest first"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=BACKEND_DIR,
+        env=_child_env(database), check=True, capture_output=True, text=True
+    ).stderr
+    # Modules are listed after what they import, indented by nesting: main's
+    # direct imports (three spaces) are the ones since the last top-level
+    # module (one space) before main
+    modules: List[Dict[str, Any]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        if not cumulative_us.strip().isdigit():
+            continue
+        if not name.startswith("  "):
+            if name.strip() == "main":
+                break
+            modules = []
+        elif name.startswith("   ") and not name.startswith("    "):
+            modules.append({"module": name.strip(), "cumulative_ms": int(cumulative_us) / 1000})
+    modules.sort(key=lambda module: module["cumulative_ms"], reverse=True)
+    return modules[:top]
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True, cwd=BACKEND_DIR
+        ).strip()
+    except Exception:
+        return None
+
+def _summary(runs: List[Dict[str, float]]) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {"runs": len(runs)}
+    for measure in MEASURES:
+        values = [run[measure] for run in runs]
+        summary[f"{measure}_median"] = statistics.median(values)
+        summary[f"{measure}_min"] = min(values)
+    return summary
+
+def run_benchmark(runs: int, top: int) -> Dict[str, Any]:
+    cold, warm = [], []
+    with tempfile.TemporaryDirectory(prefix="orchestration-startup-") as directory:
+        for i in range(runs):
+            database = os.path.join(directory, f"run-{i}.db")
+            cold.append(run_once(database))
+            warm.append(run_once(database))
+        modules = import_breakdown(os.path.join(directory, "run-0.db"), top)
+
+    return {
+        "benchmark": "orchestration-startup",
+        "version": 1,
+        "git_commit": _git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": sys.version.split()[0],
+        "config": {"runs": runs},
+        "results": {
+            "new_database": _summary(cold),
+            "set_up_database": _summary(warm),
+            "imports": modules,
+        },
+    }
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """Format a comparison of the median times of two result documents"""
+    lines = []
+    for case in ("new_database", "set_up_database"):
+        old, new = baseline["results"].get(case, {}), current["results"][case]
+        for measure in MEASURES:
+            before, after = old.get(f"{measure}_median"), new.get(f"{measure}_median")
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            lines.append(f"{case:<16} {measure:<16} {before * 1000:>9.1f}ms -> {after * 1000:>9.1f}ms "
+                         f"({change:+.1f}%)")
+    return lines
+
+def main_cli(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Orchestration backend cold start benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="runs of each case")
+    parser.add_argument("--top", type=int, default=10, help="imports to list")
+    parser.add_argument("--output", default="startup_results.json",
+                        help="where to write the JSON results")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.runs, args.top)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for case in ("new_database", "set_up_database"):
+        result = report["results"][case]
+        print(
+            f"{case:<16} process {result['process_seconds_median'] * 1000:.0f}ms, "
+            f"import main {result['import_seconds_median'] * 1000:.0f}ms, "
+            f"startup {result['startup_seconds_median'] * 1000:.1f}ms (medians of {result['runs']})"
+        )
+    print("\nSlowest imports of main:")
+    for module in report["results"]["imports"]:
+        print(f"  {module['module']:<24} {module['cumulative_ms']:>8.1f}ms")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare} ({baseline.get('git_commit') or 'unknown commit'}):")
+        for line in compare(baseline, report):
+            print(line)
+
+    print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main_cli()
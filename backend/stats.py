@@ -0,0 +1,138 @@
+# Aggregate task statistics served from incrementally maintained counter tables
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+import math
+import os
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from database import Task, TaskCount, StatsRollup, TaskStatus, adjust_task_count
+
+# Width of a rollup bucket
+STATS_BUCKET_SECONDS = int(os.getenv("STATS_BUCKET_SECONDS", "3600"))
+# Latency bins per doubling, starting at 1ms; 4 keeps estimates within ~10%
+LATENCY_BINS_PER_OCTAVE = 4
+LATENCY_MIN_SECONDS = 0.001
+PERCENTILES = (50, 90, 99)
+
+def init_task_counts(db: Session):
+    """Create the status counters, counting existing tasks once if needed"""
+    if db.query(TaskCount.status).first():
+        return
+    counts = dict(db.query(Task.status, func.count()).group_by(Task.status).all())
+    db.execute(insert(TaskCount), [
+        {"status": status, "count": counts.get(status, 0)} for status in TaskStatus
+    ])
+    db.commit()
+
+def record_transition(db: Session, old: Optional[TaskStatus], new: TaskStatus, count: int = 1):
+    """Move tasks between status counters; ``old`` is None for new tasks.
+
+    Doesn't commit: call it right before committing the status change.
+    """
+    if old == new:
+        return
+    if old is not None:
+        adjust_task_count(db, old, -count)
+    adjust_task_count(db, new, count)
+
+def latency_bin(seconds: float) -> int:
+    if seconds <= LATENCY_MIN_SECONDS:
+        return 0
+    return int(math.log2(seconds / LATENCY_MIN_SECONDS) * LATENCY_BINS_PER_OCTAVE)
+
+def bin_latency(latency_bin: int) -> float:
+    """Representative latency (geometric middle) of a bin"""
+    return LATENCY_MIN_SECONDS * 2 ** ((latency_bin + 0.5) / LATENCY_BINS_PER_OCTAVE)
+
+def bucket_start(at: datetime) -> datetime:
+    epoch = datetime(1970, 1, 1)
+    seconds = int((at - epoch).total_seconds())
+    return epoch + timedelta(seconds=seconds - seconds % STATS_BUCKET_SECONDS)
+
+def record_outcome(db: Session, dimension: str, name: str, started_at: datetime,
+                   finished_at: datetime, succeeded: bool, seconds: Optional[float] = None):
+    """Count a finished workflow run or agent call in its rollup bucket.
+
+    Its latency is ``seconds`` if given (e.g. an agent's own execution
+    time), otherwise the time between ``started_at`` and ``finished_at``.
+    Doesn't commit, like record_transition.
+    """
+    if seconds is None:
+        seconds = (finished_at - started_at).total_seconds()
+    key = {
+        "bucket_start": bucket_start(finished_at),
+        "dimension": dimension,
+        "name": name,
+        "latency_bin": latency_bin(seconds)
+    }
+    completed, failed = (1, 0) if succeeded else (0, 1)
+    statement = _upsert(db).values(**key, completed=completed, failed=failed)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=list(key),
+        set_={"completed": StatsRollup.completed + completed, "failed": StatsRollup.failed + failed}
+    ))
+
+def _upsert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(StatsRollup)
+
+def _percentiles(bins: Dict[int, int], total: int) -> Dict[str, Optional[float]]:
+    result = {f"p{p}": None for p in PERCENTILES}
+    if not total:
+        return result
+    seen = 0
+    targets = iter(PERCENTILES)
+    target = next(targets)
+    for latency_bin in sorted(bins):
+        seen += bins[latency_bin]
+        while target is not None and seen >= total * target / 100:
+            result[f"p{target}"] = round(bin_latency(latency_bin), 4)
+            target = next(targets, None)
+    return result
+
+def get_stats(db: Session, window_hours: float = 24) -> Dict[str, Any]:
+    """Status counts, plus per-workflow and per-agent throughput, success
+    rate and latency percentiles over the last ``window_hours``.
+    """
+    counts = {status.value: 0 for status in TaskStatus}
+    for status, count in db.query(TaskCount.status, TaskCount.count):
+        counts[status.value] = count
+
+    since = bucket_start(datetime.utcnow() - timedelta(hours=window_hours))
+    rows = (
+        db.query(StatsRollup.dimension, StatsRollup.name, StatsRollup.latency_bin,
+                 func.sum(StatsRollup.completed), func.sum(StatsRollup.failed))
+        .filter(StatsRollup.bucket_start >= since)
+        .group_by(StatsRollup.dimension, StatsRollup.name, StatsRollup.latency_bin)
+    )
+    groups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for dimension, name, latency_bin, completed, failed in rows:
+        group = groups.setdefault((dimension, name), {"completed": 0, "failed": 0, "bins": {}})
+        group["completed"] += completed
+        group["failed"] += failed
+        if completed:
+            group["bins"][latency_bin] = completed
+
+    breakdown: Dict[str, Dict[str, Any]] = {"workflow": {}, "agent": {}}
+    for (dimension, name), group in sorted(groups.items()):
+        finished = group["completed"] + group["failed"]
+        breakdown.setdefault(dimension, {})[name] = {
+            "completed": group["completed"],
+            "failed": group["failed"],
+            "success_rate": round(group["completed"] / finished, 4) if finished else None,
+            "throughput_per_hour": round(group["completed"] / window_hours, 2),
+            "latency_seconds": _percentiles(group["bins"], group["completed"])
+        }
+
+    return {
+        "tasks": {"total": sum(counts.values()), **counts},
+        "workflows": breakdown["workflow"],
+        "agents": breakdown["agent"],
+        "window_hours": window_hours,
+        "bucket_seconds": STATS_BUCKET_SECONDS
+    }
@@ -0,0 +1,56 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from models import SubtaskStatus
+
+class SubtaskRecord:
+    """Runtime state of a subtask while its task executes.
+
+    Dependencies are tracked as an in-degree (unfinished dependencies) and a
+    list of dependents, so finishing a subtask only touches its dependents.
+    ``output`` is the agent's decoded result, kept for the subtasks that
+    consume it and for aggregation.
+    """
+    __slots__ = ("id", "agent_name", "description", "order", "status", "started_at",
+                 "dependencies", "in_degree", "dependents", "output")
+
+    def __init__(self, id: str, agent_name: str, description: str, order: int,
+                 dependencies: Sequence[str] = ()):
+        self.id = id
+        self.agent_name = agent_name
+        self.description = description
+        self.order = order
+        self.status = SubtaskStatus.PENDING
+        self.started_at: Optional[datetime] = None
+        self.dependencies = tuple(dependencies)
+        self.in_degree = len(self.dependencies)
+        self.dependents: List["SubtaskRecord"] = []
+        self.output: Optional[Dict[str, Any]] = None
+
+class TaskRecord:
+    """Runtime state of an executing task and its subtasks, in order.
+
+    ``eta`` is its latest predicted completion time.
+    """
+    __slots__ = ("id", "description", "workflow_type", "started_at", "subtasks", "eta")
+
+    def __init__(self, id: str, description: str, workflow_type: str, started_at: datetime,
+                 subtasks: List[SubtaskRecord]):
+        self.id = id
+        self.description = description
+        self.workflow_type = workflow_type
+        self.started_at = started_at
+        self.subtasks: Dict[str, SubtaskRecord] = {
+            subtask.id: subtask for subtask in sorted(subtasks, key=lambda s: s.order)
+        }
+        for subtask in self.subtasks.values():
+            for dependency in subtask.dependencies:
+                self.subtasks[dependency].dependents.append(subtask)
+        self.eta: Optional[datetime] = None
+
+    def ready(self) -> List[SubtaskRecord]:
+        """Pending subtasks whose dependencies have all completed"""
+        return [
+            subtask for subtask in self.subtasks.values()
+            if subtask.in_degree == 0 and subtask.status == SubtaskStatus.PENDING
+        ]
@@ -0,0 +1,122 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _normalize(value: Any) -> Any:
+    """Make a field value comparable and JSON friendly"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, "value"):  # Enum members
+        return value.value
+    return value
+
+class _TaskState:
+    __slots__ = ("version", "task", "subtasks", "streaming")
+
+    def __init__(self):
+        self.version = 0
+        self.task: Dict[str, Any] = {}
+        self.subtasks: Dict[str, Dict[str, Any]] = {}
+        # Partial text of fields still being streamed, by subtask id
+        self.streaming: Dict[str, Dict[str, str]] = {}
+
+class TaskStateTracker:
+    """Versions the live state of running tasks and computes deltas.
+
+    Every event of a task bumps the task's version and yields a delta holding
+    only the fields that actually changed, which may be none (e.g. a progress
+    message). Each logged event thus has a ``seq`` of its own, so replays
+    after a seq miss nothing. Clients apply deltas in ``seq`` order and
+    resync from a snapshot on a gap.
+    """
+
+    def __init__(self, max_finished: int = 1000):
+        self.max_finished = max_finished
+        self.tasks: Dict[str, _TaskState] = {}
+        # Final versions of finished tasks, oldest first
+        self.finished: "OrderedDict[str, int]" = OrderedDict()
+
+    def version(self, task_id: str) -> int:
+        """Current version of a task's state (0 if never tracked)"""
+        if task_id in self.tasks:
+            return self.tasks[task_id].version
+        return self.finished.get(task_id, 0)
+
+    def live_version(self, task_id: str) -> Optional[int]:
+        """Version of a task that is still running in this process, else None"""
+        state = self.tasks.get(task_id)
+        return state.version if state else None
+
+    def streaming(self, task_id: str) -> Dict[str, Dict[str, str]]:
+        """Partial output of subtasks that are still streaming"""
+        state = self.tasks.get(task_id)
+        if not state:
+            return {}
+        return {subtask_id: dict(fields) for subtask_id, fields in state.streaming.items()}
+
+    def apply(self, task_id: str, task: Optional[Dict[str, Any]] = None,
+              subtask_id: Optional[str] = None, subtask: Optional[Dict[str, Any]] = None,
+              output: Optional[Dict[str, Any]] = None,
+              output_append: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, Any]]:
+        """Record changes and return the new version and the delta.
+
+        ``task`` and ``subtask`` hold field values; only the ones that differ
+        from the last known state go into the delta. ``output`` is a subtask's
+        finished output (minus already streamed fields) and ``output_append``
+        the next streamed piece of its text fields.
+        """
+        state = self.tasks.get(task_id)
+        if state is None:
+            state = _TaskState()
+            state.version = self.finished.pop(task_id, 0)
+            self.tasks[task_id] = state
+
+        delta: Dict[str, Any] = {}
+
+        task_changes = self._diff(state.task, task or {})
+        if task_changes:
+            delta["task"] = task_changes
+
+        if subtask_id:
+            known = state.subtasks.setdefault(subtask_id, {})
+            subtask_changes = self._diff(known, subtask or {})
+            if output_append:
+                buffers = state.streaming.setdefault(subtask_id, {})
+                for field, text in output_append.items():
+                    buffers[field] = buffers.get(field, "") + text
+                subtask_changes["output_append"] = output_append
+            if output is not None:
+                subtask_changes["output"] = output
+                state.streaming.pop(subtask_id, None)
+            if subtask_changes:
+                delta["subtasks"] = {subtask_id: subtask_changes}
+
+        state.version += 1
+        return state.version, delta
+
+    def finish(self, task_id: str):
+        """Drop the live state of a task that reached a terminal status"""
+        state = self.tasks.pop(task_id, None)
+        if state is None:
+            return
+        self.finished[task_id] = state.version
+        self.finished.move_to_end(task_id)
+        while len(self.finished) > self.max_finished:
+            self.finished.popitem(last=False)
+
+    def forget(self, task_id: str):
+        """Remove every trace of a deleted task"""
+        self.tasks.pop(task_id, None)
+        self.finished.pop(task_id, None)
+
+    def _diff(self, known: Dict[str, Any], values: Dict[str, Any]) -> Dict[str, Any]:
+        changes = {}
+        for field, value in values.items():
+            value = _normalize(value)
+            if field not in known or known[field] != value:
+                known[field] = value
+                changes[field] = value
+        return changes
@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The backend modules are imported flat, as when running from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The database URL is read at import time; never touch ./orchestration.db
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='orchestration-tests-')}/tests.db")
+
+@pytest.fixture
+def db():
+    """A session on the scratch database, set up on first use"""
+    from database import SessionLocal
+    from schema import ensure_schema
+
+    ensure_schema()
+    with SessionLocal() as session:
+        yield session
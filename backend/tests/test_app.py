@@ -0,0 +1,40 @@
+"""
+Application factory: per-app state and what happens at import.
+"""
+import asyncio
+
+import httpx
+
+import logging_config
+import main
+from simulation import SimulationProfile
+
+def test_import_leaves_logging_alone():
+    assert logging_config._listener is None
+
+def test_apps_share_no_state():
+    first, second = main.create_app(), main.create_app()
+
+    for name in ("websocket_manager", "execution_engine", "retention_worker", "profiler"):
+        assert getattr(first.state, name) is not getattr(second.state, name)
+    assert first.state.execution_engine.queue is not second.state.execution_engine.queue
+    assert first.state.execution_engine.websocket_manager is first.state.websocket_manager
+
+def test_endpoints_use_their_own_app():
+    first, second = main.create_app(), main.create_app()
+    first.state.execution_engine.agent_registry.set_simulation(SimulationProfile.zero())
+
+    async def run():
+        async with first.router.lifespan_context(first), second.router.lifespan_context(second):
+            transport = httpx.ASGITransport(app=first)
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                response = await client.post("/api/tasks", json={"description": "d", "workflow_type": "custom"})
+                response.raise_for_status()
+                task_id = response.json()["id"]
+                await first.state.execution_engine.queue.join()
+                return task_id
+
+    task_id = asyncio.run(run())
+
+    assert first.state.execution_engine.task_state.version(task_id) > 0
+    assert second.state.execution_engine.task_state.version(task_id) == 0
@@ -0,0 +1,94 @@
+"""
+Error paths of the micro-batching dispatcher.
+"""
+import asyncio
+from typing import List
+
+import pytest
+
+from batching import BatchDispatcher
+from schemas import AgentResult, ExecutionContext
+
+class BatchAgent:
+    """Records its batches and answers each with ``reply``"""
+    name = "Batch Agent"
+    supports_batching = True
+
+    def __init__(self, reply=None):
+        self.reply = reply or (lambda contexts: [
+            AgentResult(success=True, data={"id": context.subtask_id}) for context in contexts
+        ])
+        self.batches: List[List[str]] = []
+
+    async def execute_batch(self, contexts: List[ExecutionContext]) -> List[AgentResult]:
+        self.batches.append([context.subtask_id for context in contexts])
+        return self.reply(contexts)
+
+def contexts(count: int) -> List[ExecutionContext]:
+    return [ExecutionContext(subtask_id=str(index), input_data={}, shared_context={}) for index in range(count)]
+
+def run_batch(agent: BatchAgent, count: int, max_batch_size: int = 16):
+    """Submit ``count`` calls at once; returns each caller's result or exception"""
+    dispatcher = BatchDispatcher(max_batch_size=max_batch_size, max_wait=0.01)
+
+    async def run():
+        return await asyncio.gather(*(dispatcher.execute(agent, context) for context in contexts(count)),
+                                    return_exceptions=True)
+
+    return asyncio.run(run())
+
+def test_full_batch_runs_without_waiting():
+    agent = BatchAgent()
+    results = run_batch(agent, 5, max_batch_size=2)
+
+    assert agent.batches == [["0", "1"], ["2", "3"], ["4"]]
+    assert [result.data["id"] for result in results] == ["0", "1", "2", "3", "4"]
+
+def test_batch_exception_fails_every_call():
+    def reply(contexts):
+        raise ConnectionError("service down")
+
+    results = run_batch(BatchAgent(reply), 3)
+
+    assert [(result.success, result.error) for result in results] == [(False, "service down")] * 3
+
+def test_missing_results_fail_their_callers():
+    results = run_batch(BatchAgent(lambda contexts: [AgentResult(success=True)]), 3)
+
+    assert results[0].success
+    for result in results[1:]:
+        assert isinstance(result, RuntimeError)
+        assert "returned 1 results for a batch of 3" in str(result)
+
+def test_cancelled_callers_drop_out_of_the_batch():
+    agent = BatchAgent()
+    dispatcher = BatchDispatcher(max_batch_size=16, max_wait=0.01)
+
+    async def run():
+        calls = [asyncio.create_task(dispatcher.execute(agent, context)) for context in contexts(3)]
+        await asyncio.sleep(0)
+        calls[1].cancel()
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert agent.batches == [["0", "2"]]
+    assert isinstance(results[1], asyncio.CancelledError)
+    assert dispatcher.stats()["calls"] == 2
+
+def test_cancelled_batch_calls_nothing():
+    agent = BatchAgent()
+    dispatcher = BatchDispatcher(max_batch_size=16, max_wait=0.01)
+
+    async def run():
+        call = asyncio.create_task(dispatcher.execute(agent, contexts(1)[0]))
+        await asyncio.sleep(0)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+
+    assert agent.batches == []
+    assert dispatcher.stats()["batches"] == 0
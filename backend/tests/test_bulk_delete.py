@@ -0,0 +1,78 @@
+"""
+Set-based task deletion: cascades, status counters and running executions.
+"""
+import asyncio
+import uuid
+from typing import Dict, List
+
+import database
+from database import Task, Subtask, SearchDocument, TaskCount, TaskStatus, delete_tasks
+from execution_engine import ExecutionEngine
+from search import search_index
+from stats import record_transition
+from websocket_manager import WebSocketManager
+
+def add_tasks(db, statuses: List[TaskStatus], subtasks: int = 2) -> List[str]:
+    """Insert counted and indexed tasks with the given statuses"""
+    ids = []
+    for status in statuses:
+        task_id = str(uuid.uuid4())
+        db.add(Task(id=task_id, description=f"task {task_id}", workflow_type="custom", status=status))
+        db.flush()
+        for order in range(subtasks):
+            db.add(Subtask(id=f"{task_id}-{order}", task_id=task_id, agent_name="General Agent",
+                           description="step", order=order))
+        record_transition(db, None, status)
+        search_index.add_tasks(db, [(task_id, f"task {task_id}")])
+        ids.append(task_id)
+    db.commit()
+    return ids
+
+def counts(db) -> Dict[TaskStatus, int]:
+    return dict(db.query(TaskCount.status, TaskCount.count).all())
+
+def test_delete_cascades_to_subtasks_and_search_documents(db):
+    ids = add_tasks(db, [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.PENDING])
+
+    assert delete_tasks(db, ids[:2]) == 2
+
+    assert db.query(Task).filter(Task.id.in_(ids)).count() == 1
+    assert db.query(Subtask).filter(Subtask.task_id.in_(ids)).count() == 2
+    assert db.query(SearchDocument).filter(SearchDocument.task_id.in_(ids)).count() == 1
+
+def test_delete_takes_tasks_off_the_status_counters(db):
+    before = counts(db)
+    ids = add_tasks(db, [TaskStatus.COMPLETED, TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.RUNNING])
+
+    delete_tasks(db, ids[1:] + ["no-such-task"])
+
+    after = counts(db)
+    assert after[TaskStatus.COMPLETED] == before[TaskStatus.COMPLETED] + 1
+    assert after[TaskStatus.FAILED] == before[TaskStatus.FAILED]
+    assert after[TaskStatus.RUNNING] == before[TaskStatus.RUNNING]
+    assert sum(after.values()) == db.query(Task).count()
+
+def test_delete_without_on_delete_cascade_removes_subtasks_itself(db, monkeypatch):
+    # Tables created before the foreign key had ON DELETE CASCADE
+    monkeypatch.setattr(database, "subtasks_cascade", lambda: False)
+    ids = add_tasks(db, [TaskStatus.COMPLETED, TaskStatus.COMPLETED])
+
+    assert delete_tasks(db, ids) == 2
+    assert db.query(Subtask).filter(Subtask.task_id.in_(ids)).count() == 0
+
+def test_unknown_ids_delete_nothing(db):
+    before = counts(db)
+    assert delete_tasks(db, ["no-such-task"]) == 0
+    assert counts(db) == before
+
+def test_cancel_stops_running_executions():
+    engine = ExecutionEngine(WebSocketManager())
+
+    async def run():
+        engine.running["slow"] = asyncio.create_task(asyncio.sleep(60))
+        cancelled = await engine.cancel(["slow", "not-running"])
+        return cancelled, engine.running["slow"]
+
+    cancelled, execution = asyncio.run(run())
+    assert cancelled == 1
+    assert execution.cancelled()
@@ -0,0 +1,67 @@
+"""
+Versioned task events and their replay to reconnecting WebSocket clients.
+"""
+import asyncio
+import json
+from typing import List
+
+from event_log import EventLog
+from execution_engine import ExecutionEngine
+from websocket_manager import WebSocketManager
+
+class RecordingWebSocket:
+    """Stands in for a connected client, keeping every frame sent to it"""
+
+    def __init__(self):
+        self.scope = {"subprotocols": []}
+        self.sent: List[dict] = []
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+
+async def emit_task_events(engine: ExecutionEngine, task_id: str):
+    await engine._emit(task_id, "task_started", task={"status": "running"})
+    # Neither of these changes any field
+    await engine._emit(task_id, "subtask_started", subtask_id=f"{task_id}-0", message="started")
+    await engine._emit(task_id, "task_progress", message="Progress: 50%")
+    await engine._emit(task_id, "task_progress", progress=50, task={"progress": 50})
+    await engine._emit(task_id, "task_progress", message="Progress: 50%, again", task={"progress": 50})
+
+def test_every_event_gets_its_own_seq():
+    engine = ExecutionEngine(WebSocketManager())
+
+    asyncio.run(emit_task_events(engine, "task"))
+
+    seqs = [seq for seq, _ in engine.websocket_manager.event_log.since("task", 0)]
+    assert seqs == [1, 2, 3, 4, 5]
+    assert engine.task_state.version("task") == 5
+
+def test_replay_after_a_seq_sends_every_later_event():
+    manager = WebSocketManager()
+    engine = ExecutionEngine(manager)
+    asyncio.run(emit_task_events(engine, "task"))
+
+    websocket = RecordingWebSocket()
+    asyncio.run(manager.connect(websocket, "task", since=1))
+
+    assert [event["seq"] for event in websocket.sent] == [2, 3, 4, 5]
+    assert [event["type"] for event in websocket.sent] == [
+        "subtask_started", "task_progress", "task_progress", "task_progress"
+    ]
+    assert websocket.sent[0]["delta"] is None
+
+def test_replay_reaches_past_the_ring_buffer_from_disk(tmp_path):
+    manager = WebSocketManager(EventLog(max_events=2, directory=str(tmp_path)))
+    engine = ExecutionEngine(manager)
+    asyncio.run(emit_task_events(engine, "task"))
+    manager.event_log.flush()
+
+    websocket = RecordingWebSocket()
+    asyncio.run(manager.connect(websocket, "task", since=0))
+    manager.event_log.close()
+
+    assert [event["seq"] for event in websocket.sent] == [1, 2, 3, 4, 5]
+    assert (tmp_path / "task.jsonl").read_text().startswith("1\t{")
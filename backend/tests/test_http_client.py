@@ -0,0 +1,282 @@
+"""
+AgentHttpClient against local stub services.
+
+Connection reuse needs real sockets, so those tests serve the stub ASGI app
+with uvicorn on a free local port; the others hand the stub to httpx's ASGI
+transport.
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List
+
+import httpx
+import pytest
+import uvicorn
+
+import http_client
+from http_client import AgentHttpClient, MemoryHttpCache
+
+class StubService:
+    """ASGI app standing in for a model or tool service.
+
+    - ``/ok`` answers 200
+    - ``/flaky`` answers 503 ``failures`` times, then 200
+    - ``/slow`` answers 200 after ``delay`` seconds
+    """
+
+    def __init__(self, failures: int = 0, delay: float = 0.05):
+        self.failures = failures
+        self.delay = delay
+        # (path, peer address, perf_counter time) of every request
+        self.requests: List[Any] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, scope: Dict[str, Any], receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        path = scope["path"]
+        self.requests.append((path, tuple(scope.get("client") or ()), time.perf_counter()))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            status = 200
+            if path == "/flaky" and self.failures > 0:
+                self.failures -= 1
+                status = 503
+            elif path == "/slow":
+                await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        body = f"{path} {status}".encode()
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"text/plain"), (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    def count(self, path: str) -> int:
+        return sum(1 for request_path, _, _ in self.requests if request_path == path)
+
+@pytest.fixture
+def served_stub():
+    """A StubService served by uvicorn on 127.0.0.1; yields (stub, base URL)"""
+    stub = StubService()
+    server = uvicorn.Server(uvicorn.Config(stub, host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        assert time.monotonic() < deadline, "stub server did not start"
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    yield stub, f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join(timeout=10)
+
+def asgi_client(stub: StubService, **options) -> AgentHttpClient:
+    return AgentHttpClient(transport=httpx.ASGITransport(app=stub), base_url="http://stub", **options)
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_RETRY_BACKOFF", 0.02)
+    return 0.02
+
+def test_calls_reuse_one_pooled_connection(served_stub):
+    stub, base_url = served_stub
+
+    async def run():
+        client = AgentHttpClient()
+        try:
+            for _ in range(20):
+                response = await client.get(f"{base_url}/ok")
+                assert response.status_code == 200
+        finally:
+            await client.close()
+        return client.stats()
+
+    stats = asyncio.run(run())
+    peers = {peer for _, peer, _ in stub.requests}
+    assert stats["requests"] == 20
+    assert len(peers) == 1
+
+def test_pooled_calls_are_faster_than_a_client_per_call(served_stub):
+    stub, base_url = served_stub
+    calls = 20
+
+    async def run():
+        started = time.perf_counter()
+        for _ in range(calls):
+            async with httpx.AsyncClient() as client:
+                (await client.get(f"{base_url}/ok")).raise_for_status()
+        unpooled = time.perf_counter() - started
+
+        client = AgentHttpClient()
+        await client.start()
+        try:
+            started = time.perf_counter()
+            for _ in range(calls):
+                (await client.get(f"{base_url}/ok")).raise_for_status()
+            pooled = time.perf_counter() - started
+        finally:
+            await client.close()
+        return unpooled, pooled
+
+    unpooled, pooled = asyncio.run(run())
+    # A new client per call opens a connection (and builds an SSL context) each time
+    assert len({peer for _, peer, _ in stub.requests}) == calls + 1
+    assert pooled < unpooled
+
+def test_retries_5xx_with_exponential_backoff(fast_backoff):
+    stub = StubService(failures=2)
+
+    async def run():
+        client = asgi_client(stub)
+        try:
+            return await client.get("/flaky"), client.stats()
+        finally:
+            await client.close()
+
+    response, stats = asyncio.run(run())
+    assert response.status_code == 200
+    assert stub.count("/flaky") == 3
+    assert stats["retries"] == 2
+    times = [at for path, _, at in stub.requests]
+    # Jitter keeps each delay within [0.5, 1.5) of backoff * 2 ** attempt
+    for attempt, (before, after) in enumerate(zip(times, times[1:])):
+        assert after - before >= fast_backoff * 2 ** attempt * 0.5
+
+def test_gives_up_after_the_configured_retries(fast_backoff):
+    stub = StubService(failures=10)
+
+    async def run():
+        client = asgi_client(stub)
+        try:
+            return await client.get("/flaky", retries=1)
+        finally:
+            await client.close()
+
+    assert asyncio.run(run()).status_code == 503
+    assert stub.count("/flaky") == 2
+
+def test_post_is_not_retried_unless_asked(fast_backoff):
+    stub = StubService(failures=1)
+
+    async def run():
+        client = asgi_client(stub)
+        try:
+            first = await client.post("/flaky")
+            stub.failures = 1
+            second = await client.post("/flaky", retries=1)
+            return first, second
+        finally:
+            await client.close()
+
+    first, second = asyncio.run(run())
+    assert first.status_code == 503
+    assert second.status_code == 200
+    assert stub.count("/flaky") == 3
+
+def test_retries_connection_errors(fast_backoff):
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request.url.path)
+        if len(attempts) <= 2:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(200, text="ok")
+
+    async def run(path: str, **kwargs):
+        client = AgentHttpClient(transport=httpx.MockTransport(handler))
+        try:
+            return await client.get(f"http://stub{path}", **kwargs)
+        finally:
+            await client.close()
+
+    assert asyncio.run(run("/ok")).status_code == 200
+    assert len(attempts) == 3
+
+    attempts.clear()
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(run("/ok", retries=1))
+    assert len(attempts) == 2
+
+def test_per_host_concurrency_limit(monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_MAX_CONNECTIONS_PER_HOST", 3)
+    stub = StubService(delay=0.05)
+
+    async def run():
+        client = asgi_client(stub)
+        try:
+            await asyncio.gather(*(client.get("/slow") for _ in range(12)))
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+    assert stub.count("/slow") == 12
+    assert stub.max_in_flight == 3
+
+def test_backoff_does_not_hold_the_host_slot(monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_MAX_CONNECTIONS_PER_HOST", 1)
+    monkeypatch.setattr(http_client, "HTTP_RETRY_BACKOFF", 0.4)
+    stub = StubService(failures=1)
+
+    async def run():
+        client = asgi_client(stub)
+        finished = {}
+
+        async def get(path: str):
+            await client.get(path)
+            finished[path] = time.perf_counter()
+
+        try:
+            flaky = asyncio.create_task(get("/flaky"))
+            await asyncio.sleep(0.05)
+            await get("/ok")
+            await flaky
+        finally:
+            await client.close()
+        return finished
+
+    finished = asyncio.run(run())
+    # /ok went through while /flaky was backing off (at least 0.2s)
+    assert finished["/ok"] < finished["/flaky"] - 0.1
+
+def test_cache_hook_serves_repeated_gets():
+    stub = StubService()
+
+    async def run():
+        client = asgi_client(stub, cache=MemoryHttpCache(ttl=60))
+        try:
+            first = await client.get("/ok", use_cache=True)
+            second = await client.get("/ok", use_cache=True)
+            uncached = await client.get("/ok")
+            return first, second, uncached, client.stats()
+        finally:
+            await client.close()
+
+    first, second, uncached, stats = asyncio.run(run())
+    assert first.text == second.text == uncached.text == "/ok 200"
+    assert stub.count("/ok") == 2
+    assert stats["cache_hits"] == 1
+
+def test_cache_skips_failed_responses(fast_backoff):
+    stub = StubService(failures=10)
+
+    async def run():
+        client = asgi_client(stub, cache=MemoryHttpCache(ttl=60))
+        try:
+            for _ in range(2):
+                await client.get("/flaky", use_cache=True, retries=0)
+        finally:
+            await client.close()
+        return client.stats()
+
+    stats = asyncio.run(run())
+    assert stub.count("/flaky") == 2
+    assert stats["cache_hits"] == 0
@@ -0,0 +1,98 @@
+"""
+Agent outcomes in the stats rollups and the cost model.
+"""
+import asyncio
+import uuid
+from typing import Any, Dict, Tuple
+
+import execution_engine
+from agents import AgentRegistry, BaseAgent
+from database import Task, Subtask, TaskStatus, SubtaskStatus
+from execution_engine import ExecutionEngine
+from schemas import ExecutionContext
+from simulation import SimulationProfile
+from stats import get_stats, record_transition
+from websocket_manager import WebSocketManager
+
+class EchoAgent(BaseAgent):
+    async def _process_task(self, task_description: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {"content": task_description}
+
+class FailingAgent(BaseAgent):
+    async def _process_task(self, task_description: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        raise ValueError("model unavailable")
+
+class SilentAgent(BaseAgent):
+    async def stream(self, context: ExecutionContext):
+        return
+        yield
+
+def run_with_agent(db, monkeypatch, agent_class) -> Tuple[str, str, ExecutionEngine]:
+    """Run a one-step task on a fresh agent; returns its name, the task id and the engine"""
+    agent_name = f"{agent_class.__name__} {uuid.uuid4()}"
+    workflow_type = f"workflow {agent_name}"
+    monkeypatch.setitem(execution_engine.WORKFLOW_STEPS, workflow_type, [(agent_name, "{}")])
+    registry = AgentRegistry(SimulationProfile.zero())
+    registry.register(agent_name, lambda: agent_class(agent_name))
+    engine = ExecutionEngine(WebSocketManager(), registry)
+
+    task_id = str(uuid.uuid4())
+    db.add(Task(id=task_id, description="describe", workflow_type=workflow_type, status=TaskStatus.PENDING))
+    record_transition(db, None, TaskStatus.PENDING)
+    db.commit()
+    asyncio.run(engine.execute_task(task_id))
+    db.expire_all()
+    return agent_name, task_id, engine
+
+def test_successful_call_counts_as_completed(db, monkeypatch):
+    agent_name, task_id, engine = run_with_agent(db, monkeypatch, EchoAgent)
+
+    stats = get_stats(db)["agents"][agent_name]
+    assert (stats["completed"], stats["failed"], stats["success_rate"]) == (1, 0, 1.0)
+    assert engine.cost_model.sketches[("agent", agent_name)].count == 1
+    assert db.query(Subtask.status).filter(Subtask.task_id == task_id).scalar() == SubtaskStatus.COMPLETED
+
+def test_failed_call_counts_as_failed(db, monkeypatch):
+    agent_name, task_id, engine = run_with_agent(db, monkeypatch, FailingAgent)
+
+    stats = get_stats(db)["agents"][agent_name]
+    assert (stats["completed"], stats["failed"], stats["success_rate"]) == (0, 1, 0.0)
+    # Failures say nothing about how long the agent takes
+    assert ("agent", agent_name) not in engine.cost_model.sketches
+    subtask = db.query(Subtask).filter(Subtask.task_id == task_id).one()
+    assert subtask.status == SubtaskStatus.FAILED
+    assert subtask.error_message == "model unavailable"
+    assert subtask.output_data is None
+
+def test_call_without_result_fails(db, monkeypatch):
+    agent_name, task_id, engine = run_with_agent(db, monkeypatch, SilentAgent)
+
+    assert get_stats(db)["agents"][agent_name]["failed"] == 1
+    subtask = db.query(Subtask).filter(Subtask.task_id == task_id).one()
+    assert subtask.status == SubtaskStatus.FAILED
+    assert "returned no result" in subtask.error_message
+
+def test_status_counters_follow_the_task(db, monkeypatch):
+    before = get_stats(db)["tasks"]
+
+    run_with_agent(db, monkeypatch, EchoAgent)
+    run_with_agent(db, monkeypatch, FailingAgent)
+
+    after = get_stats(db)["tasks"]
+    # A failed subtask doesn't fail its task
+    assert after["completed"] == before["completed"] + 2
+    assert after["pending"] == before["pending"]
+    assert after["running"] == before["running"]
+    assert after["total"] == db.query(Task).count()
+
+def test_aggregation_failure_moves_the_task_to_failed(db, monkeypatch):
+    monkeypatch.setattr(execution_engine, "get_aggregator", lambda workflow_type: None)
+    before = get_stats(db)["tasks"]
+
+    _, task_id, _ = run_with_agent(db, monkeypatch, EchoAgent)
+
+    after = get_stats(db)["tasks"]
+    assert db.query(Task.status).filter(Task.id == task_id).scalar() == TaskStatus.FAILED
+    assert after["failed"] == before["failed"] + 1
+    assert after["running"] == before["running"]
+    assert after["total"] == db.query(Task).count()
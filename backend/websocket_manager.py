@@ -1,27 +1,109 @@
-from fastapi import WebSocket
-from typing import Dict, List
+from fastapi import WebSocket, WebSocketDisconnect
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Set, Any, Tuple
 import json
 import logging
+import time
+
+from event_log import EventLog
+from ws_protocol import Protocol, Frame, JSON_PROTOCOL, PROTOCOLS, negotiate
 
 logger = logging.getLogger(__name__)
 
+# Task fields that multiplexed subscribers can filter on
+FILTER_FIELDS = ("status", "workflow_type")
+TERMINAL_STATUSES = ("completed", "failed")
+
 class WebSocketManager:
-    def __init__(self):
+    def __init__(self, event_log: Optional[EventLog] = None,
+                 load_task_attributes: Optional[Callable[[Dict[str, List[str]]], Dict[str, Dict[str, Any]]]] = None):
         # Dictionary to store active connections by task_id
         self.active_connections: Dict[str, List[WebSocket]] = {}
+        self.event_log = event_log or EventLog()
+        # Looks up the filterable fields of unfinished tasks matching a filter,
+        # for tasks this process hasn't seen an event of
+        self.load_task_attributes = load_task_attributes
+        
+        # Multiplexed connections: a reverse index from task to subscribers,
+        # plus the task filters and event types each connection asked for
+        self.task_subscribers: Dict[str, Set[WebSocket]] = {}
+        self.subscribed_tasks: Dict[WebSocket, Set[str]] = {}
+        self.subscribed_filters: Dict[WebSocket, List[Dict[str, List[str]]]] = {}
+        self.subscribed_types: Dict[WebSocket, Optional[Set[str]]] = {}
+        # Filterable fields of live tasks, picked up from event deltas and
+        # seeded from the database when a filter is subscribed
+        self.task_attributes: Dict[str, Dict[str, Any]] = {}
+        
+        # Wire protocol of each connection (JSON unless negotiated), and what
+        # each protocol cost: frames and bytes sent, seconds spent encoding
+        self.protocols: Dict[WebSocket, Protocol] = {}
+        self.frames_sent: Counter = Counter()
+        self.bytes_sent: Counter = Counter()
+        self.events_encoded: Counter = Counter()
+        self.encode_seconds: Counter = Counter()
+    
+    async def _accept(self, websocket: WebSocket):
+        """Accept a connection in the protocol it negotiated"""
+        protocol, subprotocol = negotiate(websocket.scope.get("subprotocols") or [])
+        await websocket.accept(subprotocol=subprotocol)
+        self.protocols[websocket] = protocol
+    
+    def protocol(self, websocket: WebSocket) -> Protocol:
+        return self.protocols.get(websocket, JSON_PROTOCOL)
     
-    async def connect(self, websocket: WebSocket, task_id: str):
-        """Accept a new WebSocket connection for a specific task"""
-        await websocket.accept()
+    async def _send(self, websocket: WebSocket, frame: Frame, size: Optional[int] = None):
+        protocol = self.protocol(websocket)
+        self.frames_sent[protocol.name] += 1
+        if isinstance(frame, bytes):
+            self.bytes_sent[protocol.name] += len(frame)
+            await websocket.send_bytes(frame)
+        else:
+            self.bytes_sent[protocol.name] += size if size is not None else len(frame.encode())
+            await websocket.send_text(frame)
+    
+    async def receive(self, websocket: WebSocket) -> Frame:
+        """Next text or binary frame from a client"""
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        return message["text"] if message.get("text") is not None else message["bytes"]
+    
+    async def receive_command(self, websocket: WebSocket) -> Optional[Dict[str, Any]]:
+        """Next command from a multiplexed client: JSON text or a binary frame
+        in the connection's protocol. Returns None, after telling the client,
+        if it can't be decoded."""
+        frame = await self.receive(websocket)
+        try:
+            command = self.protocol(websocket).decode(frame)
+        except Exception:
+            command = None
+        if not isinstance(command, dict):
+            await self._send(websocket, self.protocol(websocket).encode(
+                {"type": "error", "message": "Invalid command"}
+            ))
+            return None
+        return command
+    
+    async def connect(self, websocket: WebSocket, task_id: str, since: Optional[int] = None):
+        """Accept a new WebSocket connection for a specific task.
+        
+        With ``since``, events logged after that seq are replayed first.
+        """
+        await self._accept(websocket)
+        
+        if since is not None:
+            await self._replay(websocket, task_id, since)
         
         if task_id not in self.active_connections:
             self.active_connections[task_id] = []
         
         self.active_connections[task_id].append(websocket)
-        logger.info(f"WebSocket connected for task {task_id}")
+        logger.debug("WebSocket connected for task %s", task_id)
     
     def disconnect(self, task_id: str, websocket: WebSocket = None):
         """Remove a WebSocket connection"""
+        if websocket:
+            self.protocols.pop(websocket, None)
         if task_id in self.active_connections:
             if websocket:
                 try:
@@ -33,11 +115,100 @@ class WebSocketManager:
             if not self.active_connections[task_id]:
                 del self.active_connections[task_id]
         
-        logger.info(f"WebSocket disconnected for task {task_id}")
+        logger.debug("WebSocket disconnected for task %s", task_id)
+    
+    async def connect_multiplexed(self, websocket: WebSocket):
+        """Accept a connection that subscribes to many tasks"""
+        await self._accept(websocket)
+        self.subscribed_tasks[websocket] = set()
+        self.subscribed_filters[websocket] = []
+        self.subscribed_types[websocket] = None
+        logger.debug("Multiplexed WebSocket connected")
+    
+    def disconnect_multiplexed(self, websocket: WebSocket):
+        """Remove a multiplexed connection and all of its subscriptions"""
+        self.unsubscribe(websocket, list(self.subscribed_tasks.get(websocket, ())))
+        self.subscribed_tasks.pop(websocket, None)
+        self.subscribed_filters.pop(websocket, None)
+        self.subscribed_types.pop(websocket, None)
+        self.protocols.pop(websocket, None)
+        logger.debug("Multiplexed WebSocket disconnected")
+    
+    async def subscribe(self, websocket: WebSocket, task_ids: List[str],
+                        since: Optional[Dict[str, int]] = None):
+        """Subscribe a multiplexed connection to tasks, replaying missed events"""
+        for task_id in task_ids:
+            if since and task_id in since:
+                await self._replay(websocket, task_id, since[task_id])
+            self.task_subscribers.setdefault(task_id, set()).add(websocket)
+            self.subscribed_tasks[websocket].add(task_id)
+    
+    def unsubscribe(self, websocket: WebSocket, task_ids: List[str]):
+        """Unsubscribe a multiplexed connection from tasks"""
+        for task_id in task_ids:
+            subscribers = self.task_subscribers.get(task_id)
+            if subscribers:
+                subscribers.discard(websocket)
+                if not subscribers:
+                    del self.task_subscribers[task_id]
+            self.subscribed_tasks.get(websocket, set()).discard(task_id)
+    
+    def forget(self, task_id: str):
+        """Drop what is kept about a deleted task"""
+        self.event_log.forget(task_id)
+        self.task_attributes.pop(task_id, None)
+    
+    def _seed_task_attributes(self, task_filter: Dict[str, List[str]]):
+        """Learn the fields of unfinished tasks that match a new filter, such
+        as tasks created before this process started"""
+        if not self.load_task_attributes:
+            return
+        for task_id, attributes in self.load_task_attributes(task_filter).items():
+            # What events told us is at least as recent
+            self.task_attributes.setdefault(task_id, attributes)
+    
+    def track_task(self, task_id: str, **attributes):
+        """Record the filterable fields of a task that was not announced"""
+        self.task_attributes[task_id] = {field: attributes[field] for field in FILTER_FIELDS if field in attributes}
+    
+    async def handle_command(self, websocket: WebSocket, command: Dict[str, Any]):
+        """Apply a subscription command sent over a multiplexed connection"""
+        protocol = self.protocol(websocket)
+        error = self._command_error(command)
+        if error:
+            await self._send(websocket, protocol.encode({"type": "error", "message": error}))
+            return
+        action = command["action"]
+        
+        task_ids = [str(task_id) for task_id in command.get("task_ids", [])]
+        task_filter = self._normalize_filter(command["filter"]) if "filter" in command else None
+        
+        if "types" in command:
+            types = command["types"]
+            self.subscribed_types[websocket] = set(types) if types else None
+        
+        if action == "subscribe":
+            await self.subscribe(websocket, task_ids, command.get("since"))
+            if task_filter is not None and task_filter not in self.subscribed_filters[websocket]:
+                self._seed_task_attributes(task_filter)
+                self.subscribed_filters[websocket].append(task_filter)
+        else:
+            self.unsubscribe(websocket, task_ids)
+            if task_filter in self.subscribed_filters[websocket]:
+                self.subscribed_filters[websocket].remove(task_filter)
+        
+        await self._send(websocket, protocol.encode({
+            "type": f"{action}d",
+            "task_ids": task_ids,
+            "filter": task_filter
+        }))
     
     async def broadcast(self, task_id: str, message):
         """Broadcast a message to all connections for a specific task"""
-        if task_id not in self.active_connections:
+        seq = getattr(message, 'seq', None)
+        recipients = list(self.active_connections.get(task_id, []))
+        multiplexed = self._multiplexed_recipients(task_id, message)
+        if not recipients and not multiplexed and seq is None:
             return
         
         # Convert message to JSON if it's a Pydantic model
@@ -46,22 +217,155 @@ class WebSocketManager:
         else:
             message_data = message
         
+        started = time.perf_counter()
         message_json = json.dumps(message_data, default=str)
+        self._count_encoding(JSON_PROTOCOL, started)
+        
+        # Versioned events are logged so reconnecting clients can catch up
+        if seq is not None:
+            self.event_log.append(task_id, seq, message_json)
+        
+        # Each protocol in use encodes the event once
+        frames: Dict[str, Tuple[Frame, Optional[int]]] = {}
+        def frame_for(websocket: WebSocket) -> Tuple[Frame, Optional[int]]:
+            protocol = self.protocol(websocket)
+            if protocol.name not in frames:
+                started = time.perf_counter()
+                frame = protocol.encode_event(message_data, message_json)
+                self._count_encoding(protocol, started)
+                frames[protocol.name] = (frame, None if protocol.binary else len(frame.encode()))
+            return frames[protocol.name]
         
         # Send to all connections for this task
         connections_to_remove = []
-        for websocket in self.active_connections[task_id]:
+        for websocket in recipients:
             try:
-                await websocket.send_text(message_json)
+                await self._send(websocket, *frame_for(websocket))
             except Exception as e:
-                logger.error(f"Error sending WebSocket message: {e}")
+                logger.error("Error sending WebSocket message: %s", e)
                 connections_to_remove.append(websocket)
         
         # Remove failed connections
         for websocket in connections_to_remove:
             self.disconnect(task_id, websocket)
+        
+        for websocket in multiplexed:
+            try:
+                await self._send(websocket, *frame_for(websocket))
+            except Exception as e:
+                logger.error("Error sending multiplexed WebSocket message: %s", e)
+                self.disconnect_multiplexed(websocket)
     
     async def broadcast_to_all(self, message):
         """Broadcast a message to all active connections"""
         for task_id in list(self.active_connections.keys()):
             await self.broadcast(task_id, message)
+    
+    async def _replay(self, websocket: WebSocket, task_id: str, since: int):
+        """Send the events logged after ``since``.
+        
+        Replays until caught up; the final check and the caller's
+        registration happen without awaiting, so no live event can slip
+        between them.
+        """
+        while True:
+            missed = self.event_log.since(task_id, since)
+            if not missed:
+                return
+            for event_seq, event in missed:
+                await self._send(websocket, self.protocol(websocket).transcode(event))
+                since = event_seq
+    
+    def _count_encoding(self, protocol: Protocol, started: float):
+        self.events_encoded[protocol.name] += 1
+        self.encode_seconds[protocol.name] += time.perf_counter() - started
+    
+    def stats(self) -> Dict[str, Any]:
+        """Connections, traffic and encoding cost per wire protocol"""
+        connections = Counter(protocol.name for protocol in self.protocols.values())
+        return {
+            name: {
+                "connections": connections[name],
+                "frames_sent": self.frames_sent[name],
+                "bytes_sent": self.bytes_sent[name],
+                "bytes_per_frame": round(self.bytes_sent[name] / self.frames_sent[name], 1)
+                                   if self.frames_sent[name] else None,
+                "events_encoded": self.events_encoded[name],
+                "encode_us_per_event": round(self.encode_seconds[name] / self.events_encoded[name] * 1e6, 2)
+                                       if self.events_encoded[name] else None
+            }
+            for name in PROTOCOLS
+        }
+    
+    def _multiplexed_recipients(self, task_id: str, message) -> Set[WebSocket]:
+        """Multiplexed connections that should receive an event.
+        
+        Filter subscribers get every event of a task that matched their filter
+        before or after the event, so they also see tasks leaving the filter.
+        """
+        delta = getattr(message, 'delta', None) or {}
+        previous = self.task_attributes.get(task_id, {})
+        current = previous
+        task_changes = delta.get("task") or {}
+        if any(field in task_changes for field in FILTER_FIELDS):
+            current = {**previous, **{field: task_changes[field] for field in FILTER_FIELDS if field in task_changes}}
+            if current.get("status") in TERMINAL_STATUSES:
+                # Terminal tasks send no further events
+                self.task_attributes.pop(task_id, None)
+            else:
+                self.task_attributes[task_id] = current
+        
+        recipients = set(self.task_subscribers.get(task_id, ()))
+        for websocket, filters in self.subscribed_filters.items():
+            if any(self._matches(task_filter, previous) or self._matches(task_filter, current)
+                   for task_filter in filters):
+                recipients.add(websocket)
+        
+        event_type = getattr(message, 'type', None)
+        return {
+            websocket for websocket in recipients
+            if self.subscribed_types.get(websocket) is None or event_type in self.subscribed_types[websocket]
+        }
+    
+    def _command_error(self, command: Any) -> Optional[str]:
+        """Why a command is malformed, or None if it isn't"""
+        if not isinstance(command, dict):
+            return "Command must be an object"
+        action = command.get("action")
+        if action not in ("subscribe", "unsubscribe"):
+            return f"Unknown action: {action}"
+        task_ids = command.get("task_ids", [])
+        if not isinstance(task_ids, list) or not all(isinstance(task_id, (str, int)) for task_id in task_ids):
+            return "task_ids must be a list of task ids"
+        if "filter" in command:
+            task_filter = command["filter"]
+            if not isinstance(task_filter, dict):
+                return "filter must be an object"
+            for field in FILTER_FIELDS:
+                values = task_filter.get(field, [])
+                if not isinstance(values, str) and not (
+                    isinstance(values, list) and all(isinstance(value, str) for value in values)
+                ):
+                    return f"filter.{field} must be a string or a list of strings"
+        types = command.get("types")
+        if types is not None and not (isinstance(types, list) and all(isinstance(t, str) for t in types)):
+            return "types must be a list of event types"
+        since = command.get("since")
+        if since is not None and not (
+            isinstance(since, dict) and all(isinstance(seq, int) for seq in since.values())
+        ):
+            return "since must map task ids to seqs"
+        return None
+    
+    def _normalize_filter(self, task_filter: Dict[str, Any]) -> Dict[str, List[str]]:
+        normalized = {}
+        for field in FILTER_FIELDS:
+            if field in task_filter:
+                values = task_filter[field]
+                normalized[field] = sorted([values] if isinstance(values, str) else values)
+        return normalized
+    
+    def _matches(self, task_filter: Dict[str, List[str]], attributes: Dict[str, Any]) -> bool:
+        if not attributes:
+            return False
+        return all(attributes.get(field) in values for field, values in task_filter.items())
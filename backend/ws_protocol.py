@@ -0,0 +1,129 @@
+# WebSocket wire protocols: JSON by default, msgpack or CBOR arrays when negotiated (see README)
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import json
+
+Frame = Union[str, bytes]
+
+EVENT_TYPES = (
+    "task_created", "task_started", "task_progress", "task_completed", "task_failed",
+    "subtask_created", "subtask_started", "subtask_chunk", "subtask_completed", "subtask_failed"
+)
+EVENT_CODES = {event_type: code for code, event_type in enumerate(EVENT_TYPES, 1)}
+EPOCH = datetime(1970, 1, 1)
+
+def _timestamp_ms(timestamp: Union[datetime, str, None]) -> Optional[int]:
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if timestamp is None:
+        return None
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return int((timestamp - EPOCH).total_seconds() * 1000)
+
+def _compact_delta(delta: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The delta with outputs replaced by references; the original is untouched"""
+    if not delta:
+        return delta
+    compact = dict(delta)
+    task = delta.get("task")
+    if task and "final_output" in task:
+        compact["task"] = {field: value for field, value in task.items() if field != "final_output"}
+        compact["task"]["final_output_ref"] = True
+    subtasks = delta.get("subtasks")
+    if subtasks and any("output" in changes for changes in subtasks.values()):
+        compact["subtasks"] = {}
+        for subtask_id, changes in subtasks.items():
+            if "output" in changes:
+                changes = {field: value for field, value in changes.items() if field != "output"}
+                changes["output_ref"] = True
+            compact["subtasks"][subtask_id] = changes
+    return compact
+
+def compact_event(message: Dict[str, Any]) -> List[Any]:
+    """An event (a WebSocketMessage as a dict) in the compact array form"""
+    event = [
+        EVENT_CODES.get(message["type"], message["type"]),
+        message["task_id"],
+        message.get("seq"),
+        _timestamp_ms(message.get("timestamp")),
+        _compact_delta(message.get("delta"))
+    ]
+    if message.get("subtask_id") is not None:
+        event.append(message["subtask_id"])
+    return event
+
+class Protocol:
+    """How events and other frames are put on the wire for a connection"""
+    name = "json"
+    binary = False
+
+    def encode_event(self, message: Dict[str, Any], json_text: str) -> Frame:
+        """Frame of an event, given as a dict and as its JSON text"""
+        return json_text
+
+    def transcode(self, json_text: str) -> Frame:
+        """Frame of an event logged as JSON text"""
+        return json_text
+
+    def encode(self, data: Dict[str, Any]) -> Frame:
+        return json.dumps(data, default=str)
+
+    def decode(self, frame: Frame) -> Any:
+        return json.loads(frame)
+
+class CompactProtocol(Protocol):
+    """Compact events in a binary serialization"""
+    binary = True
+
+    def __init__(self, name: str, dumps: Callable[[Any], bytes], loads: Callable[[bytes], Any]):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def encode_event(self, message: Dict[str, Any], json_text: Optional[str] = None) -> Frame:
+        return self.dumps(compact_event(message))
+
+    def encode(self, data: Dict[str, Any]) -> Frame:
+        return self.dumps(data)
+
+    def decode(self, frame: Frame) -> Any:
+        if isinstance(frame, str):
+            return json.loads(frame)
+        return self.loads(frame)
+
+    def transcode(self, json_text: str) -> Frame:
+        return self.encode_event(json.loads(json_text))
+
+JSON_PROTOCOL = Protocol()
+
+def _available_protocols() -> Dict[str, Protocol]:
+    protocols: Dict[str, Protocol] = {"json": JSON_PROTOCOL}
+    # Values JSON would turn into strings (default=str) are strings here too
+    try:
+        import msgpack
+        protocols["msgpack"] = CompactProtocol(
+            "msgpack", lambda data: msgpack.packb(data, default=str), msgpack.unpackb
+        )
+    except ImportError:
+        pass
+    try:
+        import cbor2
+        protocols["cbor"] = CompactProtocol(
+            "cbor", lambda data: cbor2.dumps(data, default=lambda encoder, value: encoder.encode(str(value))),
+            cbor2.loads
+        )
+    except ImportError:
+        pass
+    return protocols
+
+PROTOCOLS = _available_protocols()
+SUBPROTOCOLS = {f"orchestration.{name}": protocol for name, protocol in PROTOCOLS.items()}
+
+def negotiate(offered: List[str]) -> Tuple[Protocol, Optional[str]]:
+    """The client's most preferred available protocol and the subprotocol
+    to accept; JSON, and no subprotocol, if none is available"""
+    for subprotocol in offered:
+        if subprotocol in SUBPROTOCOLS:
+            return SUBPROTOCOLS[subprotocol], subprotocol
+    return JSON_PROTOCOL, None
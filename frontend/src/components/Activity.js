@@ -11,38 +11,33 @@ import {
   Users
 } from 'lucide-react';
 import { api } from '../services/api';
+import { useTaskUpdates } from '../hooks/useTaskUpdates';
+import { useStats } from '../hooks/useStats';
 
 const Activity = () => {
   const [tasks, setTasks] = useState([]);
   const [loading, setLoading] = useState(true);
-  const [stats, setStats] = useState({
-    totalTasks: 0,
-    completedTasks: 0,
-    runningTasks: 0,
-    failedTasks: 0
-  });
 
   useEffect(() => {
     fetchActivity();
   }, []);
 
+  // Live updates for every task over one multiplexed connection
+  useTaskUpdates(setTasks);
+
+  // Counts come from the server so they cover every task, not just the list
+  const counts = useStats(tasks)?.tasks || {};
+  const stats = {
+    totalTasks: counts.total ?? 0,
+    completedTasks: counts.completed ?? 0,
+    runningTasks: counts.running ?? 0,
+    failedTasks: counts.failed ?? 0
+  };
+
   const fetchActivity = async () => {
     try {
       const response = await api.get('/api/tasks');
       setTasks(response.data);
-      
-      // Calculate stats
-      const total = response.data.length;
-      const completed = response.data.filter(task => task.status === 'completed').length;
-      const running = response.data.filter(task => task.status === 'running').length;
-      const failed = response.data.filter(task => task.status === 'failed').length;
-      
-      setStats({
-        totalTasks: total,
-        completedTasks: completed,
-        runningTasks: running,
-        failedTasks: failed
-      });
     } catch (error) {
       console.error('Error fetching activity:', error);
     } finally {
@@ -29,15 +29,19 @@ const AgentManagement = () => {
 
   const fetchAgents = async () => {
     try {
-      const response = await api.get('/api/agents');
+      const [response, statsResponse] = await Promise.all([
+        api.get('/api/agents'),
+        api.get('/api/stats')
+      ]);
       setAgents(response.data.agents);
       
       // Calculate stats
+      const counts = statsResponse.data.tasks;
       setStats({
         totalAgents: response.data.agents.length,
         activeAgents: response.data.agents.filter(agent => agent.status === 'active').length,
-        totalTasks: 0, // This would come from a separate API call
-        completedTasks: 0
+        totalTasks: counts.total,
+        completedTasks: counts.completed
       });
     } catch (error) {
       toast.error('Failed to fetch agents');
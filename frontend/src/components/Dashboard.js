@@ -12,6 +12,8 @@ import {
 import { motion } from 'framer-motion';
 import toast from 'react-hot-toast';
 import { api } from '../services/api';
+import { useTaskUpdates } from '../hooks/useTaskUpdates';
+import { useStats } from '../hooks/useStats';
 
 const Dashboard = () => {
   const [tasks, setTasks] = useState([]);
@@ -22,6 +24,13 @@ const Dashboard = () => {
     fetchTasks();
   }, []);
 
+  // Live updates for every task over one multiplexed connection
+  useTaskUpdates(setTasks);
+
+  // Counts come from the server so they cover every task, not just the list
+  const stats = useStats(tasks);
+  const counts = stats?.tasks || {};
+
   const fetchTasks = async () => {
     try {
       const response = await api.get('/api/tasks');
@@ -38,7 +47,7 @@ const Dashboard = () => {
     try {
       setDeleting(taskId);
       await api.delete(`/api/tasks/${taskId}`);
-      setTasks(tasks.filter(task => task.id !== taskId));
+      setTasks(prev => prev.filter(task => task.id !== taskId));
       toast.success('Task deleted successfully');
     } catch (error) {
       toast.error('Failed to delete task');
@@ -124,7 +133,7 @@ const Dashboard = () => {
             </div>
             <div className="ml-4">
               <p className="text-sm font-medium text-gray-600">Total Tasks</p>
-              <p className="text-2xl font-bold text-gray-900">{tasks.length}</p>
+              <p className="text-2xl font-bold text-gray-900">{counts.total ?? 0}</p>
             </div>
           </div>
         </div>
@@ -137,7 +146,7 @@ const Dashboard = () => {
             <div className="ml-4">
               <p className="text-sm font-medium text-gray-600">Completed</p>
               <p className="text-2xl font-bold text-gray-900">
-                {tasks.filter(task => task.status === 'completed').length}
+                {counts.completed ?? 0}
               </p>
             </div>
           </div>
@@ -151,7 +160,7 @@ const Dashboard = () => {
             <div className="ml-4">
               <p className="text-sm font-medium text-gray-600">Running</p>
               <p className="text-2xl font-bold text-gray-900">
-                {tasks.filter(task => task.status === 'running').length}
+                {counts.running ?? 0}
               </p>
             </div>
           </div>
@@ -165,7 +174,7 @@ const Dashboard = () => {
             <div className="ml-4">
               <p className="text-sm font-medium text-gray-600">Failed</p>
               <p className="text-2xl font-bold text-gray-900">
-                {tasks.filter(task => task.status === 'failed').length}
+                {counts.failed ?? 0}
               </p>
             </div>
           </div>
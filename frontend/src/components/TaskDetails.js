@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { motion, AnimatePresence } from 'framer-motion';
 import { 
@@ -26,30 +26,40 @@ const TaskDetails = () => {
   const [loading, setLoading] = useState(true);
   const [showResults, setShowResults] = useState(true);
   const [expandedSubtask, setExpandedSubtask] = useState(null);
+  const version = useRef(null);
+  const pendingMessages = useRef([]);
 
   // WebSocket connection for real-time updates
-  const { lastMessage, connectionStatus } = useWebSocket(`wss://multi-agent-task-solver.onrender.com/ws/tasks/${taskId}`);
+  // Reconnects resume from the last applied version, so missed deltas are replayed
+  const { connectionStatus } = useWebSocket(
+    `wss://multi-agent-task-solver.onrender.com/ws/tasks/${taskId}`,
+    {
+      onMessage: (message) => handleWebSocketMessage(message),
+      resumeFrom: () => version.current
+    }
+  );
 
   useEffect(() => {
     fetchTaskDetails();
   }, [taskId]);
 
-  useEffect(() => {
-    if (lastMessage) {
-      handleWebSocketMessage(lastMessage);
-    }
-  }, [lastMessage]);
-
   const fetchTaskDetails = async () => {
     try {
-      const [taskResponse, subtasksResponse] = await Promise.all([
-        api.get(`/api/tasks/${taskId}?t=${Date.now()}`),
-        api.get(`/api/tasks/${taskId}/subtasks?t=${Date.now()}`)
-      ]);
+      // Versioned snapshot; WebSocket deltas with a higher seq are applied on top
+      version.current = null;
+      const response = await api.get(`/api/tasks/${taskId}/state`);
+      const { task: taskData, subtasks: subtaskData, streaming } = response.data;
       
-      console.log("Task response:", taskResponse.data);
-      setTask(taskResponse.data);
-      setSubtasks(subtasksResponse.data);
+      setTask(taskData);
+      setSubtasks(subtaskData.map(subtask => 
+        streaming[subtask.id] ? { ...subtask, streamed: streaming[subtask.id] } : subtask
+      ));
+      version.current = response.data.version;
+      
+      // Apply events that arrived while the snapshot was loading
+      const pending = pendingMessages.current;
+      pendingMessages.current = [];
+      pending.forEach(applyMessage);
     } catch (error) {
       toast.error('Failed to fetch task details');
       console.error('Error fetching task details:', error);
@@ -58,56 +68,81 @@ const TaskDetails = () => {
     }
   };
 
+  const applySubtaskChanges = (subtask, changes) => {
+    const { output_append, output, ...fields } = changes;
+    const next = { ...subtask, ...fields };
+    
+    if (output_append) {
+      next.streamed = { ...subtask.streamed };
+      Object.entries(output_append).forEach(([field, text]) => {
+        next.streamed[field] = (next.streamed[field] || '') + text;
+      });
+    }
+    
+    if (output) {
+      // Streamed fields arrived as chunks; the rest of the output comes in one piece
+      const fullOutput = { ...subtask.streamed, ...output };
+      next.output_data = Object.keys(fullOutput).length ? JSON.stringify(fullOutput) : null;
+      delete next.streamed;
+    }
+    
+    return next;
+  };
+
+  const applyDelta = (delta) => {
+    if (delta.task) {
+      setTask(prev => ({ ...prev, ...delta.task }));
+    }
+    
+    if (delta.subtasks) {
+      setSubtasks(prev => {
+        let next = prev;
+        Object.entries(delta.subtasks).forEach(([id, changes]) => {
+          next = next.some(subtask => subtask.id === id)
+            ? next.map(subtask => subtask.id === id ? applySubtaskChanges(subtask, changes) : subtask)
+            : [...next, applySubtaskChanges({ id }, changes)].sort((a, b) => a.order - b.order);
+        });
+        return next;
+      });
+    }
+  };
+
+  const applyMessage = (data) => {
+    if (data.seq === null || data.seq === undefined || data.seq <= version.current) {
+      // Not a state change, or already part of the snapshot
+      return;
+    }
+    
+    if (data.seq !== version.current + 1) {
+      // Missed an update; resync from a fresh snapshot
+      fetchTaskDetails();
+      return;
+    }
+    
+    applyDelta(data.delta || {});
+    version.current = data.seq;
+  };
+
   const handleWebSocketMessage = (message) => {
     try {
       const data = JSON.parse(message.data);
       
+      if (version.current === null) {
+        pendingMessages.current.push(data);
+      } else {
+        applyMessage(data);
+      }
+      
       switch (data.type) {
         case 'task_started':
-          setTask(prev => ({ ...prev, status: 'running' }));
           toast.success('Task execution started');
           break;
           
-        case 'subtask_started':
-          setSubtasks(prev => prev.map(subtask => 
-            subtask.id === data.subtask_id 
-              ? { ...subtask, status: 'running', started_at: data.timestamp }
-              : subtask
-          ));
-          break;
-          
-        case 'subtask_completed':
-          setSubtasks(prev => prev.map(subtask => 
-            subtask.id === data.subtask_id 
-              ? { ...subtask, status: 'completed', completed_at: data.timestamp }
-              : subtask
-          ));
-          break;
-          
-        case 'subtask_failed':
-          setSubtasks(prev => prev.map(subtask => 
-            subtask.id === data.subtask_id 
-              ? { ...subtask, status: 'failed', error_message: data.message }
-              : subtask
-          ));
-          break;
-          
-        case 'task_progress':
-          setTask(prev => ({ ...prev, progress: data.progress }));
-          break;
-          
         case 'task_completed':
-          setTask(prev => ({ 
-            ...prev, 
-            status: 'completed', 
-            progress: 100,
-            final_output: JSON.stringify(data.data)
-          }));
           toast.success('Task completed successfully!');
           break;
           
         case 'task_failed':
-          setTask(prev => ({ ...prev, status: 'failed' }));
           toast.error('Task failed');
           break;
       }
@@ -251,7 +286,13 @@ const TaskDetails = () => {
         <div className="space-y-4">
           <div className="flex items-center justify-between">
             <h3 className="text-lg font-medium text-gray-900">Progress</h3>
-            <span className="text-sm text-gray-600">{task.progress}%</span>
+            <span className="text-sm text-gray-600">
+              {task.progress}%
+              {task.eta && (
+                // Timestamps are UTC without a zone suffix
+                <> · done ~{new Date(task.eta + 'Z').toLocaleTimeString()}</>
+              )}
+            </span>
           </div>
           
           <div className="progress-bar">
@@ -329,6 +370,14 @@ const TaskDetails = () => {
                 </div>
               )}
               
+              {subtask.status === 'running' && subtask.streamed && (
+                <div className="mt-4 p-4 bg-white border border-gray-200 rounded-md">
+                  <pre className="text-sm text-gray-600 whitespace-pre-wrap overflow-x-auto">
+                    {Object.values(subtask.streamed).join('\n')}
+                  </pre>
+                </div>
+              )}
+              
               <AnimatePresence>
                 {expandedSubtask === subtask.id && subtask.output_data && (
                   <motion.div
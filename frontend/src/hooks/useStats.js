@@ -0,0 +1,39 @@
+import { useState, useEffect, useRef } from 'react';
+import { api } from '../services/api';
+
+// Refetch at most this often while tasks keep changing (ms)
+const REFRESH_INTERVAL = 2000;
+
+// Task counts and per-workflow/per-agent statistics from /api/stats. They are
+// computed server side from counters, so they cost the same however many
+// tasks exist. Pass a value that changes along with the tasks (such as a live
+// task list) to keep them fresh.
+export const useStats = (trigger) => {
+  const [stats, setStats] = useState(null);
+  const lastFetch = useRef(0);
+  const timer = useRef(null);
+
+  useEffect(() => {
+    if (timer.current) return;
+
+    const fetchStats = async () => {
+      lastFetch.current = Date.now();
+      try {
+        const response = await api.get('/api/stats');
+        setStats(response.data);
+      } catch (error) {
+        console.error('Error fetching stats:', error);
+      }
+    };
+
+    const wait = Math.max(0, lastFetch.current + REFRESH_INTERVAL - Date.now());
+    timer.current = setTimeout(() => {
+      timer.current = null;
+      fetchStats();
+    }, wait);
+  }, [trigger]);
+
+  useEffect(() => () => clearTimeout(timer.current), []);
+
+  return stats;
+};
@@ -0,0 +1,30 @@
+import { useWebSocket } from './useWebSocket';
+
+// Events that change what a task list shows; subtask events are not needed
+const TASK_EVENTS = ['task_created', 'task_started', 'task_progress', 'task_completed', 'task_failed'];
+
+// Keeps a list of tasks live over the multiplexed WebSocket: tasks matching
+// `filter` are updated in place and newly created ones are added to the top.
+export const useTaskUpdates = (setTasks, filter = {}) => {
+  const handleMessage = (message) => {
+    try {
+      const data = JSON.parse(message.data);
+      const changes = data.delta?.task;
+      if (!changes) return;
+
+      setTasks(prev => {
+        if (prev.some(task => task.id === data.task_id)) {
+          return prev.map(task => task.id === data.task_id ? { ...task, ...changes } : task);
+        }
+        return data.type === 'task_created' ? [{ id: data.task_id, ...changes }, ...prev] : prev;
+      });
+    } catch (error) {
+      console.error('Error parsing WebSocket message:', error);
+    }
+  };
+
+  return useWebSocket('wss://multi-agent-task-solver.onrender.com/ws/tasks', {
+    onMessage: handleMessage,
+    onOpen: (send) => send({ action: 'subscribe', filter, types: TASK_EVENTS })
+  });
+};
@@ -1,47 +1,78 @@
 import { useState, useEffect, useRef } from 'react';
 
-export const useWebSocket = (url) => {
+// Options:
+//   onMessage  - called for every message (lastMessage can skip messages
+//                that arrive in the same render)
+//   onOpen     - called with a send function whenever a connection opens,
+//                e.g. to (re)subscribe
+//   resumeFrom - returns the last seq seen; reconnects ask the server to
+//                replay everything after it with ?since=<seq>
+export const useWebSocket = (url, { onMessage, onOpen, resumeFrom } = {}) => {
   const [lastMessage, setLastMessage] = useState(null);
   const [connectionStatus, setConnectionStatus] = useState('Disconnected');
   const ws = useRef(null);
+  const onMessageRef = useRef(onMessage);
+  const onOpenRef = useRef(onOpen);
+  const resumeFromRef = useRef(resumeFrom);
+
+  onMessageRef.current = onMessage;
+  onOpenRef.current = onOpen;
+  resumeFromRef.current = resumeFrom;
 
   useEffect(() => {
     if (!url) return;
 
-    // Create WebSocket connection
-    ws.current = new WebSocket(url);
+    let closed = false;
+    let retryDelay = 1000;
+    let retryTimer = null;
 
-    ws.current.onopen = () => {
-      setConnectionStatus('Connected');
-      console.log('WebSocket connected');
-    };
+    const connect = () => {
+      const seq = resumeFromRef.current?.();
+      const connectUrl = seq !== null && seq !== undefined
+        ? `${url}${url.includes('?') ? '&' : '?'}since=${seq}`
+        : url;
 
-    ws.current.onmessage = (event) => {
-      setLastMessage(event);
-    };
+      // Create WebSocket connection
+      ws.current = new WebSocket(connectUrl);
 
-    ws.current.onclose = () => {
-      setConnectionStatus('Disconnected');
-      console.log('WebSocket disconnected');
-    };
+      ws.current.onopen = () => {
+        setConnectionStatus('Connected');
+        retryDelay = 1000;
+        console.log('WebSocket connected');
+        onOpenRef.current?.(sendMessage);
+      };
 
-    ws.current.onerror = (error) => {
-      setConnectionStatus('Error');
-      console.error('WebSocket error:', error);
-      console.error('WebSocket URL:', url);
-      console.error('WebSocket readyState:', ws.current?.readyState);
-      
-      // Try to reconnect after 3 seconds
-      setTimeout(() => {
-        if (ws.current && ws.current.readyState === WebSocket.CLOSED) {
+      ws.current.onmessage = (event) => {
+        setLastMessage(event);
+        onMessageRef.current?.(event);
+      };
+
+      ws.current.onclose = () => {
+        setConnectionStatus('Disconnected');
+        console.log('WebSocket disconnected');
+
+        if (!closed) {
+          // Reconnect with backoff; missed events are replayed on resume
           console.log('Attempting to reconnect WebSocket...');
-          ws.current = new WebSocket(url);
+          retryTimer = setTimeout(connect, retryDelay);
+          retryDelay = Math.min(retryDelay * 2, 30000);
         }
-      }, 3000);
+      };
+
+      ws.current.onerror = (error) => {
+        setConnectionStatus('Error');
+        console.error('WebSocket error:', error);
+        console.error('WebSocket URL:', connectUrl);
+        console.error('WebSocket readyState:', ws.current?.readyState);
+      };
     };
 
+    connect();
+
     // Cleanup on unmount
     return () => {
+      closed = true;
+      clearTimeout(retryTimer);
       if (ws.current) {
         ws.current.close();
       }